@@ -0,0 +1,370 @@
+"""Load test of the escalation round trip at increasing numbers of concurrent calls.
+
+Each simulated session does what `Assistant.request_human_supervisor` and
+`_listen_for_resolution` do: POST /api/help-requests to the real backend app
+(backend-api/main.py, served in process over ASGI), then wait on its worker's
+`EscalationDispatcher` until the request is resolved. A scripted supervisor
+watches pending requests like the dashboard does and resolves each one with
+PUT /api/help-requests/{id}/resolve after a delay drawn from
+--supervisor-delay, with at most --supervisors requests in hand at once.
+Firestore is `FakeFirestore` and the embedding API is `DeterministicEmbedder`,
+so no network or credentials are needed.
+
+    python benchmarks/bench_escalations.py                          # 1 .. 128 calls
+    python benchmarks/bench_escalations.py --concurrency 10 50 200 --duration 20
+    python benchmarks/bench_escalations.py --supervisor-delay lognormal:2000:0.6 --supervisors 8
+
+Sessions escalate back to back until --duration has passed. Every level runs
+in a fresh process and reports throughput (answers per second), time to answer
+(POST to the dispatcher handing the answer over), event-loop lag, open
+Firestore listeners and RSS. The knee is the first level whose p99 time to
+answer exceeds --knee-factor times that of the lowest level, or that has
+errors or timeouts. Agent workers, backend and supervisor share one event
+loop here, so loop lag is an upper bound on what any one of them would see.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+import numpy as np
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "src"))
+sys.path.insert(0, BENCHMARKS)
+# The backend app (main.py) is imported from its own directory and served in process.
+sys.path.append(os.path.join(BENCHMARKS, "..", "..", "backend-api"))
+
+from bench_retrieval import generate_questions, peak_rss_mb, rss_mb  # noqa: E402
+from fakes import DeterministicEmbedder, FakeFirestore  # noqa: E402
+from frontdesk_shared.clients import registry  # noqa: E402
+
+from escalations import EscalationDispatcher  # noqa: E402
+
+DEFAULT_CONCURRENCY = (1, 2, 4, 8, 16, 32, 64, 128)
+LAG_INTERVAL = 0.01
+# The agent gives up on a supervisor after this long (see _listen_for_resolution).
+ANSWER_TIMEOUT = 60.0
+
+
+def parse_delay(spec: str):
+    """Supervisor delay sampler, in seconds, from "fixed:MS", "uniform:MIN_MS:MAX_MS",
+    "exponential:MEAN_MS" or "lognormal:MEDIAN_MS:SIGMA"."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(":") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1000 / values[0])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0] / 1000), values[1])
+    raise ValueError(f"Invalid delay distribution {spec!r}")
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"p50": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+
+class SlowEmbedder(DeterministicEmbedder):
+    """DeterministicEmbedder with a fixed per-request delay standing in for the API round trip."""
+
+    def __init__(self, latency_ms: float) -> None:
+        super().__init__()
+        self.latency_ms = latency_ms
+
+    def embed_content(self, model: str, content, task_type=None) -> dict:
+        time.sleep(self.latency_ms / 1000)
+        return super().embed_content(model, content, task_type)
+
+
+class ScriptedSupervisor:
+    """Resolves every new pending request after a sampled delay, `seats` at a time."""
+
+    def __init__(self, db, http, delay, seats: int, seed: int) -> None:
+        self.db = db
+        self.http = http
+        self.delay = delay
+        self.rng = random.Random(seed)
+        self.seats = asyncio.Semaphore(seats)
+        self.resolved = 0
+        self.errors = 0
+        self._loop = None
+        self._watch = None
+        self._tasks = set()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        query = self.db.collection("help_requests").where("status", "==", "pending")
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        # Coalesced escalations arrive as MODIFIED and are answered with their request.
+        for change in changes:
+            if change.type.name == "ADDED":
+                self._loop.call_soon_threadsafe(self._schedule, change.document.id)
+
+    def _schedule(self, request_id: str) -> None:
+        task = asyncio.create_task(self._resolve(request_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, request_id: str) -> None:
+        async with self.seats:
+            await asyncio.sleep(self.delay(self.rng))
+            response = await self.http.put(
+                f"/api/help-requests/{request_id}/resolve",
+                json={"answer": f"Scripted answer for {request_id}."},
+            )
+        if response.status_code == 200 and "error" not in response.json():
+            self.resolved += 1
+        else:
+            self.errors += 1
+
+    async def stop(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def _sample_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append((time.perf_counter() - started - LAG_INTERVAL) * 1000)
+
+
+async def _run(concurrency: int, options: dict, db, backend) -> dict:
+    import httpx
+
+    questions = generate_questions(max(concurrency * 64, 1000), seed=options["seed"])
+    rng = random.Random(options["seed"])
+    workers = [
+        EscalationDispatcher(db.collection("help_requests"), uuid.uuid4().hex)
+        for _ in range(options["workers"])
+    ]
+    times, outcomes = [], {"answered": 0, "coalesced": 0, "timed_out": 0, "errors": 0}
+    lags, listeners, waiters = [], [], []
+    stop = asyncio.Event()
+
+    await backend.start_ingestion_queue()
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://backend") as http:
+        supervisor = ScriptedSupervisor(
+            db, http, parse_delay(options["supervisor_delay"]), options["supervisors"],
+            options["seed"],
+        )
+        supervisor.start()
+
+        async def session(index: int) -> None:
+            dispatcher = workers[index % len(workers)]
+            deadline = started + options["duration"]
+            turn = 0
+            while time.perf_counter() < deadline:
+                turn += 1
+                if rng.random() < options["repeat_rate"]:
+                    question = questions[0]
+                else:
+                    question = questions[rng.randrange(1, len(questions))]
+                asked = time.perf_counter()
+                response = await http.post("/api/help-requests", json={
+                    "originalQuery": question,
+                    "conversationHistory": [
+                        {"role": "user", "content": question},
+                        {"role": "assistant", "content": "Let me check with my supervisor."},
+                    ],
+                    "livekitRoomId": f"load-{index}-{turn}",
+                    "agentWorkerId": dispatcher.worker_id,
+                })
+                data = response.json()
+                if response.status_code != 200 or "requestId" not in data:
+                    outcomes["errors"] += 1
+                    continue
+                outcomes["coalesced"] += bool(data.get("coalesced"))
+                try:
+                    await dispatcher.wait_for_resolution(data["requestId"], timeout=ANSWER_TIMEOUT)
+                except asyncio.TimeoutError:
+                    outcomes["timed_out"] += 1
+                    await http.post(
+                        f"/api/help-requests/{data['requestId']}/timeout",
+                        json={"agentWorkerId": dispatcher.worker_id},
+                    )
+                    continue
+                times.append((time.perf_counter() - asked) * 1000)
+                outcomes["answered"] += 1
+
+        async def sample_resources() -> None:
+            while not stop.is_set():
+                listeners.append(db.listener_count())
+                waiters.append(sum(worker.waiter_count for worker in workers))
+                await asyncio.sleep(0.1)
+
+        started = time.perf_counter()
+        lag_task = asyncio.create_task(_sample_loop_lag(lags, stop))
+        resource_task = asyncio.create_task(sample_resources())
+        await asyncio.gather(*(session(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(lag_task, resource_task)
+        await supervisor.stop()
+
+    for worker in workers:
+        worker.close()
+    await backend.stop_ingestion_queue()
+
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_per_s": outcomes["answered"] / elapsed,
+        "time_to_answer_ms": percentiles(times),
+        "loop_lag_ms": percentiles(lags),
+        "open_listeners": {"max": max(listeners), "end": db.listener_count()},
+        "waiters_max": max(waiters),
+        "supervisor": {"resolved": supervisor.resolved, "errors": supervisor.errors},
+        **outcomes,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def load_backend(db, embed_ms: float):
+    """A fresh import of the backend app (with its own ingestion queue and
+    embedding batcher), using `db` and a local embedder."""
+    registry.set("firestore", db)
+    registry.set("genai", SlowEmbedder(embed_ms))
+    sys.modules.pop("main", None)
+    backend = importlib.import_module("main")
+    # registry.warmup() imports this in production; the fakes skip it.
+    importlib.import_module("firebase_admin.firestore")
+    return backend
+
+
+def run_level(concurrency: int, options: dict) -> dict:
+    """Run one concurrency level against a fresh in-memory backend."""
+    db = FakeFirestore()
+    backend = load_backend(db, options["embed_ms"])
+
+    # The backend logs every request with print().
+    with contextlib.ExitStack() as stack:
+        if not options["verbose"]:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        return asyncio.run(_run(concurrency, options, db, backend))
+
+
+def run_isolated(concurrency: int, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(run_level, (concurrency, options))
+
+
+def find_knee(results: list[dict], factor: float):
+    """The first concurrency level where time to answer blows up, or None.
+
+    A level is past the knee when its p99 time to answer is more than `factor`
+    times the p99 at the lowest level, or when any escalation errored or timed out.
+    """
+    if not results:
+        return None
+    ordered = sorted(results, key=lambda result: result["concurrency"])
+    baseline = ordered[0]["time_to_answer_ms"]["p99"]
+    for result in ordered:
+        if result["errors"] or result["timed_out"]:
+            return result["concurrency"]
+        if result["time_to_answer_ms"]["p99"] > factor * baseline:
+            return result["concurrency"]
+    return None
+
+
+def print_summary(result: dict) -> None:
+    answer = result["time_to_answer_ms"]
+    lag = result["loop_lag_ms"]
+    print(
+        f"{result['concurrency']:>5} calls | {result['throughput_per_s']:7.1f} answers/s | "
+        f"answer p50 {answer['p50']:8.1f}ms p99 {answer['p99']:8.1f}ms | "
+        f"loop lag p99 {lag['p99']:6.1f}ms max {lag['max']:6.1f}ms | "
+        f"listeners {result['open_listeners']['max']:>3} | rss {result['rss_mb']:6.1f} MB | "
+        f"coalesced {result['coalesced']} timed out {result['timed_out']} errors {result['errors']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test the escalation round trip at increasing concurrency."
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY),
+                        help="simultaneous calls per level")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds each level keeps escalating")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="agent worker processes simulated (one dispatcher each)")
+    parser.add_argument("--supervisor-delay", default="lognormal:500:0.5",
+                        help="fixed:MS, uniform:MIN:MAX, exponential:MEAN or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--supervisors", type=int, default=16,
+                        help="requests the supervisor works on at once")
+    parser.add_argument("--repeat-rate", type=float, default=0.0,
+                        help="share of escalations asking the same question (exercises coalescing)")
+    parser.add_argument("--embed-ms", type=float, default=0.0,
+                        help="simulated latency of each embedding API request")
+    parser.add_argument("--knee-factor", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run every level in this process (RSS becomes cumulative)")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's request logs")
+    args = parser.parse_args()
+    parse_delay(args.supervisor_delay)
+
+    options = {
+        "duration": args.duration,
+        "workers": args.workers,
+        "supervisor_delay": args.supervisor_delay,
+        "supervisors": args.supervisors,
+        "repeat_rate": args.repeat_rate,
+        "embed_ms": args.embed_ms,
+        "seed": args.seed,
+        "verbose": args.verbose,
+    }
+    results = []
+    for concurrency in args.concurrency:
+        if args.in_process:
+            result = run_level(concurrency, options)
+        else:
+            result = run_isolated(concurrency, options)
+        print_summary(result)
+        results.append(result)
+
+    knee = find_knee(results, args.knee_factor)
+    if knee is None:
+        print(f"No knee up to {max(args.concurrency)} calls")
+    else:
+        print(f"Knee at {knee} calls (p99 time to answer > {args.knee_factor}x the lowest level)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": options, "results": results, "knee": knee}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Offline benchmark of per-turn KB retrieval cost as the knowledge base grows.
+
+Runs the same retrieval path as `Assistant.llm_node` (`retrieval.retrieve` over
+a `KnowledgeBaseIndex` fed by an `on_snapshot` listener) against a synthetic
+`knowledge_base` held in `FakeFirestore`, with `DeterministicEmbedder` standing
+in for the embedding API, so no network or credentials are needed.
+
+    python benchmarks/bench_retrieval.py                       # 100, 10k, 250k entries
+    python benchmarks/bench_retrieval.py --sizes 100 10000 --output results.json
+    python benchmarks/bench_retrieval.py --thresholds benchmarks/thresholds.json
+
+Each size runs in a fresh process so peak RSS is per size. Embedding time is
+reported separately from retrieval latency, since in production it is a network
+call (see EmbeddingCache). The BM25 lookup inside retrieval is also timed on its
+own (`lexical_ms`); its cost is capped by `LexicalIndex.max_doc_freq`, so its
+limits should stay roughly flat as the KB grows. With --thresholds the run exits non-zero if any
+metric exceeds its limit; see `check_thresholds` for the file format.
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import DeterministicEmbedder, FakeFirestore
+from frontdesk_shared.embedding_codec import ENCODINGS, F16, encode_fields
+
+from kb_ann import build_from_firestore
+from kb_index import KnowledgeBaseIndex
+from lexical_index import HYBRID_MODES
+from retrieval import RetrievalConfig, retrieve
+
+DEFAULT_SIZES = (100, 10_000, 250_000)
+# Same setting as the agent's: a KB lookup slower than this is abandoned and
+# the turn escalates, so no retrieval latency limit can be looser than it.
+KB_LOOKUP_DEADLINE_MS = int(os.getenv("KB_LOOKUP_DEADLINE_MS", "800"))
+QUERY_KINDS = ("exact", "paraphrase", "unknown")
+
+_OPENERS = [
+    "what are", "when are", "do you have", "how much are", "can i book", "is there",
+    "where do i find", "how long are", "who handles", "can you explain",
+]
+_TOPICS = [
+    "haircut", "beard trim", "hair colour", "highlights", "blowout", "manicure", "pedicure",
+    "gel nails", "facial", "massage", "waxing", "eyebrow tint", "lash lift", "makeup",
+    "bridal package", "gift card", "loyalty points", "parking", "wifi", "membership",
+    "cancellation", "refund", "deposit", "late arrival", "walk in", "group booking",
+    "student discount", "senior discount", "kids cut", "consultation",
+]
+_QUALIFIERS = [
+    "on weekends", "on public holidays", "for new clients", "in the evening",
+    "at the downtown branch", "at the mall location", "this month", "for two people",
+    "with a stylist", "without an appointment", "for members", "before noon",
+    "after work", "during summer", "online", "over the phone",
+]
+_FILLERS = ["hey", "quick question", "um", "could you tell me", "i was wondering"]
+_UNKNOWN = [
+    "satellite", "volcano", "mortgage", "quantum", "submarine", "orchestra", "glacier",
+    "telescope", "tractor", "passport", "vaccine", "algebra", "lighthouse", "saxophone",
+]
+
+
+def generate_questions(count: int, seed: int = 0) -> list[str]:
+    """`count` distinct synthetic front-desk questions."""
+    rng = random.Random(seed)
+    questions = set()
+    while len(questions) < count:
+        question = " ".join([
+            rng.choice(_OPENERS),
+            rng.choice(_TOPICS),
+            rng.choice(_QUALIFIERS),
+            rng.choice(_QUALIFIERS),
+        ])
+        # Suffix a branch number once the template space gets crowded.
+        if question in questions:
+            question = f"{question} branch {rng.randrange(10_000)}"
+        questions.add(question)
+    return sorted(questions)
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    words = question.split()
+    if len(words) > 4:
+        del words[rng.randrange(2, len(words))]
+    return f"{rng.choice(_FILLERS)} {' '.join(words)}?"
+
+
+def generate_queries(questions: list[str], count: int, seed: int = 1) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        kind = QUERY_KINDS[i % len(QUERY_KINDS)]
+        if kind == "exact":
+            text = rng.choice(questions) + "?"
+        elif kind == "paraphrase":
+            text = paraphrase(rng.choice(questions), rng)
+        else:
+            text = f"{rng.choice(_OPENERS)} {rng.choice(_UNKNOWN)} {rng.choice(_UNKNOWN)}"
+        queries.append((kind, text))
+    return queries
+
+
+def populate(db: FakeFirestore, questions: list[str], embedder: DeterministicEmbedder, encoding: str) -> None:
+    collection = db.collection("knowledge_base")
+    for i, question in enumerate(questions):
+        answer = f"Answer #{i}: please call the front desk about {question}."
+        embedding = embedder.embed(f"Question: {question}\nAnswer: {answer}")
+        collection.document(f"kb{i:07d}").set({
+            "question": question,
+            "answer": answer,
+            **encode_fields({"content_embedding": embedding}, encoding),
+        })
+
+
+def percentiles(samples: list[float]) -> dict:
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_size(size: int, options: dict) -> dict:
+    embedder = DeterministicEmbedder(options["dimensions"])
+    config = RetrievalConfig(hybrid_mode=options["hybrid_mode"])
+    questions = generate_questions(size, seed=options["seed"])
+    queries = generate_queries(questions, options["queries"], seed=options["seed"] + 1)
+
+    db = FakeFirestore()
+    populate(db, questions, embedder, options["encoding"])
+    del questions
+
+    started = time.perf_counter()
+    if options["backend"] == "ivf":
+        kb_index, _ = build_from_firestore(db, nlist=None, iterations=10)
+        kb_index.nprobe = options["nprobe"]
+        index_bytes = kb_index.vectors.nbytes + kb_index.centroids.nbytes
+    else:
+        kb_index = KnowledgeBaseIndex()
+        kb_index.watch(db.collection("knowledge_base"))
+        kb_index.wait_until_ready()
+        kb_index.close()
+        index_bytes = kb_index._matrix.nbytes
+    load_seconds = time.perf_counter() - started
+    # The KB lives in Firestore in production, not in the agent process.
+    del db
+    gc.collect()
+    rss_after_load = rss_mb()
+
+    embedded = [(kind, text, embedder.embed(text)) for kind, text in queries]
+    for _, text, embedding in embedded[: options["warmup"]]:
+        retrieve(kb_index, text, embedding, config)
+
+    latencies, embed_latencies, lexical_latencies = [], [], []
+    accepted = dict.fromkeys(QUERY_KINDS, 0)
+    totals = dict.fromkeys(QUERY_KINDS, 0)
+    for kind, text, _ in embedded:
+        started = time.perf_counter()
+        embedding = embedder.embed(text)
+        embed_latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        match = retrieve(kb_index, text, embedding, config)
+        latencies.append((time.perf_counter() - started) * 1000)
+        totals[kind] += 1
+        accepted[kind] += match is not None
+
+        started = time.perf_counter()
+        kb_index.lexical_search(text, top_k=config.candidates)
+        lexical_latencies.append((time.perf_counter() - started) * 1000)
+
+    # Allocation pass over a sample, separate so tracemalloc's (roughly 10x)
+    # overhead does not skew latency.
+    allocations = []
+    tracemalloc.start()
+    for _, text, embedding in embedded[: options["alloc_queries"]]:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        retrieve(kb_index, text, embedding, config)
+        _, peak = tracemalloc.get_traced_memory()
+        allocations.append((peak - before) / 1024)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size": size,
+        "indexed": len(kb_index),
+        "backend": options["backend"],
+        "encoding": options["encoding"],
+        "dimensions": options["dimensions"],
+        "hybrid_mode": options["hybrid_mode"],
+        "queries": len(embedded),
+        "load_seconds": load_seconds,
+        "index_mb": index_bytes / 2**20,
+        "latency_ms": percentiles(latencies),
+        "embed_ms": percentiles(embed_latencies),
+        "lexical_ms": percentiles(lexical_latencies),
+        "alloc_kib_per_turn": {
+            "mean": float(np.mean(allocations)),
+            "max": float(np.max(allocations)),
+        },
+        "traced_peak_kib": traced_peak / 1024,
+        "rss_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+        "accept_rate": {
+            kind: accepted[kind] / totals[kind] if totals[kind] else 0.0 for kind in QUERY_KINDS
+        },
+    }
+
+
+def run_isolated(size: int, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(run_size, (size, options))
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def check_thresholds(results: list[dict], thresholds: dict) -> list[str]:
+    """Compare results against upper limits; returns one message per regression.
+
+    `thresholds` maps a KB size (as a string, or "*" for every size) to
+    `{metric: limit}`, where metric is a dotted path into the result, e.g.
+    `{"10000": {"latency_ms.p95": 5.0, "alloc_kib_per_turn.mean": 64}}`. Metrics
+    named in `min` are lower limits instead (e.g. `"min": {"accept_rate.exact": 1.0}`).
+    `latency_ms` limits are capped at KB_LOOKUP_DEADLINE_MS.
+    """
+    failures = []
+    for result in results:
+        flat = flatten(result)
+        for key in ("*", str(result["size"])):
+            limits = dict(thresholds.get(key, {}))
+            minimums = limits.pop("min", {})
+            for metric, limit in limits.items():
+                if metric.startswith("latency_ms."):
+                    limit = min(limit, KB_LOOKUP_DEADLINE_MS)
+                if metric not in flat:
+                    failures.append(f"{result['size']}: unknown metric {metric!r}")
+                elif flat[metric] > limit:
+                    failures.append(f"{result['size']}: {metric} = {flat[metric]:.3f} > {limit}")
+            for metric, limit in minimums.items():
+                if metric not in flat:
+                    failures.append(f"{result['size']}: unknown metric {metric!r}")
+                elif flat[metric] < limit:
+                    failures.append(f"{result['size']}: {metric} = {flat[metric]:.3f} < {limit}")
+    return failures
+
+
+def print_summary(result: dict) -> None:
+    latency = result["latency_ms"]
+    accept = result["accept_rate"]
+    print(
+        f"{result['size']:>8} docs | load {result['load_seconds']:6.1f}s | "
+        f"p50 {latency['p50']:7.2f}ms p95 {latency['p95']:7.2f}ms p99 {latency['p99']:7.2f}ms | "
+        f"alloc {result['alloc_kib_per_turn']['mean']:8.1f} KiB/turn | "
+        f"rss {result['rss_mb']:7.1f} MB (peak {result['peak_rss_mb']:7.1f}) | "
+        f"accept exact {accept['exact']:.2f} para {accept['paraphrase']:.2f} "
+        f"unknown {accept['unknown']:.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark KB retrieval latency and memory.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=200, help="turns timed per size")
+    parser.add_argument("--alloc-queries", type=int, default=20,
+                        help="turns traced for allocations per size")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--encoding", choices=ENCODINGS, default=F16,
+                        help="storage encoding of the fake knowledge_base docs")
+    parser.add_argument("--backend", choices=("exact", "ivf"), default="exact")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists probed (--backend ivf)")
+    parser.add_argument("--hybrid-mode", choices=HYBRID_MODES, default="weighted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--thresholds", help="JSON file of per-size metric limits")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run every size in this process (peak RSS becomes cumulative)")
+    args = parser.parse_args()
+
+    options = {
+        "queries": args.queries,
+        "alloc_queries": args.alloc_queries,
+        "warmup": args.warmup,
+        "dimensions": args.dimensions,
+        "encoding": args.encoding,
+        "backend": args.backend,
+        "nprobe": args.nprobe,
+        "hybrid_mode": args.hybrid_mode,
+        "seed": args.seed,
+    }
+    results = []
+    for size in args.sizes:
+        result = run_size(size, options) if args.in_process else run_isolated(size, options)
+        print_summary(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            failures = check_thresholds(results, json.load(f))
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("All thresholds met")
+
+
+if __name__ == "__main__":
+    main()
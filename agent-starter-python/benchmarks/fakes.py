@@ -0,0 +1,379 @@
+"""In-memory stand-ins for Firestore and the embedding API, for offline benchmarks.
+
+`FakeFirestore` implements the subset of the google-cloud-firestore client the
+agent and backend use: collections, documents, `where` / `order_by` / `limit` /
+`start_after` / `select` queries, `stream`, `get`, `set` / `update` / `delete`
+(with Increment, ArrayUnion, ArrayRemove, DELETE_FIELD and SERVER_TIMESTAMP),
+write batches, transactions (for `firestore.transactional`; they run one at a
+time), `get_all` and `on_snapshot` listeners (an initial ADDED
+snapshot, then one change per write). `DeterministicEmbedder` replaces `genai.embed_content` with feature
+hashing, so paraphrases that share words land close together and every run
+produces identical vectors.
+"""
+
+import datetime
+import hashlib
+import re
+import threading
+import uuid
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+ADDED = SimpleNamespace(name="ADDED")
+MODIFIED = SimpleNamespace(name="MODIFIED")
+REMOVED = SimpleNamespace(name="REMOVED")
+
+_OPERATORS = {
+    "==": lambda value, target: value == target,
+    "!=": lambda value, target: value != target,
+    "<": lambda value, target: value is not None and value < target,
+    "<=": lambda value, target: value is not None and value <= target,
+    ">": lambda value, target: value is not None and value > target,
+    ">=": lambda value, target: value is not None and value >= target,
+    "in": lambda value, target: value in target,
+    "array_contains": lambda value, target: isinstance(value, list) and target in value,
+}
+
+
+def _apply_field(current, value):
+    """Resolve Firestore write transforms (Increment, ArrayUnion, ...) by type name."""
+    kind = type(value).__name__
+    if kind == "Increment":
+        return (current or 0) + value.value
+    if kind == "ArrayUnion":
+        merged = list(current or [])
+        merged += [item for item in value.values if item not in merged]
+        return merged
+    if kind == "ArrayRemove":
+        return [item for item in current or [] if item not in value.values]
+    if kind == "Sentinel" and "server timestamp" in repr(value):
+        return datetime.datetime.now(datetime.timezone.utc)
+    return value
+
+
+def _apply_write(before: Optional[dict], data: dict) -> dict:
+    after = dict(before or {})
+    for field, value in data.items():
+        if type(value).__name__ == "Sentinel" and "delete" in repr(value):
+            after.pop(field, None)
+        else:
+            after[field] = _apply_field(after.get(field), value)
+    return after
+
+
+class DeterministicEmbedder:
+    """Signed feature hashing of word unigrams, bigrams and character trigrams."""
+
+    def __init__(self, dimensions: int = 768) -> None:
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_content(self, model: str, content, task_type: Optional[str] = None) -> dict:
+        """Drop-in for `genai.embed_content` (single text or a list of texts)."""
+        if isinstance(content, str):
+            return {"embedding": self.embed(content).tolist()}
+        return {"embedding": [self.embed(text).tolist() for text in content]}
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data: Optional[dict]) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id: str) -> None:
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection.id}/{self.id}"
+
+    def get(self, transaction=None) -> FakeDocumentSnapshot:
+        with self._collection._lock:
+            data = self._collection._docs.get(self.id)
+        return FakeDocumentSnapshot(self, data)
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self._collection._write(self.id, dict(data), merge=merge)
+
+    def update(self, fields: dict) -> None:
+        if self.id not in self._collection._docs:
+            raise KeyError(f"No document to update: {self.path}")
+        self._collection._write(self.id, dict(fields), merge=True)
+
+    def delete(self) -> None:
+        self._collection._delete(self.id)
+
+
+class FakeQuery:
+    def __init__(
+        self, collection, filters=(), order=None, limit=None, start_after=None, fields=None
+    ):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _replace(self, **changes) -> "FakeQuery":
+        state = {
+            "filters": self._filters,
+            "order": self._order,
+            "limit": self._limit,
+            "start_after": self._start_after,
+            "fields": self._fields,
+        }
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator {op!r}")
+        return self._replace(filters=(*self._filters, (field, op, value)))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._replace(order=(field, direction))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._replace(limit=count)
+
+    def start_after(self, snapshot) -> "FakeQuery":
+        return self._replace(start_after=snapshot)
+
+    def select(self, field_paths) -> "FakeQuery":
+        return self._replace(fields=tuple(field_paths))
+
+    def matches(self, data: dict) -> bool:
+        return all(_OPERATORS[op](data.get(field), value) for field, op, value in self._filters)
+
+    def _sort_key(self, doc_id: str, data: dict):
+        field = self._order[0] if self._order else "__name__"
+        return doc_id if field == "__name__" else data.get(field)
+
+    def stream(self):
+        with self._collection._lock:
+            items = [
+                (doc_id, data)
+                for doc_id, data in self._collection._docs.items()
+                if self.matches(data)
+            ]
+        if self._order is not None or self._start_after is not None:
+            descending = bool(self._order) and self._order[1] == "DESCENDING"
+            items.sort(key=lambda item: self._sort_key(*item), reverse=descending)
+        if self._start_after is not None:
+            cursor = self._sort_key(self._start_after.id, self._start_after.to_dict() or {})
+            items = [
+                item for item in items
+                if (self._sort_key(*item) < cursor if descending else self._sort_key(*item) > cursor)
+            ]
+        if self._limit is not None:
+            items = items[: self._limit]
+        for doc_id, data in items:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield FakeDocumentSnapshot(self._collection.document(doc_id), dict(data))
+
+    def get(self) -> list[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._collection._listen(self, callback)
+
+
+class FakeWatch:
+    def __init__(self, collection, listener) -> None:
+        self._collection = collection
+        self._listener = listener
+
+    def unsubscribe(self) -> None:
+        with self._collection._lock:
+            if self._listener in self._collection._listeners:
+                self._collection._listeners.remove(self._listener)
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, collection_id: str) -> None:
+        super().__init__(self)
+        self.id = collection_id
+        self._docs: dict[str, dict] = {}
+        self._listeners: list = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: dict):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def _listen(self, query: FakeQuery, callback) -> FakeWatch:
+        listener = (query, callback)
+        with self._lock:
+            self._listeners.append(listener)
+            changes = [
+                SimpleNamespace(type=ADDED, document=FakeDocumentSnapshot(self.document(doc_id), data))
+                for doc_id, data in self._docs.items()
+                if query.matches(data)
+            ]
+        callback(None, changes, None)
+        return FakeWatch(self, listener)
+
+    def _write(self, doc_id: str, data: dict, merge: bool) -> None:
+        with self._lock:
+            before = self._docs.get(doc_id)
+            after = _apply_write(before if merge else None, data)
+            self._docs[doc_id] = after
+            listeners = list(self._listeners)
+        self._notify(listeners, doc_id, before, after)
+
+    def _delete(self, doc_id: str) -> None:
+        with self._lock:
+            before = self._docs.pop(doc_id, None)
+            listeners = list(self._listeners)
+        if before is not None:
+            self._notify(listeners, doc_id, before, None)
+
+    def _notify(self, listeners, doc_id: str, before, after) -> None:
+        ref = self.document(doc_id)
+        for query, callback in listeners:
+            was_match = before is not None and query.matches(before)
+            is_match = after is not None and query.matches(after)
+            if is_match:
+                kind = MODIFIED if was_match else ADDED
+                snapshot = FakeDocumentSnapshot(ref, dict(after))
+            elif was_match:
+                kind = REMOVED
+                snapshot = FakeDocumentSnapshot(ref, dict(before))
+            else:
+                continue
+            callback(None, [SimpleNamespace(type=kind, document=snapshot)], None)
+
+
+class FakeWriteBatch:
+    def __init__(self) -> None:
+        self._ops: list = []
+
+    def set(self, ref: FakeDocumentReference, data: dict, merge: bool = False) -> None:
+        self._ops.append((ref.set, (data, merge)))
+
+    def update(self, ref: FakeDocumentReference, fields: dict) -> None:
+        self._ops.append((ref.update, (fields,)))
+
+    def delete(self, ref: FakeDocumentReference) -> None:
+        self._ops.append((ref.delete, ()))
+
+    def commit(self) -> None:
+        ops, self._ops = self._ops, []
+        for op, args in ops:
+            op(*args)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """The part of `Transaction` that `firestore.transactional` drives.
+
+    Transactions hold the client's transaction lock from begin to commit, so
+    they are serialized against each other (not against plain writes).
+    """
+
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, lock: threading.RLock) -> None:
+        super().__init__()
+        self._lock = lock
+        self._held = False
+        self._id = None
+
+    def _clean_up(self) -> None:
+        self._ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None) -> None:
+        self._lock.acquire()
+        self._held = True
+        self._id = uuid.uuid4().bytes
+
+    def _release(self) -> None:
+        self._clean_up()
+        if self._held:
+            self._held = False
+            self._lock.release()
+
+    def _commit(self) -> list:
+        try:
+            self.commit()
+        finally:
+            self._release()
+        return []
+
+    def _rollback(self) -> None:
+        self._release()
+
+
+class FakeFirestore:
+    """Stand-in for `firestore.client()` backed by per-collection dicts."""
+
+    def __init__(self) -> None:
+        self._collections: dict[str, FakeCollectionReference] = {}
+        self._lock = threading.Lock()
+        self._transaction_lock = threading.RLock()
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        with self._lock:
+            if collection_id not in self._collections:
+                self._collections[collection_id] = FakeCollectionReference(collection_id)
+            return self._collections[collection_id]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch()
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self._transaction_lock)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def listener_count(self) -> int:
+        """Open `on_snapshot` listeners across all collections."""
+        with self._lock:
+            collections = list(self._collections.values())
+        return sum(len(collection._listeners) for collection in collections)
@@ -1,23 +1,54 @@
-import logging
-import requests
-import json
 import asyncio
-from typing import AsyncIterable
+import contextvars
+import datetime
+import json
+import logging
 import os
-from difflib import SequenceMatcher
-import numpy as np
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Optional
 
+import aiohttp
+import numpy as np
 from dotenv import load_dotenv
+from frontdesk_shared.clients import registry
+from frontdesk_shared.embedding_batcher import EmbeddingBatcher
 from livekit.agents import (
-    Agent, AgentSession, JobContext, JobProcess, MetricsCollectedEvent,
-    RoomInputOptions, WorkerOptions, cli, inference, metrics,
-    function_tool, RunContext, llm, ModelSettings
+    Agent,
+    AgentSession,
+    JobContext,
+    JobProcess,
+    MetricsCollectedEvent,
+    ModelSettings,
+    RoomInputOptions,
+    RunContext,
+    UserInputTranscribedEvent,
+    WorkerOptions,
+    cli,
+    function_tool,
+    inference,
+    llm,
+    metrics,
+    utils,
 )
 from livekit.plugins import noise_cancellation, silero
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-import google.generativeai as genai
+from backend_client import BackendClient, CircuitBreaker, CircuitOpenError
+from embedding_cache import EmbeddingCache
+from escalations import EscalationDispatcher
+from kb_ann import IVFIndex, LayeredIndex, OverlayIndex
+from kb_index import KnowledgeBaseIndex
+from kb_shared import SharedKBIndex, SharedKBRefresher
+from lexical_index import HybridMatch
+from rag_context import RagContextManager
+from retrieval import RetrievalConfig, direct_answer, render_answer, retrieve
+from speculative import SpeculativeLookup
+from telemetry import configure as configure_telemetry
+from telemetry import current_room, telemetry
+from tts_cache import TTSAudioCache, cached_tts_node
+from tts_cache import prewarm as prewarm_tts
 
 load_dotenv()
 load_dotenv('.env.local', override=True)
@@ -26,20 +57,332 @@ logging.basicConfig(level=logging.INFO)
 logging.getLogger("livekit.agents").setLevel(logging.INFO)
 logging.getLogger("livekit.agents.voice").setLevel(logging.INFO)
 logger = logging.getLogger("agent")
+registry.record_import("agent")
 
 # --- Initializations ---
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 EMBEDDING_MODEL = "models/text-embedding-004"
 KB_MATCH_THRESHOLD = float(os.getenv("KB_MATCH_THRESHOLD", "0.55"))
-KB_LEXICAL_THRESHOLD = float(os.getenv("KB_LEXICAL_THRESHOLD", "0.6"))
+# Lexical-only matches need this normalized BM25 score and this many query words
+# found in the KB question.
+KB_BM25_THRESHOLD = float(os.getenv("KB_BM25_THRESHOLD", "0.5"))
+KB_LEXICAL_MIN_TERMS = int(os.getenv("KB_LEXICAL_MIN_TERMS", "3"))
+if os.getenv("KB_LEXICAL_THRESHOLD"):
+    logger.warning("KB_LEXICAL_THRESHOLD is no longer used; set KB_BM25_THRESHOLD instead")
+# Hybrid ranking: "weighted" blends cosine and normalized BM25, "rrf" fuses ranks.
+KB_HYBRID_MODE = os.getenv("KB_HYBRID_MODE", "weighted")
+KB_HYBRID_VECTOR_WEIGHT = float(os.getenv("KB_HYBRID_VECTOR_WEIGHT", "0.7"))
+KB_HYBRID_CANDIDATES = int(os.getenv("KB_HYBRID_CANDIDATES", "5"))
+# Matches at or above this cosine similarity are spoken verbatim without an LLM
+# call; unset disables direct answers. The template may use {answer} and {question}.
+KB_DIRECT_ANSWER_THRESHOLD = (
+    float(os.environ["KB_DIRECT_ANSWER_THRESHOLD"])
+    if os.getenv("KB_DIRECT_ANSWER_THRESHOLD")
+    else None
+)
+KB_DIRECT_ANSWER_TEMPLATE = os.getenv("KB_DIRECT_ANSWER_TEMPLATE", "{answer}")
+TTS_MODEL = os.getenv("TTS_MODEL", "cartesia/sonic-3")
+TTS_VOICE = os.getenv("TTS_VOICE", "9626c31c-bec5-4cca-baa8-f8ba9e84c8bc")
+# Audio for direct answers is cached on disk under TTS_CACHE_PATH (unset: off),
+# pre-synthesized for the TTS_CACHE_PREWARM most-hit KB answers.
+TTS_CACHE_PATH = os.getenv("TTS_CACHE_PATH") or None
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "64"))
+TTS_CACHE_PREWARM = int(os.getenv("TTS_CACHE_PREWARM", "20"))
+RETRIEVAL_CONFIG = RetrievalConfig(
+    match_threshold=KB_MATCH_THRESHOLD,
+    bm25_threshold=KB_BM25_THRESHOLD,
+    lexical_min_terms=KB_LEXICAL_MIN_TERMS,
+    hybrid_mode=KB_HYBRID_MODE,
+    vector_weight=KB_HYBRID_VECTOR_WEIGHT,
+    candidates=KB_HYBRID_CANDIDATES,
+)
+KB_INDEX_READY_TIMEOUT = float(os.getenv("KB_INDEX_READY_TIMEOUT", "10"))
+KB_INDEX_BACKEND = os.getenv("KB_INDEX_BACKEND", "exact")
+KB_ANN_INDEX_PATH = os.getenv("KB_ANN_INDEX_PATH", "kb_ann_index")
+KB_ANN_NPROBE = int(os.getenv("KB_ANN_NPROBE", "8"))
+# KB_INDEX_BACKEND=shared: one snapshot per host, mapped by every job process.
+KB_SHARED_PATH = os.getenv("KB_SHARED_PATH", "/dev/shm/kb_snapshot")
+KB_SHARED_PUBLISH_INTERVAL = float(os.getenv("KB_SHARED_PUBLISH_INTERVAL", "2"))
+KB_LOOKUP_DEADLINE_MS = int(os.getenv("KB_LOOKUP_DEADLINE_MS", "800"))
+KB_LOOKUP_WORKERS = int(os.getenv("KB_LOOKUP_WORKERS", "4"))
+# Facts injected into the prompt are kept in one block of at most this many
+# (estimated) tokens / facts, however long the call runs.
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "300"))
+RAG_CONTEXT_MAX_FACTS = int(os.getenv("RAG_CONTEXT_MAX_FACTS", "6"))
+# Start KB lookups on interim transcripts once they have been stable this long
+# and reuse them when the final transcript matches. Off by default ("1" turns it
+# on): every lookup that isn't reused is an extra embedding request.
+KB_SPECULATIVE_LOOKUP = os.getenv("KB_SPECULATIVE_LOOKUP", "0") == "1"
+KB_SPECULATIVE_STABLE_MS = float(os.getenv("KB_SPECULATIVE_STABLE_MS", "300"))
+KB_SPECULATIVE_MATCH = float(os.getenv("KB_SPECULATIVE_MATCH", "0.9"))
+BACKEND_API_URL = os.getenv("BACKEND_API_URL", "http://127.0.0.1:8000")
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "10"))
+BACKEND_MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", "2"))
+BACKEND_CIRCUIT_THRESHOLD = int(os.getenv("BACKEND_CIRCUIT_THRESHOLD", "5"))
+BACKEND_CIRCUIT_RESET = float(os.getenv("BACKEND_CIRCUIT_RESET", "30"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+# Query embeddings from all sessions in the process are coalesced into batched
+# calls: up to EMBEDDING_BATCH_SIZE texts gathered for EMBEDDING_BATCH_WAIT_MS.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "0"))
+# Per-stage latency histograms (see telemetry.py); "0" turns them off.
+AGENT_TELEMETRY = os.getenv("AGENT_TELEMETRY", "1") == "1"
+configure_telemetry(AGENT_TELEMETRY)
+
+# Firebase and genai are set up on first use, or by warmup in prewarm().
+db = registry.lazy("firestore")
+
+# Identifies this process to the backend so escalations can be routed to its listener.
+WORKER_ID = uuid.uuid4().hex
+
+_kb_index = None
+_kb_refresher = None
+_init_lock = threading.Lock()
+_escalation_dispatcher = None
+_kb_lookup_executor = ThreadPoolExecutor(
+    max_workers=KB_LOOKUP_WORKERS, thread_name_prefix="kb-lookup"
+)
+
+backend_client = BackendClient(
+    BACKEND_API_URL,
+    timeout=BACKEND_TIMEOUT,
+    max_retries=BACKEND_MAX_RETRIES,
+    breaker=CircuitBreaker(
+        failure_threshold=BACKEND_CIRCUIT_THRESHOLD,
+        reset_timeout=BACKEND_CIRCUIT_RESET,
+    ),
+)
+
+tts_cache = (
+    TTSAudioCache(TTS_CACHE_PATH, TTS_VOICE, max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024))
+    if TTS_CACHE_PATH else None
+)
+
+embedding_cache = EmbeddingCache(
+    max_size=EMBEDDING_CACHE_SIZE,
+    ttl_seconds=EMBEDDING_CACHE_TTL,
+    persist_path=EMBEDDING_CACHE_PATH,
+)
+
+
+def embed_texts(texts: list) -> list:
+    """Embed several texts with a single embed_content request."""
+    return registry.genai().embed_content(model=EMBEDDING_MODEL, content=texts)['embedding']
+
+
+embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    max_batch=EMBEDDING_BATCH_SIZE,
+    max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+    max_concurrency=EMBEDDING_CONCURRENCY,
+    requests_per_minute=EMBEDDING_RPM,
+)
+
+
+def embed_query(text: str) -> list:
+    """Embed a user query, serving repeated phrasings from the embedding cache."""
+    with telemetry.span("kb.embed", outcome="cached") as span:
+        embedding = embedding_cache.get(text)
+        if embedding is None:
+            span.outcome = "computed"
+            embedding = embedding_batcher.embed(text)
+            embedding_cache.put(text, embedding)
+    return embedding
+
+
+def record_kb_served(doc_id: str) -> None:
+    """Count one answer served from a KB entry, directly or as RAG context.
+
+    Counts live in `knowledge_base_stats` (doc id -> `servedCount`) rather than on
+    the entry, so they don't wake every worker's knowledge_base listener. The
+    write is fire-and-forget on the default executor; a failed one only loses a count.
+    """
+    from firebase_admin import firestore
+
+    def write():
+        try:
+            db.collection('knowledge_base_stats').document(doc_id).set(
+                {'servedCount': firestore.Increment(1)}, merge=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to count served KB answer {doc_id}: {e}")
+
+    asyncio.get_running_loop().run_in_executor(None, write)
+
+
+def most_served_kb_answers(limit: int) -> list:
+    """Blocking read of the `limit` KB entries served most, topped up with the newest.
+
+    Entries never served (a fresh KB, or one with no stats yet) are ranked by
+    `createdAt`, so the prewarm still has something to synthesize.
+    """
+    from firebase_admin import firestore
+
+    knowledge_base = db.collection('knowledge_base')
+    stats = (
+        db.collection('knowledge_base_stats')
+        .order_by('servedCount', direction=firestore.Query.DESCENDING)
+        .limit(limit)
+        .stream()
+    )
+    refs = [knowledge_base.document(doc.id) for doc in stats]
+    # get_all returns snapshots in no particular order.
+    found = {snap.id: snap for snap in db.get_all(refs) if snap.exists}
+    docs = [found[ref.id] for ref in refs if ref.id in found]
+    if len(docs) < limit:
+        newest = (
+            knowledge_base
+            .order_by('createdAt', direction=firestore.Query.DESCENDING)
+            .limit(limit)
+            .select(['question', 'answer'])
+            .stream()
+        )
+        docs += [doc for doc in newest if doc.id not in found][: limit - len(docs)]
+    return docs
+
+
+async def prewarm_tts_cache() -> None:
+    """Pre-synthesize the most-served KB answers into the TTS audio cache.
+
+    Runs once per worker process (see prewarm) with its own TTS instance, so it
+    never shares a call's TTS connection or delays a call's start.
+    """
+    try:
+        docs = await asyncio.to_thread(most_served_kb_answers, TTS_CACHE_PREWARM)
+        entries = []
+        for doc in docs:
+            text = render_answer(doc.to_dict() or {}, KB_DIRECT_ANSWER_TEMPLATE)
+            if text:
+                entries.append((doc.id, text))
+        async with utils.http_context.open():
+            tts = inference.TTS(model=TTS_MODEL, voice=TTS_VOICE)
+            try:
+                added = await prewarm_tts(tts_cache, tts, entries)
+            finally:
+                await tts.aclose()
+        if added:
+            logger.info("Pre-synthesized %d KB answers into the TTS cache", added)
+    except Exception as e:
+        logger.warning(f"TTS cache prewarm failed: {e}")
+
+
+def get_escalation_dispatcher() -> EscalationDispatcher:
+    """Return this worker's escalation dispatcher (one help_requests listener per process)."""
+    global _escalation_dispatcher
+    with _init_lock:
+        if _escalation_dispatcher is None:
+            _escalation_dispatcher = EscalationDispatcher(
+                db.collection('help_requests'), WORKER_ID
+            )
+        return _escalation_dispatcher
+
+
+def get_kb_index():
+    """Return this worker's KB index (exact, IVF or shared, per KB_INDEX_BACKEND), starting listeners on first use."""
+    global _kb_index, _kb_refresher
+    with _init_lock:
+        if _kb_index is None:
+            collection = db.collection('knowledge_base')
+            if KB_INDEX_BACKEND == "shared":
+                # Every process competes for the host's refresher lock; whoever
+                # wins keeps the Firestore listener and publishes snapshots.
+                _kb_refresher = SharedKBRefresher(
+                    collection, KB_SHARED_PATH, publish_interval=KB_SHARED_PUBLISH_INTERVAL
+                )
+                _kb_refresher.start()
+                _kb_index = SharedKBIndex(KB_SHARED_PATH)
+            elif KB_INDEX_BACKEND == "ivf":
+                ann_index = IVFIndex.open(KB_ANN_INDEX_PATH, nprobe=KB_ANN_NPROBE)
+                if ann_index.built_at is not None:
+                    built_at = datetime.datetime.fromisoformat(ann_index.built_at)
+                else:
+                    # Older files don't record it; the file's mtime is the closest bound.
+                    meta_path = os.path.join(KB_ANN_INDEX_PATH, "meta.json")
+                    built_at = datetime.datetime.fromtimestamp(
+                        os.path.getmtime(meta_path), tz=datetime.timezone.utc
+                    )
+                    logger.warning(
+                        "KB index %s has no build time; watching changes since %s. Rebuild it to fix.",
+                        KB_ANN_INDEX_PATH, built_at.isoformat(),
+                    )
+                # Entries added, edited or merged since the file was built are served
+                # from small live indexes that shadow their stale copies in the file.
+                created = OverlayIndex()
+                created.watch(collection.where('createdAt', '>', built_at))
+                updated = OverlayIndex()
+                updated.watch(collection.where('updatedAt', '>', built_at))
+                _kb_index = LayeredIndex([ann_index, created, updated])
+                logger.info(
+                    "Opened IVF KB index %s with %d entries", KB_ANN_INDEX_PATH, len(ann_index)
+                )
+            else:
+                _kb_index = KnowledgeBaseIndex()
+                _kb_index.watch(collection)
+        return _kb_index
+
+def find_kb_answer(user_query: str) -> Optional[HybridMatch]:
+    """Blocking KB retrieval: embed the query and return the accepted match, if any."""
+    query_embedding = np.asarray(embed_query(user_query), dtype=np.float32)
+    if np.linalg.norm(query_embedding) == 0:
+        logger.warning("Query embedding norm is zero; skipping KB search")
+        return None
+
+    kb_index = get_kb_index()
+    if not kb_index.ready:
+        with telemetry.span("kb.index_wait"):
+            kb_index.wait_until_ready(KB_INDEX_READY_TIMEOUT)
+
+    return retrieve(kb_index, user_query, query_embedding, RETRIEVAL_CONFIG)
+
+
+def start_kb_lookup(user_query: str) -> asyncio.Future:
+    """Start `find_kb_answer` on the lookup executor."""
+    # Copy the context so the worker thread's spans are tagged with this room.
+    lookup = contextvars.copy_context().run
+    return asyncio.get_running_loop().run_in_executor(
+        _kb_lookup_executor, lookup, find_kb_answer, user_query
+    )
+
+
+async def lookup_kb_answer(
+    user_query: str, pending: Optional[asyncio.Future] = None
+) -> Optional[HybridMatch]:
+    """Run KB retrieval off the event loop, giving up after KB_LOOKUP_DEADLINE_MS.
+
+    `pending` is a lookup for this query that is already running (a speculative
+    one); otherwise a new one is started. A lookup that misses the deadline keeps
+    running in its worker thread (and still warms the embedding cache), but the
+    turn goes ahead without RAG context.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with telemetry.span("kb.lookup", outcome="miss") as span:
+        try:
+            # Shield a shared lookup so a timeout here doesn't cancel it for a retried turn.
+            future = asyncio.shield(pending) if pending is not None else start_kb_lookup(user_query)
+            match = await asyncio.wait_for(future, timeout=KB_LOOKUP_DEADLINE_MS / 1000)
+            if match is not None:
+                span.outcome = "hit"
+            return match
+        except asyncio.TimeoutError:
+            span.outcome = "timed_out"
+            logger.warning(
+                "KB lookup exceeded %d ms deadline; continuing without RAG context",
+                KB_LOOKUP_DEADLINE_MS,
+            )
+        except Exception as e:
+            span.outcome = "error"
+            logger.error(f"KB lookup failed: {e}", exc_info=True)
+        finally:
+            logger.debug("KB lookup took %.1f ms", (loop.time() - started) * 1000)
+    return None
 
-if not firebase_admin._apps:
-    cred = credentials.Certificate("service-account.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(self, speculation: Optional[SpeculativeLookup] = None) -> None:
         super().__init__(
             instructions="""You are a helpful and friendly receptionist for a salon named 'Glamour Cuts'.
             Your goal is to answer customer questions based on the information you have.
@@ -58,13 +401,20 @@ class Assistant(Agent):
             """,
         )
         self._current_chat_ctx = None
+        self.speculation = speculation
+        self.rag_context = RagContextManager(
+            token_budget=RAG_CONTEXT_TOKEN_BUDGET, max_facts=RAG_CONTEXT_MAX_FACTS
+        )
         self.pending_escalations = {}  # Track pending escalations
+        self._direct_answers = {}  # spoken direct-answer text -> KB doc id
     
     async def llm_node(
         self, chat_ctx: llm.ChatContext, tools: list, model_settings: ModelSettings
     ) -> AsyncIterable[llm.ChatChunk]:
         self._current_chat_ctx = chat_ctx
-        
+        turn_started = time.perf_counter()
+        turn_outcome = "no_query"
+
         last_user_message = None
         for item in reversed(chat_ctx.items):
             role = getattr(item, "role", None)
@@ -76,153 +426,91 @@ class Assistant(Agent):
             user_query = last_user_message.text_content
             logger.info("Searching knowledge base for: '%s'", user_query)
 
-            embedding_result = genai.embed_content(model=EMBEDDING_MODEL, content=user_query)
-            query_embedding = np.asarray(embedding_result['embedding'], dtype=np.float32)
-            query_norm = np.linalg.norm(query_embedding)
-            
-            if query_norm == 0:
-                logger.warning("Query embedding norm is zero; skipping KB search")
-            else:
-                kb_docs = db.collection('knowledge_base').stream()
-
-                best_match = None
-                highest_similarity = -1.0
-
-                for doc in kb_docs:
-                    doc_data = doc.to_dict()
-                    doc_embedding_list = (
-                        doc_data.get('content_embedding')
-                        or doc_data.get('question_embedding')
-                    )
-
-                    if not doc_embedding_list or not isinstance(doc_embedding_list, list):
-                        fallback_text = None
-                        question_text = doc_data.get('question')
-                        answer_text = doc_data.get('answer')
-                        if question_text and answer_text:
-                            fallback_text = f"Question: {question_text}\nAnswer: {answer_text}"
-                        elif question_text:
-                            fallback_text = question_text
-                        elif answer_text:
-                            fallback_text = answer_text
-
-                        if fallback_text:
-                            try:
-                                logger.info("Backfilling missing embedding for KB doc %s", doc.id)
-                                backfill_embedding = genai.embed_content(
-                                    model=EMBEDDING_MODEL,
-                                    content=fallback_text,
-                                )["embedding"]
-                                if isinstance(backfill_embedding, list):
-                                    doc_embedding_list = backfill_embedding
-                                    doc.reference.update({
-                                        'content_embedding': backfill_embedding,
-                                    })
-                            except Exception as backfill_error:
-                                logger.warning(
-                                    "Could not backfill embedding for KB doc %s: %s",
-                                    doc.id,
-                                    backfill_error,
-                                )
-
-                    if not doc_embedding_list or not isinstance(doc_embedding_list, list):
-                        continue
-
-                    doc_embedding = np.asarray(doc_embedding_list, dtype=np.float32)
-                    doc_norm = np.linalg.norm(doc_embedding)
-                    if doc_norm == 0:
-                        continue
-
-                    similarity = float(
-                        np.dot(query_embedding, doc_embedding)
-                        / (query_norm * doc_norm)
-                    )
+            pending = None
+            if self.speculation is not None:
+                pending, head_start_ms = self.speculation.take(user_query)
+                telemetry.record(
+                    "kb.speculation", head_start_ms, "reused" if pending else "not_reused"
+                )
+            match = await lookup_kb_answer(user_query, pending)
+            turn_outcome = "hit" if match else "miss"
+            if match:
+                record_kb_served(match.doc_id)
+                # Keyed by doc, so a fact matched on several turns is injected once.
+                # Relevance is on the cosine scale, like the 1.0 of supervisor answers;
+                # the fused hybrid score (RRF is ~0.03) isn't comparable.
+                self.rag_context.add(
+                    f"kb:{match.doc_id}",
+                    f"Q: {match.data.get('question')} A: {match.data.get('answer')}",
+                    relevance=min(max(match.similarity, 0.0), 1.0),
+                )
 
-                    if similarity > highest_similarity:
-                        highest_similarity = similarity
-                        best_match = doc_data
+            answer_text = direct_answer(
+                match, KB_DIRECT_ANSWER_THRESHOLD, KB_DIRECT_ANSWER_TEMPLATE
+            )
+            if answer_text:
+                # Strong match: speak the trusted answer and skip the LLM round trip.
+                logger.info("Answering directly from KB (similarity %.3f)", match.similarity)
+                if len(self._direct_answers) >= 64:
+                    self._direct_answers.clear()
+                self._direct_answers[answer_text] = match.doc_id
+                telemetry.record(
+                    "llm.first_chunk", (time.perf_counter() - turn_started) * 1000, "direct"
+                )
+                yield answer_text
+                return
 
-                if best_match:
-                    logger.info(
-                        "Knowledge base best match similarity %.3f for question '%s'",
-                        highest_similarity,
-                        best_match.get('question'),
-                    )
-                    answer = best_match.get('answer')
-                    similarity_ok = highest_similarity >= KB_MATCH_THRESHOLD
-                    
-                    if not similarity_ok:
-                        question_text = best_match.get('question', "")
-                        normalized_query = " ".join(
-                            user_query.lower().strip().rstrip("?.!").split()
-                        )
-                        normalized_question = " ".join(
-                            question_text.lower().strip().rstrip("?.!").split()
-                        )
-                        if normalized_query and normalized_question:
-                            lexical_ratio = SequenceMatcher(
-                                None, normalized_query, normalized_question
-                            ).ratio()
-                            logger.debug(
-                                "KB lexical ratio %.3f for '%s' vs '%s'",
-                                lexical_ratio,
-                                normalized_query,
-                                normalized_question,
-                            )
-                            if lexical_ratio >= KB_LEXICAL_THRESHOLD:
-                                similarity_ok = True
-                        if not similarity_ok and normalized_query == normalized_question:
-                            similarity_ok = True
-
-                    if not similarity_ok:
-                        logger.info(
-                            "Knowledge base match %.3f below threshold %.2f", 
-                            highest_similarity,
-                            KB_MATCH_THRESHOLD,
-                        )
-
-                    if answer and similarity_ok:
-                        rag_context = (
-                            f"ADDITIONAL CONTEXT: The user asked '{user_query}'. "
-                            f"A similar question was answered before. The trusted answer is: '{answer}' "
-                            f"Use this answer to respond to the user."
-                        )
-                        chat_ctx.add_message(role='system', content=rag_context)
-                        logger.info("Added RAG context to chat")
+        with telemetry.span("llm.context_injection"):
+            context_tokens = self.rag_context.apply(chat_ctx)
+        if context_tokens:
+            logger.info(
+                "RAG context: %d facts, ~%d tokens", len(self.rag_context), context_tokens
+            )
 
+        first_chunk = True
         async for chunk in super().llm_node(chat_ctx, tools, model_settings):
+            if first_chunk:
+                first_chunk = False
+                telemetry.record(
+                    "llm.first_chunk", (time.perf_counter() - turn_started) * 1000, turn_outcome
+                )
             yield chunk
 
+    def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        if tts_cache is None:
+            return Agent.default.tts_node(self, text, model_settings)
+        # Direct answers play from cached audio; everything else is synthesized live.
+        return cached_tts_node(
+            tts_cache,
+            text,
+            lambda chunks: Agent.default.tts_node(self, chunks, model_settings),
+            self._direct_answers,
+        )
+
     async def _listen_for_resolution(self, session: AgentSession, request_id: str):
         """Listen for supervisor response and add it to context"""
-        loop = asyncio.get_running_loop()
-        doc_ref = db.collection('help_requests').document(request_id)
-        response_received = asyncio.Event()
-        supervisor_response = None
-
-        def on_snapshot(doc_snapshot, changes, read_time):
-            nonlocal supervisor_response
-            for doc in doc_snapshot:
-                if doc.exists:
-                    data = doc.to_dict()
-                    if data.get('status') == 'resolved':
-                        supervisor_response = data.get('supervisorResponse')
-                        logger.info(f"Supervisor response received for {request_id}: {supervisor_response}")
-                        response_received.set()
-
-        doc_watch = doc_ref.on_snapshot(on_snapshot)
-        
+        wait_started = time.perf_counter()
+
         try:
-            await asyncio.wait_for(response_received.wait(), timeout=60.0)
+            data = await get_escalation_dispatcher().wait_for_resolution(request_id, timeout=60.0)
+            telemetry.record(
+                "escalation.wait", (time.perf_counter() - wait_started) * 1000, data.get('status')
+            )
+            supervisor_response = None
+            if data.get('status') == 'resolved':
+                supervisor_response = data.get('supervisorResponse')
+                logger.info(f"Supervisor response received for {request_id}: {supervisor_response}")
+            else:
+                logger.info(f"Request {request_id} was marked {data.get('status')}")
             
             if supervisor_response:
-                # Add supervisor's answer to knowledge base context
-                if self._current_chat_ctx:
-                    context_msg = (
-                        f"ADDITIONAL CONTEXT: The supervisor has provided this answer: '{supervisor_response}'. "
-                        f"You must use this information to answer the user's question."
-                    )
-                    self._current_chat_ctx.add_message(role='system', content=context_msg)
+                # Injected into the context block from the next turn on.
+                question = self.pending_escalations.get(request_id)
+                self.rag_context.add(
+                    f"request:{request_id}",
+                    f"Q: {question} A: {supervisor_response}" if question
+                    else f"Supervisor answer: {supervisor_response}",
+                )
                 
                 # Speak the response
                 await session.say(f"I have an update from my supervisor. {supervisor_response}")
@@ -232,18 +520,24 @@ class Assistant(Agent):
                     del self.pending_escalations[request_id]
                     
         except asyncio.TimeoutError:
+            telemetry.record(
+                "escalation.wait", (time.perf_counter() - wait_started) * 1000, "timed_out"
+            )
             logger.warning(f"Timed out waiting for response for request {request_id}")
             try:
-                doc_ref.update({
-                    'status': 'unresolved',
-                    'resolvedAt': firestore.SERVER_TIMESTAMP 
-                })
-                logger.info(f"Marked request {request_id} as 'unresolved' due to timeout.")
+                # Other callers may share the request; the backend marks it
+                # unresolved once the last of them gives up.
+                response = await backend_client.post_json(
+                    f"/api/help-requests/{request_id}/timeout", {"agentWorkerId": WORKER_ID}
+                )
+                if response.get("status") == "unresolved":
+                    logger.info(f"Marked request {request_id} as 'unresolved' due to timeout.")
+                else:
+                    logger.info(f"Left request {request_id} ({response.get('status')}) due to timeout.")
             except Exception as e:
-                logger.error(f"Failed to mark request {request_id} as unresolved: {e}")
+                logger.error(f"Failed to report timeout of request {request_id}: {e}")
         finally:
-            logger.info(f"Unsubscribing from request {request_id}")
-            doc_watch.unsubscribe()
+            logger.info(f"Stopped waiting for request {request_id}")
 
     @function_tool()
     async def request_human_supervisor(self, context: RunContext, user_query: str):
@@ -284,77 +578,113 @@ class Assistant(Agent):
             "originalQuery": user_query,
             "conversationHistory": chat_history,
             "livekitRoomId": room_sid,
-            "livekitParticipantId": user_participant_sid
+            "livekitParticipantId": user_participant_sid,
+            "agentWorkerId": WORKER_ID,
         }
         
-        try:
-            logger.info(f"📤 Sending help request to backend...")
-            logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
+        with telemetry.span("escalation.create", outcome="escalated") as span:
+            try:
+                logger.info(f"📤 Sending help request to backend...")
+                logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
             
-            response = requests.post(
-                "http://127.0.0.1:8000/api/help-requests", 
-                json=payload,
-                timeout=10
-            )
+                response_data = await backend_client.post_json("/api/help-requests", payload)
             
-            logger.info(f"📥 Backend response status: {response.status_code}")
-            logger.debug(f"Response body: {response.text}")
+                logger.debug(f"Response body: {response_data}")
             
-            response.raise_for_status()
-            response_data = response.json()
-            request_id = response_data.get("requestId")
+                request_id = response_data.get("requestId")
             
-            if request_id:
-                logger.info(f"✅ Help request created with ID: {request_id}")
+                if request_id:
+                    if response_data.get("coalesced"):
+                        # Another caller asked the same thing; their answer is ours too.
+                        span.outcome = "coalesced"
+                        logger.info(f"🔗 Joined pending help request {request_id}")
+                    else:
+                        logger.info(f"✅ Help request created with ID: {request_id}")
                 
-                # Track this escalation
-                self.pending_escalations[request_id] = user_query
+                    # Track this escalation
+                    self.pending_escalations[request_id] = user_query
                 
-                # Start listening for resolution in the background
-                asyncio.create_task(
-                    self._listen_for_resolution(context.session, request_id)
-                )
+                    # Start listening for resolution in the background
+                    asyncio.create_task(
+                        self._listen_for_resolution(context.session, request_id)
+                    )
                 
-                return (
-                    "I don't have that information right now. "
-                    "I've contacted my supervisor and they'll get back to you shortly with an answer."
-                )
-            else:
-                logger.error("❌ No requestId returned from backend")
-                logger.error(f"Response data: {response_data}")
-                return "I've tried to reach my supervisor but didn't get a confirmation. Please try again."
+                    return (
+                        "I don't have that information right now. "
+                        "I've contacted my supervisor and they'll get back to you shortly with an answer."
+                    )
+                else:
+                    logger.error("❌ No requestId returned from backend")
+                    span.outcome = "no_request_id"
+                    logger.error(f"Response data: {response_data}")
+                    return "I've tried to reach my supervisor but didn't get a confirmation. Please try again."
                 
-        except requests.Timeout as e:
-            logger.error(f"⏱️ Request timeout: {e}")
-            return "My supervisor didn't respond in time. Please try again."
-        except requests.ConnectionError as e:
-            logger.error(f"🔌 Connection error: {e}")
-            return "I can't connect to my supervisor right now. Please make sure the backend server is running."
-        except requests.HTTPError as e:
-            logger.error(f"🚫 HTTP error {e.response.status_code}: {e.response.text}")
-            return "There was an error reaching my supervisor. Please try again."
-        except requests.RequestException as e:
-            logger.error(f"❌ Request failed: {e}")
-            return "I'm having trouble reaching my supervisor right now. Please try again in a moment."
-        except Exception as e:
-            logger.error(f"💥 Unexpected error: {e}", exc_info=True)
-            return "An unexpected error occurred. Please try again."
+            except CircuitOpenError as e:
+                span.outcome = "circuit_open"
+                logger.error(f"⛔ Backend unavailable, failing fast: {e}")
+                return "I can't reach my supervisor right now. Please try again in a little while."
+            except asyncio.TimeoutError as e:
+                span.outcome = "timed_out"
+                logger.error(f"⏱️ Request timeout: {e}")
+                return "My supervisor didn't respond in time. Please try again."
+            except aiohttp.ClientConnectionError as e:
+                span.outcome = "connection_error"
+                logger.error(f"🔌 Connection error: {e}")
+                return "I can't connect to my supervisor right now. Please make sure the backend server is running."
+            except aiohttp.ClientResponseError as e:
+                span.outcome = "http_error"
+                logger.error(f"🚫 HTTP error {e.status}: {e.message}")
+                return "There was an error reaching my supervisor. Please try again."
+            except aiohttp.ClientError as e:
+                span.outcome = "error"
+                logger.error(f"❌ Request failed: {e}")
+                return "I'm having trouble reaching my supervisor right now. Please try again in a moment."
+            except Exception as e:
+                span.outcome = "error"
+                logger.error(f"💥 Unexpected error: {e}", exc_info=True)
+                return "An unexpected error occurred. Please try again."
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    embedding_cache.load()
+    kb_index = get_kb_index()
+    if KB_INDEX_BACKEND == "shared" and kb_index.ready:
+        # Mapping is zero-copy; this just saves the first turn the page-in.
+        logger.info("Mapped shared KB snapshot %s", kb_index.version)
+    # Creates whichever clients the KB index didn't and marks the process ready.
+    startup = registry.warmup()
+    logger.info(f"Startup: {json.dumps(startup)}")
+    if tts_cache is not None and KB_DIRECT_ANSWER_THRESHOLD is not None and TTS_CACHE_PREWARM > 0:
+        # On its own thread and loop: synthesis can outlast the process init timeout.
+        threading.Thread(
+            target=lambda: asyncio.run(prewarm_tts_cache()), name="tts-prewarm", daemon=True
+        ).start()
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
+    current_room.set(ctx.room.name)
     
     session = AgentSession(
         stt=inference.STT(model="assemblyai/universal-streaming", language="en"),
         llm=inference.LLM(model="openai/gpt-4.1-mini"),
-        tts=inference.TTS(model="cartesia/sonic-3", voice="9626c31c-bec5-4cca-baa8-f8ba9e84c8bc"),
+        tts=inference.TTS(model=TTS_MODEL, voice=TTS_VOICE),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
     
     usage_collector = metrics.UsageCollector()
+
+    speculation = None
+    if KB_SPECULATIVE_LOOKUP:
+        speculation = SpeculativeLookup(
+            start_kb_lookup,
+            stable_ms=KB_SPECULATIVE_STABLE_MS,
+            match_ratio=KB_SPECULATIVE_MATCH,
+        )
+
+        @session.on("user_input_transcribed")
+        def _on_user_input_transcribed(ev: UserInputTranscribedEvent):
+            speculation.on_transcript(ev.transcript, ev.is_final)
     
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
@@ -364,11 +694,40 @@ async def entrypoint(ctx: JobContext):
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        logger.info(f"Embedding cache: {embedding_cache.stats()}")
+        logger.info(f"Embedding batches: {embedding_batcher.stats()}")
+        logger.info(f"RAG context: {assistant.rag_context.stats()}")
+        if tts_cache is not None:
+            logger.info(f"TTS audio cache: {tts_cache.stats()}")
+        if speculation is not None:
+            speculation.close()
+            logger.info(f"Speculative KB lookups: {speculation.stats()}")
+        if telemetry.enabled:
+            stages = telemetry.summary(ctx.room.name)
+            logger.info(f"Stage latency: {json.dumps(stages)}")
+            first_chunk = stages.get("llm.first_chunk", {})
+            direct = first_chunk.get("direct", {})
+            if direct:
+                answered = sum(outcome["count"] for outcome in first_chunk.values())
+                llm_hit = first_chunk.get("hit", {})
+                logger.info(
+                    "Direct KB answers: %d of %d turns (%.0f%%), first chunk %.0f ms vs %s via LLM",
+                    direct["count"],
+                    answered,
+                    100 * direct["count"] / answered,
+                    direct["mean_ms"],
+                    f"{llm_hit['mean_ms']:.0f} ms" if llm_hit else "n/a",
+                )
+            telemetry.reset(ctx.room.name)
+        embedding_cache.save()
     
+    assistant = Assistant(speculation=speculation)
     ctx.add_shutdown_callback(log_usage)
+    # The backend connection pool belongs to this job's event loop.
+    ctx.add_shutdown_callback(backend_client.aclose)
     
     await session.start(
-        agent=Assistant(),
+        agent=assistant,
         room=ctx.room,
         room_input_options=RoomInputOptions(noise_cancellation=noise_cancellation.BVC()),
     )
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Optional
+
+import aiohttp
+
+logger = logging.getLogger("agent.backend_client")
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while the backend circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_timeout` seconds; then a single trial call decides whether it closes."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def abandon(self) -> None:
+        """Forget an in-flight trial call that ended without a verdict (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.warning("Backend circuit opened after %d failures", self._failures)
+            self._opened_at = time.monotonic()
+
+
+class BackendClient:
+    """Process-wide async client for the backend API.
+
+    Connections are pooled and kept alive across calls. Requests that never
+    reached the server (connect errors) are retried for every method; timeouts
+    and 502/503/504 responses are retried only for idempotent methods. Retries
+    back off exponentially with full jitter, and a circuit breaker makes calls
+    fail fast while the backend is down.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        breaker: Optional[CircuitBreaker] = None,
+        pool_size: int = 32,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+        # One pool per event loop: a session can't be used, or closed, from another loop.
+        self._sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            for other in [other for other in self._sessions if other.is_closed()]:
+                logger.warning("Dropping backend session of a closed event loop; call aclose() first")
+                del self._sessions[other]
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def aclose(self) -> None:
+        """Close the running loop's session; call before the loop shuts down."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    close = aclose
+
+    async def request(self, method: str, path: str, json: Any = None) -> Any:
+        """Send a request and return the decoded JSON body.
+
+        Raises CircuitOpenError, aiohttp.ClientError or asyncio.TimeoutError.
+        """
+        method = method.upper()
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"backend circuit is {self.breaker.state}")
+
+        url = f"{self.base_url}{path}"
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().request(method, url, json=json) as response:
+                    if (
+                        response.status in RETRYABLE_STATUSES
+                        and idempotent
+                        and attempt < self.max_retries
+                    ):
+                        raise _RetryableStatusError(response.status)
+                    response.raise_for_status()
+                    body = await response.json()
+                self.breaker.record_success()
+                return body
+            except (_RetryableStatusError, aiohttp.ClientConnectorError, asyncio.TimeoutError) as e:
+                retryable = isinstance(e, aiohttp.ClientConnectorError) or idempotent
+                if not retryable or attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+                logger.info("Retrying %s %s in %.2fs after %r", method, path, delay, e)
+                await asyncio.sleep(delay)
+            except aiohttp.ClientResponseError as e:
+                if e.status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                raise
+            except aiohttp.ClientError:
+                self.breaker.record_failure()
+                raise
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+
+    async def post_json(self, path: str, payload: Any) -> Any:
+        return await self.request("POST", path, json=payload)
+
+
+class _RetryableStatusError(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
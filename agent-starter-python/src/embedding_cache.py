@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from lexical_index import normalize_query
+
+logger = logging.getLogger("agent.embedding_cache")
+
+
+class EmbeddingCache:
+    """Bounded LRU + TTL cache of query embeddings keyed on normalized query text.
+
+    Entries are timestamped with wall-clock time so that a cache restored from
+    `persist_path` expires on the same schedule as the one that wrote it.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl_seconds: float = 24 * 60 * 60,
+        persist_path: Optional[str] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[list, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[list]:
+        key = normalize_query(text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, embedding: list) -> None:
+        key = normalize_query(text)
+        if not key or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (embedding, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self) -> int:
+        """Restore unexpired entries from `persist_path`; returns how many were loaded."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return 0
+        try:
+            with open(self.persist_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load embedding cache from %s: %s", self.persist_path, e)
+            return 0
+
+        now = time.time()
+        with self._lock:
+            # Stored oldest-first, so replaying keeps the LRU order.
+            for key, embedding, stored_at in stored.get("entries", []):
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries[key] = (embedding, stored_at)
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            loaded = len(self._entries)
+        logger.info("Loaded %d cached query embeddings from %s", loaded, self.persist_path)
+        return loaded
+
+    def save(self) -> None:
+        """Atomically write the cache to `persist_path` (no-op when persistence is off)."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            entries = [[key, emb, ts] for key, (emb, ts) in self._entries.items()]
+
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning("Could not save embedding cache to %s: %s", self.persist_path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("agent.escalations")
+
+TERMINAL_STATUSES = ("resolved", "unresolved")
+
+
+class EscalationDispatcher:
+    """One `help_requests` listener per process, fanned out to per-request futures.
+
+    The backend tags every help request with the ids of the workers waiting on it
+    (`watcherIds`), so a single `array_contains` query covers all of this worker's
+    escalations no matter how many are in flight. Firestore delivers snapshots on
+    its own thread; results are handed to each waiter's event loop with
+    `call_soon_threadsafe`.
+
+    Several sessions can wait on one request (the backend coalesces escalations
+    of the same question), so settled results are kept for waiters that arrive
+    after the status changed.
+    """
+
+    def __init__(self, collection, worker_id: str, settled_limit: int = 1024) -> None:
+        self.collection = collection
+        self.worker_id = worker_id
+        self._settled_limit = settled_limit
+        self._lock = threading.Lock()
+        self._waiters: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._settled: OrderedDict[str, dict] = OrderedDict()
+        self._watch = None
+
+    @property
+    def listener_count(self) -> int:
+        return 0 if self._watch is None else 1
+
+    @property
+    def waiter_count(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _ensure_watch(self) -> None:
+        with self._lock:
+            if self._watch is not None:
+                return
+            query = self.collection.where("watcherIds", "array_contains", self.worker_id)
+            self._watch = query.on_snapshot(self._on_snapshot)
+            logger.info("Started escalation listener for worker %s", self.worker_id)
+
+    def close(self) -> None:
+        with self._lock:
+            watch, self._watch = self._watch, None
+        if watch is not None:
+            watch.unsubscribe()
+
+    async def wait_for_resolution(self, request_id: str, timeout: float) -> dict:
+        """Wait until `request_id` leaves 'pending' and return its document data.
+
+        Raises asyncio.TimeoutError if that does not happen within `timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            data = self._settled.get(request_id)
+            if data is not None:
+                return data
+            self._waiters.setdefault(request_id, []).append((loop, future))
+        self._ensure_watch()
+
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(request_id)
+                if waiters is not None:
+                    waiters[:] = [w for w in waiters if w[1] is not future]
+                    if not waiters:
+                        del self._waiters[request_id]
+
+    def _on_snapshot(self, docs, changes, read_time) -> None:
+        for change in changes:
+            if change.type.name == "REMOVED":
+                continue
+            data = change.document.to_dict() or {}
+            if data.get("status") in TERMINAL_STATUSES:
+                self._settle(change.document.id, data)
+
+    def _settle(self, request_id: str, data: dict) -> None:
+        with self._lock:
+            waiters = self._waiters.pop(request_id, None)
+            # Keep it for waiters that start after this (a late or coalesced caller).
+            self._settled[request_id] = data
+            self._settled.move_to_end(request_id)
+            while len(self._settled) > self._settled_limit:
+                self._settled.popitem(last=False)
+            if not waiters:
+                return
+
+        logger.info("Escalation %s is %s", request_id, data.get("status"))
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_result, future, data)
+
+
+def _set_result(future: asyncio.Future, data: dict) -> None:
+    if not future.done():
+        future.set_result(data)
+
@@ -0,0 +1,450 @@
+"""Approximate nearest-neighbour (IVF) backend for knowledge base retrieval.
+
+Build an index from Firestore and check it against exact search:
+
+    python src/kb_ann.py build --out kb_ann_index
+    python src/kb_ann.py report --index kb_ann_index --nprobe 1,4,16
+
+Workers open the saved directory with `IVFIndex.open`; the vector matrix is
+memory-mapped, so startup does not read Firestore or copy the vectors.
+
+The file is never rewritten in place. Entries created or updated after it was
+built are served from live overlays (see OverlayIndex) that hide their stale
+copies. The overlays only see writes that set `createdAt` or `updatedAt`, so a
+KB entry older than the file is hidden only if it is soft-deleted: set
+`deletedAt` and `updatedAt` on it. A hard delete of such an entry stays
+searchable until the file is rebuilt.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+from typing import Optional
+
+import numpy as np
+from frontdesk_shared.embedding_codec import doc_embedding
+
+from kb_index import KBMatch, KnowledgeBaseIndex
+from lexical_index import LexicalIndex
+
+logger = logging.getLogger("agent.kb_ann")
+
+INDEX_FORMAT_VERSION = 1
+METADATA_FIELDS = ("question", "answer", "sourceRequestId")
+REPORT_QUERY_SAMPLE = 1000
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 16384) -> np.ndarray:
+    labels = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk):
+        labels[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """Cluster unit vectors by cosine similarity; returns (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(vectors.shape[0], size=nlist, replace=False)].copy()
+    labels = _assign(vectors, centroids)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            # Re-seed empty lists with random members so every list stays in use.
+            sums[empty] = vectors[rng.choice(vectors.shape[0], size=empty.size, replace=False)]
+        centroids = _normalize_rows(sums).astype(np.float32)
+        new_labels = _assign(vectors, centroids)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return centroids, labels
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are grouped by nearest centroid and a query
+    only scores the `nprobe` lists whose centroids are closest to it.
+
+    Exposes the same `search` / `ready` interface as KnowledgeBaseIndex.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        vectors: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: list[str],
+        docs: list[dict],
+        built_at: Optional[str] = None,
+        nprobe: int = 8,
+    ) -> None:
+        self.centroids = centroids
+        self.vectors = vectors
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.docs = docs
+        self.built_at = built_at
+        self.nprobe = nprobe
+        self._lexical: Optional[LexicalIndex] = None
+        self._lexical_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    @classmethod
+    def build(
+        cls,
+        doc_ids: list[str],
+        vectors: np.ndarray,
+        docs: list[dict],
+        nlist: Optional[int] = None,
+        iterations: int = 10,
+        seed: int = 0,
+        built_at: Optional[str] = None,
+    ) -> "IVFIndex":
+        """Cluster `vectors` into an index.
+
+        `built_at` is when the docs were read (ISO 8601); pass the time the read
+        started so writes made during the build are picked up by the live layer.
+        """
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32)).astype(np.float32)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(len(doc_ids))))
+        nlist = max(1, min(nlist, len(doc_ids)))
+
+        centroids, labels = spherical_kmeans(vectors, nlist, iterations=iterations, seed=seed)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        return cls(
+            centroids,
+            np.ascontiguousarray(vectors[order]),
+            offsets,
+            [doc_ids[i] for i in order],
+            [docs[i] for i in order],
+            built_at=built_at or datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        )
+
+    def save(self, path: str, queries: Optional[np.ndarray] = None) -> None:
+        """Write the index to directory `path`, replacing any previous version atomically."""
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".kb_ann-")
+        np.save(os.path.join(tmp_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), self.vectors)
+        np.save(os.path.join(tmp_dir, "offsets.npy"), self.offsets)
+        if queries is not None and len(queries):
+            np.save(os.path.join(tmp_dir, "queries.npy"), np.asarray(queries, dtype=np.float32))
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "built_at": self.built_at,
+                "doc_ids": self.doc_ids,
+                "docs": self.docs,
+            }, f)
+
+        if os.path.exists(path):
+            old_dir = f"{tmp_dir}.old"
+            os.rename(path, old_dir)
+            os.rename(tmp_dir, path)
+            shutil.rmtree(old_dir)
+        else:
+            os.rename(tmp_dir, path)
+
+    @classmethod
+    def open(cls, path: str, nprobe: int = 8) -> "IVFIndex":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported KB index format {meta.get('version')!r} in {path}")
+        return cls(
+            np.load(os.path.join(path, "centroids.npy")),
+            np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "offsets.npy")),
+            meta["doc_ids"],
+            meta["docs"],
+            built_at=meta.get("built_at"),
+            nprobe=nprobe,
+        )
+
+    def search(
+        self, query_embedding, top_k: int = 1, nprobe: Optional[int] = None
+    ) -> list[KBMatch]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0 or top_k <= 0 or not self.doc_ids:
+            return []
+        query = query / query_norm
+
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+
+        rows = []
+        scores = []
+        for list_id in probe:
+            start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+            if start == end:
+                continue
+            rows.append(np.arange(start, end))
+            scores.append(self.vectors[start:end] @ query)
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(scores, -k)[-k:] if k < scores.shape[0] else np.arange(k)
+        top = top[np.argsort(scores[top])[::-1]]
+        return [
+            KBMatch(self.doc_ids[rows[i]], float(scores[i]), self.docs[rows[i]])
+            for i in top
+        ]
+
+    def lexical_search(self, query: str, top_k: int = 5) -> list[KBMatch]:
+        with self._lexical_lock:
+            if self._lexical is None:
+                # Built on first use from the saved questions; no Firestore reads.
+                self._lexical = LexicalIndex()
+                for row, data in enumerate(self.docs):
+                    self._lexical.upsert(str(row), data.get("question"))
+        return [
+            KBMatch(self.doc_ids[int(row)], score, self.docs[int(row)])
+            for row, score in self._lexical.search(query, top_k)
+        ]
+
+    def exact_search(self, query_embedding, top_k: int = 1) -> list[KBMatch]:
+        """Brute-force search over every stored vector (for recall reports)."""
+        return self.search(query_embedding, top_k=top_k, nprobe=self.centroids.shape[0])
+
+
+class OverlayIndex(KnowledgeBaseIndex):
+    """Live index of KB docs written since the ANN file was built.
+
+    Besides serving those docs, it tracks which entries of the file they make
+    stale: docs it holds (a newer version), docs deleted or soft-deleted
+    (`deletedAt`) while it watched them, and duplicates that compaction merged
+    into a doc it holds (`mergedDocIds`).
+    """
+
+    def __init__(self, initial_capacity: int = 256) -> None:
+        super().__init__(initial_capacity)
+        self._removed: set[str] = set()
+
+    def upsert(self, doc_id: str, doc_data: dict) -> None:
+        with self._lock:
+            self._removed.discard(doc_id)
+        super().upsert(doc_id, doc_data)
+
+    def remove(self, doc_id: str) -> None:
+        super().remove(doc_id)
+        with self._lock:
+            self._removed.add(doc_id)
+
+    def shadowed_ids(self) -> set[str]:
+        with self._lock:
+            shadowed = set(self._rows) | self._removed
+            for data in self._docs.values():
+                shadowed.update(data.get("mergedDocIds") or ())
+        return shadowed
+
+
+class LayeredIndex:
+    """Searches several indexes and merges their results by similarity.
+
+    Used to put small live indexes of entries written since the ANN file was
+    built on top of the static file. Later layers take precedence: a doc id a
+    later layer shadows (see `OverlayIndex.shadowed_ids`) is dropped from the
+    results of the layers below it.
+    """
+
+    def __init__(self, layers: Sequence) -> None:
+        self.layers = list(layers)
+
+    def __len__(self) -> int:
+        return sum(len(layer) for layer in self.layers)
+
+    @property
+    def ready(self) -> bool:
+        return all(layer.ready for layer in self.layers)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return all(layer.wait_until_ready(timeout) for layer in self.layers)
+
+    def _merge(self, search, top_k: int) -> list[KBMatch]:
+        matches: dict[str, KBMatch] = {}
+        shadowed: set[str] = set()
+        for layer in reversed(self.layers):
+            # Over-fetch so shadowed hits don't push live results out of the top k.
+            for match in search(layer, top_k + len(shadowed)):
+                if match.doc_id not in shadowed:
+                    matches.setdefault(match.doc_id, match)
+            if hasattr(layer, "shadowed_ids"):
+                shadowed |= layer.shadowed_ids()
+        ranked = sorted(matches.values(), key=lambda m: m.similarity, reverse=True)
+        return ranked[:top_k]
+
+    def search(self, query_embedding, top_k: int = 1) -> list[KBMatch]:
+        return self._merge(lambda layer, k: layer.search(query_embedding, k), top_k)
+
+    def lexical_search(self, query: str, top_k: int = 5) -> list[KBMatch]:
+        return self._merge(lambda layer, k: layer.lexical_search(query, k), top_k)
+
+
+def build_from_firestore(db, nlist: Optional[int], iterations: int) -> tuple[IVFIndex, np.ndarray]:
+    # Stamped before the read: anything written from here on is left to the live layer.
+    built_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    doc_ids, vectors, docs, queries = [], [], [], []
+    for doc in db.collection("knowledge_base").stream():
+        data = doc.to_dict() or {}
+        if data.get("deletedAt"):
+            continue
+        embedding = doc_embedding(data, "content_embedding")
+        if embedding is None:
+            embedding = doc_embedding(data, "question_embedding")
+        if embedding is None or not embedding.size:
+            continue
+        doc_ids.append(doc.id)
+        vectors.append(embedding)
+        docs.append({field: data.get(field) for field in METADATA_FIELDS})
+        question_embedding = doc_embedding(data, "question_embedding")
+        if question_embedding is not None:
+            queries.append(question_embedding)
+
+    if not doc_ids:
+        raise SystemExit("knowledge_base has no embedded docs to index")
+
+    index = IVFIndex.build(
+        doc_ids, np.asarray(vectors, dtype=np.float32), docs, nlist, iterations, built_at=built_at
+    )
+    rng = np.random.default_rng(0)
+    queries = np.asarray(queries, dtype=np.float32)
+    if len(queries) > REPORT_QUERY_SAMPLE:
+        queries = queries[rng.choice(len(queries), REPORT_QUERY_SAMPLE, replace=False)]
+    return index, queries
+
+
+def recall_report(
+    index: IVFIndex, queries: np.ndarray, nprobes: Sequence[int], top_k: int, threshold: float
+) -> list[dict]:
+    """Compare IVF search to exact search for each nprobe setting.
+
+    `threshold_agreement` is the fraction of queries where both searches reach the
+    same accept/reject decision at `threshold` (and, when accepted, on the same doc),
+    i.e. how often the agent's KB_MATCH_THRESHOLD behaviour is unchanged.
+    """
+    started = time.perf_counter()
+    exact = [index.exact_search(q, top_k) for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+
+    rows = []
+    for nprobe in nprobes:
+        started = time.perf_counter()
+        approx = [index.search(q, top_k, nprobe=nprobe) for q in queries]
+        ann_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+
+        recall_at_1 = recall_at_k = agreement = 0.0
+        for want, got in zip(exact, approx):
+            want_ids = [m.doc_id for m in want]
+            got_ids = [m.doc_id for m in got]
+            recall_at_1 += bool(want_ids and got_ids and want_ids[0] == got_ids[0])
+            recall_at_k += len(set(want_ids) & set(got_ids)) / max(len(want_ids), 1)
+            want_hit = bool(want) and want[0].similarity >= threshold
+            got_hit = bool(got) and got[0].similarity >= threshold
+            agreement += want_hit == got_hit and (not want_hit or want_ids[0] == got_ids[0])
+
+        n = max(len(queries), 1)
+        rows.append({
+            "nprobe": nprobe,
+            "recall_at_1": recall_at_1 / n,
+            f"recall_at_{top_k}": recall_at_k / n,
+            "threshold_agreement": agreement / n,
+            "ann_ms_per_query": ann_ms,
+            "exact_ms_per_query": exact_ms,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build an IVF index from knowledge_base")
+    build.add_argument("--out", default="kb_ann_index")
+    build.add_argument("--nlist", type=int, default=None, help="number of lists (default 4*sqrt(N))")
+    build.add_argument("--iterations", type=int, default=10)
+
+    report = sub.add_parser("report", help="recall of the IVF index vs exact search")
+    report.add_argument("--index", default="kb_ann_index")
+    report.add_argument("--nprobe", default="1,2,4,8,16,32")
+    report.add_argument("--top-k", type=int, default=5)
+    report.add_argument("--threshold", type=float, default=float(os.getenv("KB_MATCH_THRESHOLD", "0.55")))
+    report.add_argument("--json", action="store_true", help="print machine-readable output")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate("service-account.json"))
+        started = time.perf_counter()
+        index, queries = build_from_firestore(firestore.client(), args.nlist, args.iterations)
+        index.save(args.out, queries=queries)
+        logger.info(
+            "Built IVF index with %d vectors in %d lists at %s (%.1fs)",
+            len(index), index.centroids.shape[0], args.out, time.perf_counter() - started,
+        )
+        return
+
+    index = IVFIndex.open(args.index)
+    queries_path = os.path.join(args.index, "queries.npy")
+    if not os.path.exists(queries_path):
+        raise SystemExit("index has no saved question embeddings to use as report queries")
+    rows = recall_report(
+        index,
+        np.load(queries_path),
+        [int(n) for n in args.nprobe.split(",")],
+        args.top_k,
+        args.threshold,
+    )
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{len(index)} vectors, {index.centroids.shape[0]} lists, threshold {args.threshold}")
+    for row in rows:
+        print(
+            f"nprobe={row['nprobe']:>4}  recall@1={row['recall_at_1']:.3f}  "
+            f"recall@{args.top_k}={row[f'recall_at_{args.top_k}']:.3f}  "
+            f"threshold_agreement={row['threshold_agreement']:.3f}  "
+            f"ann={row['ann_ms_per_query']:.2f}ms  exact={row['exact_ms_per_query']:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+from frontdesk_shared.embedding_codec import (
+    EMBEDDING_FIELDS,
+    ENCODING_FIELD,
+    doc_embedding,
+)
+
+from lexical_index import LexicalIndex
+
+logger = logging.getLogger("agent.kb_index")
+
+METADATA_EXCLUDED_FIELDS = (*EMBEDDING_FIELDS, ENCODING_FIELD)
+
+
+class KBMatch(NamedTuple):
+    doc_id: str
+    similarity: float
+    data: dict
+
+
+def _doc_embedding(doc_data: dict) -> Optional[np.ndarray]:
+    """Return the embedding the agent scores a KB doc by (content first, then question)."""
+    for field in ("content_embedding", "question_embedding"):
+        embedding = doc_embedding(doc_data, field)
+        if embedding is not None and embedding.size:
+            return embedding
+    return None
+
+
+class KnowledgeBaseIndex:
+    """In-memory cosine index over the `knowledge_base` collection.
+
+    Embeddings are L2-normalized once on insert and kept in a single contiguous
+    float32 matrix, so a lookup is one matrix-vector product. The index is kept
+    fresh by a Firestore `on_snapshot` listener that applies adds, edits and
+    deletes incrementally; the initial snapshot doubles as the first load. A
+    doc with `deletedAt` set (a soft delete) is treated as deleted.
+    """
+
+    def __init__(self, initial_capacity: int = 256) -> None:
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._doc_ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._docs: dict[str, dict] = {}
+        self._watch = None
+        self.lexical = LexicalIndex()
+        # Bumped on every applied change, so publishers can tell the index is dirty.
+        self.revision = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def watch(self, query) -> None:
+        """Start listening to `query` (a collection or query reference)."""
+        if self._watch is not None:
+            return
+        self._watch = query.on_snapshot(self._on_snapshot)
+
+    def close(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, col_snapshot, changes, read_time) -> None:
+        try:
+            self.apply_changes(changes)
+        except Exception as e:
+            logger.error(f"Failed to apply knowledge base changes: {e}", exc_info=True)
+        finally:
+            if not self._ready.is_set():
+                logger.info("Knowledge base index loaded with %d entries", self._size)
+                self._ready.set()
+
+    def apply_changes(self, changes) -> None:
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self.remove(doc.id)
+                continue
+
+            doc_data = doc.to_dict() or {}
+            if _doc_embedding(doc_data) is None:
+                # Embeddings are filled in offline by backend-api/backfill_embeddings.py;
+                # the write arrives here as a MODIFIED change and makes the doc searchable.
+                logger.debug("KB doc %s has no embedding yet; skipping", doc.id)
+            self.upsert(doc.id, doc_data)
+
+    def upsert(self, doc_id: str, doc_data: dict) -> None:
+        embedding = None if doc_data.get("deletedAt") else _doc_embedding(doc_data)
+        if embedding is None:
+            self.remove(doc_id)
+            return
+
+        vector = np.array(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            self.remove(doc_id)
+            return
+        vector /= norm
+
+        metadata = {k: v for k, v in doc_data.items() if k not in METADATA_EXCLUDED_FIELDS}
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty(
+                    (self._initial_capacity, vector.shape[0]), dtype=np.float32
+                )
+            elif vector.shape[0] != self._matrix.shape[1]:
+                logger.warning(
+                    "Skipping KB doc %s: embedding dimension %d != %d",
+                    doc_id,
+                    vector.shape[0],
+                    self._matrix.shape[1],
+                )
+                return
+
+            row = self._rows.get(doc_id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    grown = np.empty(
+                        (self._matrix.shape[0] * 2, self._matrix.shape[1]),
+                        dtype=np.float32,
+                    )
+                    grown[: self._size] = self._matrix[: self._size]
+                    self._matrix = grown
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._doc_ids.append(doc_id)
+
+            self._matrix[row] = vector
+            self._docs[doc_id] = metadata
+            self.revision += 1
+        self.lexical.upsert(doc_id, metadata.get("question"))
+
+    def remove(self, doc_id: str) -> None:
+        self.lexical.remove(doc_id)
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return
+            self._docs.pop(doc_id, None)
+
+            # Swap the last row into the hole to keep the matrix contiguous.
+            last = self._size - 1
+            if row != last:
+                moved_id = self._doc_ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._doc_ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._doc_ids.pop()
+            self._size = last
+            self.revision += 1
+
+    def export(self) -> tuple[int, list[str], np.ndarray, list[dict]]:
+        """Consistent copy of (revision, doc_ids, normalized vectors, metadata)."""
+        with self._lock:
+            if self._matrix is None:
+                return self.revision, [], np.empty((0, 0), dtype=np.float32), []
+            return (
+                self.revision,
+                list(self._doc_ids),
+                self._matrix[: self._size].copy(),
+                [self._docs[doc_id] for doc_id in self._doc_ids],
+            )
+
+    def search(self, query_embedding, top_k: int = 1) -> list[KBMatch]:
+        """Return up to `top_k` docs ranked by cosine similarity to `query_embedding`."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0 or top_k <= 0:
+            return []
+        query = query / query_norm
+
+        with self._lock:
+            if self._size == 0 or query.shape[0] != self._matrix.shape[1]:
+                return []
+            scores = self._matrix[: self._size] @ query
+            k = min(top_k, self._size)
+            if k < self._size:
+                top_rows = np.argpartition(scores, -k)[-k:]
+            else:
+                top_rows = np.arange(self._size)
+            top_rows = top_rows[np.argsort(scores[top_rows])[::-1]]
+            return [
+                KBMatch(
+                    self._doc_ids[row],
+                    float(scores[row]),
+                    self._docs[self._doc_ids[row]],
+                )
+                for row in top_rows
+            ]
+
+    def lexical_search(self, query: str, top_k: int = 5) -> list[KBMatch]:
+        """Return up to `top_k` docs ranked by normalized BM25 score of their question."""
+        matches = []
+        for doc_id, score in self.lexical.search(query, top_k):
+            data = self._docs.get(doc_id)
+            if data is not None:
+                matches.append(KBMatch(doc_id, score, data))
+        return matches
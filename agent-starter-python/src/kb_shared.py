@@ -0,0 +1,280 @@
+"""Host-wide, read-only KB snapshot shared by every job process on a machine.
+
+LiveKit runs each job in its own process. With `KB_INDEX_BACKEND=shared`, one
+process per host (whichever holds an flock on the snapshot directory) keeps a
+live `KnowledgeBaseIndex` on Firestore and publishes it as a versioned snapshot
+under `KB_SHARED_PATH` (tmpfs, `/dev/shm` by default):
+
+    <path>/v000042/vectors.npy   normalized float32 matrix
+    <path>/v000042/meta.json     doc ids and metadata
+    <path>/current -> v000042    swapped atomically on publish
+
+Every process, the refresher included, reads through `SharedKBIndex`, which
+memory-maps `vectors.npy`; the pages are shared by all processes, so per-job
+memory does not grow with the KB's embeddings. Readers notice a new `current`
+on their next search and switch to it without a reload; mappings of the old
+version stay valid until dropped, even after its files are deleted.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from kb_index import KBMatch, KnowledgeBaseIndex
+from lexical_index import LexicalIndex
+
+logger = logging.getLogger("agent.kb_shared")
+
+CURRENT_LINK = "current"
+LOCK_FILE = ".refresher.lock"
+VERSION_PREFIX = "v"
+KEEP_VERSIONS = 2
+
+
+def _version_dirs(path: str) -> list[str]:
+    return sorted(
+        name for name in os.listdir(path)
+        if name.startswith(VERSION_PREFIX) and name[len(VERSION_PREFIX):].isdigit()
+    )
+
+
+def publish_snapshot(path: str, doc_ids: list[str], vectors: np.ndarray, docs: list[dict]) -> str:
+    """Write a new snapshot version under `path` and point `current` at it."""
+    os.makedirs(path, exist_ok=True)
+    existing = _version_dirs(path)
+    number = int(existing[-1][len(VERSION_PREFIX):]) + 1 if existing else 1
+    version = f"{VERSION_PREFIX}{number:06d}"
+
+    tmp_dir = tempfile.mkdtemp(dir=path, prefix=".publish-")
+    np.save(os.path.join(tmp_dir, "vectors.npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        # Firestore timestamps in the metadata are stored as strings.
+        json.dump({"version": version, "doc_ids": doc_ids, "docs": docs}, f, default=str)
+    os.rename(tmp_dir, os.path.join(path, version))
+
+    tmp_link = os.path.join(path, f".{CURRENT_LINK}-{os.getpid()}")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, os.path.join(path, CURRENT_LINK))
+
+    for old in _version_dirs(path)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+    return version
+
+
+class _Snapshot(NamedTuple):
+    version: str
+    doc_ids: list
+    vectors: np.ndarray
+    docs: list
+
+
+class SharedKBIndex:
+    """Read side: searches the current published snapshot, following new versions.
+
+    The vector matrix is shared; doc metadata and the BM25 index are per process
+    (the BM25 index is updated incrementally when the version changes).
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._lexical = LexicalIndex()
+        self._lexical_questions: dict[str, Optional[str]] = {}
+        self._lexical_version: Optional[str] = None
+        self._lexical_rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        snapshot = self._current()
+        return len(snapshot.doc_ids) if snapshot else 0
+
+    @property
+    def version(self) -> Optional[str]:
+        snapshot = self._current()
+        return snapshot.version if snapshot else None
+
+    @property
+    def ready(self) -> bool:
+        return self._current() is not None
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _current(self) -> Optional[_Snapshot]:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                version = os.readlink(os.path.join(self.path, CURRENT_LINK))
+            except OSError:
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.version != version:
+                try:
+                    self._snapshot = self._open(version)
+                    logger.info(
+                        "Mapped shared KB snapshot %s (%d entries)",
+                        version,
+                        len(self._snapshot.doc_ids),
+                    )
+                except (OSError, ValueError) as e:
+                    # Pruned between readlink and open; the next check sees the newer one.
+                    logger.warning("Could not map shared KB snapshot %s: %s", version, e)
+            return self._snapshot
+
+    def _open(self, version: str) -> _Snapshot:
+        directory = os.path.join(self.path, version)
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        return _Snapshot(version, meta["doc_ids"], vectors, meta["docs"])
+
+    def search(self, query_embedding, top_k: int = 1) -> list[KBMatch]:
+        snapshot = self._current()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if snapshot is None or query_norm == 0 or top_k <= 0:
+            return []
+        size = len(snapshot.doc_ids)
+        if size == 0 or query.shape[0] != snapshot.vectors.shape[1]:
+            return []
+
+        scores = snapshot.vectors @ (query / query_norm)
+        k = min(top_k, size)
+        top_rows = np.argpartition(scores, -k)[-k:] if k < size else np.arange(size)
+        top_rows = top_rows[np.argsort(scores[top_rows])[::-1]]
+        return [
+            KBMatch(snapshot.doc_ids[row], float(scores[row]), snapshot.docs[row])
+            for row in top_rows
+        ]
+
+    def lexical_search(self, query: str, top_k: int = 5) -> list[KBMatch]:
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        rows = self._sync_lexical(snapshot)
+        matches = []
+        for doc_id, score in self._lexical.search(query, top_k):
+            row = rows.get(doc_id)
+            if row is not None:
+                matches.append(KBMatch(doc_id, score, snapshot.docs[row]))
+        return matches
+
+    def _sync_lexical(self, snapshot: _Snapshot) -> dict[str, int]:
+        with self._lock:
+            if self._lexical_version == snapshot.version:
+                return self._lexical_rows
+            rows = {doc_id: row for row, doc_id in enumerate(snapshot.doc_ids)}
+            # Apply only the questions that changed since the last version.
+            for doc_id in list(self._lexical_questions):
+                if doc_id not in rows:
+                    self._lexical.remove(doc_id)
+                    del self._lexical_questions[doc_id]
+            for doc_id, row in rows.items():
+                question = snapshot.docs[row].get("question")
+                if doc_id not in self._lexical_questions or self._lexical_questions[doc_id] != question:
+                    self._lexical.upsert(doc_id, question)
+                    self._lexical_questions[doc_id] = question
+            self._lexical_version = snapshot.version
+            self._lexical_rows = rows
+            return rows
+
+    def close(self) -> None:
+        self._snapshot = None
+
+
+class SharedKBRefresher:
+    """Write side: at most one per host, elected by an flock on the snapshot dir.
+
+    Every process starts one; a background thread keeps trying for the lock, so
+    if the refresher's process exits another takes over. The holder watches
+    `query` and republishes at most every `publish_interval` seconds while the
+    index has changed.
+    """
+
+    def __init__(self, query, path: str, publish_interval: float = 2.0) -> None:
+        self.query = query
+        self.path = path
+        self.publish_interval = publish_interval
+        self._lock_file = None
+        self._index: Optional[KnowledgeBaseIndex] = None
+        self._published_revision = -1
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-shared-refresher", daemon=True)
+            self._thread.start()
+
+    def try_acquire(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.path, exist_ok=True)
+        # Held open for as long as this process is the refresher (see close).
+        lock_file = open(os.path.join(self.path, LOCK_FILE), "a")  # noqa: SIM115
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info("This process is the shared KB refresher for %s", self.path)
+        self._index = KnowledgeBaseIndex()
+        self._index.watch(self.query)
+        return True
+
+    def publish_if_changed(self) -> Optional[str]:
+        if self._index is None or not self._index.ready:
+            return None
+        if self._index.revision == self._published_revision:
+            return None
+        revision, doc_ids, vectors, docs = self._index.export()
+        version = publish_snapshot(self.path, doc_ids, vectors, docs)
+        self._published_revision = revision
+        logger.info("Published shared KB snapshot %s (%d entries)", version, len(doc_ids))
+        return version
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.try_acquire():
+                    self.publish_if_changed()
+            except Exception as e:
+                logger.error(f"Shared KB refresher failed: {e}", exc_info=True)
+            self._stop.wait(self.publish_interval)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
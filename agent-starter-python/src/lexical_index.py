@@ -0,0 +1,173 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from collections.abc import Sequence
+from itertools import islice
+from typing import NamedTuple, Optional
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+HYBRID_MODES = ("weighted", "rrf")
+RRF_K = 60
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, trim trailing punctuation and collapse whitespace."""
+    return " ".join(text.lower().strip().rstrip("?.!").split())
+
+
+def words(text: str) -> list[str]:
+    return _TOKEN_RE.findall(normalize_query(text))
+
+
+def tokenize(text: str) -> list[str]:
+    """Word unigrams plus adjacent-word bigrams of the normalized text."""
+    unigrams = words(text)
+    return unigrams + [f"{a} {b}" for a, b in zip(unigrams, unigrams[1:])]
+
+
+class LexicalIndex:
+    """Incrementally maintained BM25 inverted index over KB questions.
+
+    Scores are reported normalized to [0, 1]: a doc of average length that
+    contains every query term once scores 1.0, and query terms the index has
+    never seen count against the match (their IDF is high but no doc has them).
+
+    Search cost is bounded by `max_doc_freq` rather than KB size: a query term
+    in more docs than that (stopwords, and most single words once the KB is
+    large) never adds candidates of its own, it only adds its score to docs a
+    rarer term already matched. If every query term is that common, only the
+    first `max_doc_freq` docs of the rarest one are considered.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_doc_freq: int = 5000) -> None:
+        self.k1 = k1
+        self.b = b
+        self.max_doc_freq = max_doc_freq
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, Counter] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def upsert(self, doc_id: str, text: Optional[str]) -> None:
+        terms = Counter(tokenize(text or ""))
+        with self._lock:
+            self._remove_locked(doc_id)
+            if not terms:
+                return
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = sum(terms.values())
+            self._total_length += self._doc_lengths[doc_id]
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _idf(self, doc_freq: int, doc_count: int) -> float:
+        return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[str, float]]:
+        """Return up to `top_k` (doc_id, normalized BM25 score) pairs, best first."""
+        query_terms = set(tokenize(query))
+        if not query_terms or top_k <= 0:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count
+
+            # Rarest terms first, so common ones can just rescore their docs.
+            term_postings = sorted(
+                (self._postings.get(term, {}) for term in query_terms), key=len
+            )
+            scores: dict[str, float] = {}
+            max_score = 0.0
+            for postings in term_postings:
+                idf = self._idf(len(postings), doc_count)
+                max_score += idf
+                if len(postings) <= self.max_doc_freq:
+                    matched = postings.items()
+                elif scores:
+                    matched = [
+                        (doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings
+                    ]
+                else:
+                    matched = islice(postings.items(), self.max_doc_freq)
+                for doc_id, tf in matched:
+                    length = self._doc_lengths[doc_id]
+                    denom = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / denom
+
+        if max_score <= 0:
+            return []
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(doc_id, min(score / max_score, 1.0)) for doc_id, score in ranked]
+
+class HybridMatch(NamedTuple):
+    doc_id: str
+    score: float
+    similarity: float
+    lexical_score: float
+    data: dict
+
+
+def hybrid_rank(
+    vector_matches: Sequence,
+    lexical_matches: Sequence,
+    mode: str = "weighted",
+    vector_weight: float = 0.7,
+) -> list[HybridMatch]:
+    """Fuse vector and lexical candidates (KBMatch lists) into one ranking.
+
+    `weighted` blends the cosine similarity and normalized BM25 score linearly;
+    `rrf` uses reciprocal-rank fusion, which ignores score scales entirely. A
+    candidate missing from one list scores 0 for that signal.
+    """
+    if mode not in HYBRID_MODES:
+        raise ValueError(f"Unknown hybrid mode {mode!r}; expected one of {HYBRID_MODES}")
+
+    candidates: dict[str, dict] = {}
+    for rank, match in enumerate(vector_matches):
+        entry = candidates.setdefault(match.doc_id, _candidate(match.data))
+        entry["cos"] = match.similarity
+        entry["rrf"] += 1 / (RRF_K + rank + 1)
+    for rank, match in enumerate(lexical_matches):
+        entry = candidates.setdefault(match.doc_id, _candidate(match.data))
+        entry["lex"] = match.similarity
+        entry["rrf"] += 1 / (RRF_K + rank + 1)
+
+    fused = []
+    for doc_id, entry in candidates.items():
+        if mode == "rrf":
+            score = entry["rrf"]
+        else:
+            score = vector_weight * entry["cos"] + (1 - vector_weight) * entry["lex"]
+        fused.append(HybridMatch(doc_id, score, entry["cos"], entry["lex"], entry["data"]))
+    fused.sort(key=lambda m: m.score, reverse=True)
+    return fused
+
+
+def _candidate(data: dict) -> dict:
+    return {"data": data, "cos": 0.0, "lex": 0.0, "rrf": 0.0}
@@ -0,0 +1,115 @@
+"""Bounded, deduplicated set of facts injected into the LLM's chat context.
+
+Facts (KB answers, supervisor answers) are keyed by their source, so a fact
+matched on several turns is stored once. Before each LLM call, `apply()`
+replaces the previous context block with a single system message holding the
+current facts, evicting the least valuable ones (relevance decayed by how many
+turns ago the fact was last used) until the block fits the token budget.
+"""
+
+import logging
+from typing import Optional
+
+logger = logging.getLogger("agent.rag_context")
+
+RAG_CONTEXT_ID = "rag_context"
+HEADER = (
+    "ADDITIONAL CONTEXT: Trusted answers to questions from this call. "
+    "Use them to answer the user's question."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+class _Fact:
+    __slots__ = ("key", "last_used", "relevance", "text", "tokens")
+
+    def __init__(self, key: str, text: str, relevance: float, turn: int) -> None:
+        self.key = key
+        self.text = text
+        self.relevance = relevance
+        self.last_used = turn
+        self.tokens = estimate_tokens(text)
+
+
+class RagContextManager:
+    def __init__(
+        self, token_budget: int = 300, max_facts: int = 6, half_life_turns: float = 4.0
+    ) -> None:
+        self.token_budget = token_budget
+        self.max_facts = max_facts
+        self.half_life_turns = half_life_turns
+        self._facts: dict[str, _Fact] = {}
+        self._turn = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._facts
+
+    def add(self, key: str, text: str, relevance: float = 1.0) -> None:
+        """Add or refresh the fact for `key` (e.g. "kb:<doc id>", "request:<id>")."""
+        fact = self._facts.get(key)
+        if fact is None:
+            self._facts[key] = _Fact(key, text, relevance, self._turn)
+        else:
+            fact.text = text
+            fact.tokens = estimate_tokens(text)
+            fact.relevance = max(fact.relevance, relevance)
+            fact.last_used = self._turn
+        self._evict()
+
+    def _value(self, fact: _Fact) -> float:
+        age = self._turn - fact.last_used
+        return fact.relevance * 0.5 ** (age / self.half_life_turns)
+
+    def _evict(self) -> None:
+        budget = self.token_budget - estimate_tokens(HEADER)
+        while self._facts and (
+            len(self._facts) > self.max_facts
+            or sum(f.tokens for f in self._facts.values()) > budget
+        ):
+            if len(self._facts) == 1:
+                # A single fact larger than the budget is cut down rather than dropped.
+                fact = next(iter(self._facts.values()))
+                fact.text = fact.text[: max(budget, 1) * 4]
+                fact.tokens = estimate_tokens(fact.text)
+                break
+            victim = min(self._facts.values(), key=lambda f: (self._value(f), f.last_used))
+            del self._facts[victim.key]
+            self.evicted += 1
+            logger.debug("Evicted RAG fact %s", victim.key)
+
+    def render(self) -> Optional[str]:
+        if not self._facts:
+            return None
+        # Most recently used last, nearest the user's turn.
+        facts = sorted(self._facts.values(), key=lambda f: f.last_used)
+        return "\n".join([HEADER] + [f"- {fact.text}" for fact in facts])
+
+    def apply(self, chat_ctx) -> int:
+        """Replace the context block in `chat_ctx` with the current facts; returns its token estimate.
+
+        Call once per LLM turn; it also advances the recency clock.
+        """
+        self._turn += 1
+        index = chat_ctx.index_by_id(RAG_CONTEXT_ID)
+        if index is not None:
+            del chat_ctx.items[index]
+        block = self.render()
+        if block is None:
+            return 0
+        chat_ctx.add_message(role="system", content=block, id=RAG_CONTEXT_ID)
+        return estimate_tokens(block)
+
+    def stats(self) -> dict:
+        return {
+            "facts": len(self._facts),
+            "tokens": sum(f.tokens for f in self._facts.values()),
+            "evicted": self.evicted,
+        }
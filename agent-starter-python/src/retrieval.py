@@ -0,0 +1,109 @@
+import logging
+from typing import NamedTuple, Optional
+
+from lexical_index import HybridMatch, hybrid_rank, normalize_query, words
+from telemetry import telemetry
+
+logger = logging.getLogger("agent.retrieval")
+
+
+class RetrievalConfig(NamedTuple):
+    match_threshold: float = 0.55
+    # Normalized BM25 (see LexicalIndex). Any one-word query scores ~1.0, so a
+    # lexical-only match also needs `lexical_min_terms` query words in the question.
+    bm25_threshold: float = 0.5
+    lexical_min_terms: int = 3
+    hybrid_mode: str = "weighted"
+    vector_weight: float = 0.7
+    candidates: int = 5
+
+
+def direct_answer(
+    match: Optional[HybridMatch], threshold: Optional[float], template: str = "{answer}"
+) -> Optional[str]:
+    """Text to speak verbatim for a match strong enough to skip the LLM, else None.
+
+    `template` may reference `{answer}` and `{question}`; a template that fails
+    to render falls back to the bare answer.
+    """
+    if match is None or threshold is None or match.similarity < threshold:
+        return None
+    return render_answer(match.data, template)
+
+
+def render_answer(data: dict, template: str = "{answer}") -> Optional[str]:
+    """Render a KB entry's answer with the direct-answer template."""
+    answer = data.get('answer')
+    if not answer:
+        return None
+    try:
+        return template.format(answer=answer, question=data.get('question') or "")
+    except (KeyError, IndexError, ValueError) as e:
+        logger.warning("Invalid direct-answer template %r: %s", template, e)
+        return answer
+
+
+def _is_accepted(match: HybridMatch, normalized_query: str, config: RetrievalConfig) -> bool:
+    if not match.data.get('answer'):
+        return False
+    question = match.data.get('question') or ""
+    if match.similarity >= config.match_threshold or normalized_query == normalize_query(question):
+        return True
+    return (
+        match.lexical_score >= config.bm25_threshold
+        and len(set(words(normalized_query)) & set(words(question))) >= config.lexical_min_terms
+    )
+
+
+def retrieve(
+    kb_index, user_query: str, query_embedding, config: RetrievalConfig
+) -> Optional[HybridMatch]:
+    """Score `user_query` against `kb_index` and return the accepted match, if any.
+
+    Vector and BM25 candidates are fused (`config.hybrid_mode`); the best-ranked
+    candidate that clears either the cosine or the lexical threshold wins.
+    """
+    with telemetry.span("kb.vector_search"):
+        vector_matches = kb_index.search(query_embedding, top_k=config.candidates)
+    with telemetry.span("kb.lexical_search"):
+        lexical_matches = kb_index.lexical_search(user_query, top_k=config.candidates)
+    with telemetry.span("kb.scoring", outcome="miss") as span:
+        match = _select(user_query, vector_matches, lexical_matches, config)
+        if match is not None:
+            span.outcome = "hit"
+    return match
+
+
+def _select(
+    user_query: str, vector_matches: list, lexical_matches: list, config: RetrievalConfig
+) -> Optional[HybridMatch]:
+    ranked = hybrid_rank(
+        vector_matches,
+        lexical_matches,
+        mode=config.hybrid_mode,
+        vector_weight=config.vector_weight,
+    )
+    if not ranked:
+        return None
+
+    best = ranked[0]
+    logger.info(
+        "Knowledge base best match similarity %.3f (lexical %.3f) for question '%s'",
+        best.similarity,
+        best.lexical_score,
+        best.data.get('question'),
+    )
+
+    normalized_query = normalize_query(user_query)
+    for match in ranked:
+        if _is_accepted(match, normalized_query, config):
+            return match
+
+    logger.info(
+        "Knowledge base match %.3f below threshold %.2f (BM25 %.3f below %.2f)",
+        best.similarity,
+        config.match_threshold,
+        best.lexical_score,
+        config.bm25_threshold,
+    )
+    return None
@@ -0,0 +1,118 @@
+"""Speculative KB lookups started from interim STT transcripts.
+
+The session's `user_input_transcribed` events feed `SpeculativeLookup`, which
+starts a lookup once an interim transcript has been stable for `stable_ms` (or
+at once for a final one) and keeps it in a one-entry, per-session slot. When
+`llm_node` runs, `take()` hands back the in-flight lookup if the final
+transcript matches the speculated text closely enough, so embedding and search
+overlap with the user's speech; otherwise the lookup is cancelled.
+"""
+
+import asyncio
+import difflib
+import logging
+import time
+from collections.abc import Awaitable
+from typing import Callable, Optional
+
+from lexical_index import normalize_query
+
+logger = logging.getLogger("agent.speculative")
+
+
+def transcripts_match(speculated: str, final: str, min_ratio: float) -> bool:
+    """Whether two normalized transcripts are close enough to share a lookup."""
+    if speculated == final:
+        return True
+    ratio = difflib.SequenceMatcher(None, speculated.split(), final.split()).ratio()
+    return ratio >= min_ratio
+
+
+class SpeculativeLookup:
+    """One session's speculative lookup slot.
+
+    `start(text)` must return an awaitable (typically an executor future); it is
+    called on the event loop. All methods must be called from the event loop.
+    """
+
+    def __init__(
+        self,
+        start: Callable[[str], Awaitable],
+        stable_ms: float = 300,
+        min_words: int = 2,
+        match_ratio: float = 0.9,
+    ) -> None:
+        self._start_lookup = start
+        self.stable_ms = stable_ms
+        self.min_words = min_words
+        self.match_ratio = match_ratio
+        self._query: Optional[str] = None
+        self._future: Optional[asyncio.Future] = None
+        self._started_at = 0.0
+        self._debounce: Optional[asyncio.TimerHandle] = None
+        self.started = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def on_transcript(self, text: str, is_final: bool) -> None:
+        query = normalize_query(text)
+        if len(query.split()) < self.min_words:
+            return
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        if query == self._query and self._future is not None:
+            return
+        if is_final:
+            self._speculate(query, text)
+        else:
+            loop = asyncio.get_running_loop()
+            self._debounce = loop.call_later(
+                self.stable_ms / 1000, self._speculate, query, text
+            )
+
+    def _speculate(self, query: str, text: str) -> None:
+        self._debounce = None
+        if query == self._query and self._future is not None:
+            return
+        self._drop()
+        self._query = query
+        self._future = asyncio.ensure_future(self._start_lookup(text))
+        self._started_at = time.perf_counter()
+        self.started += 1
+        logger.debug("Speculative KB lookup started for '%s'", text)
+
+    def take(self, text: str) -> tuple[Optional[asyncio.Future], float]:
+        """The slot's lookup if it matches `text`, and how long it has been running (ms).
+
+        A matching lookup stays in the slot, so a preemptive generation that is
+        restarted for the same transcript reuses it again.
+        """
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        future = self._future
+        if future is None or future.cancelled():
+            self._drop()
+            return None, 0.0
+        if not transcripts_match(self._query, normalize_query(text), self.match_ratio):
+            self._drop()
+            self.discarded += 1
+            return None, 0.0
+        self.reused += 1
+        return future, (time.perf_counter() - self._started_at) * 1000
+
+    def _drop(self) -> None:
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+        self._future = None
+        self._query = None
+
+    def close(self) -> None:
+        if self._debounce is not None:
+            self._debounce.cancel()
+            self._debounce = None
+        self._drop()
+
+    def stats(self) -> dict:
+        return {"started": self.started, "reused": self.reused, "discarded": self.discarded}
@@ -0,0 +1,180 @@
+import asyncio
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("agent.telemetry")
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is unbounded.
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+# Room the current job is serving; set once in `entrypoint` and inherited by the
+# session's tasks (and by executor work started via `contextvars.copy_context`).
+current_room: contextvars.ContextVar[str] = contextvars.ContextVar("current_room", default="unknown")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self, bounds=DEFAULT_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 1),
+            "p95_ms": round(self.percentile(0.95), 1),
+            "max_ms": round(self.max, 1),
+        }
+
+
+class Span:
+    """Times one stage; set `outcome` before the block ends to tag the sample."""
+
+    __slots__ = ("_started", "_telemetry", "outcome", "room", "stage")
+
+    def __init__(self, telemetry: "Telemetry", stage: str, outcome: str, room: Optional[str]) -> None:
+        self._telemetry = telemetry
+        self.stage = stage
+        self.outcome = outcome
+        self.room = room or current_room.get()
+        self._started = 0.0
+
+    def __enter__(self) -> "Span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        if exc_type is not None and self.outcome == "ok":
+            timed_out = issubclass(exc_type, (TimeoutError, asyncio.TimeoutError))
+            self.outcome = "timed_out" if timed_out else "error"
+        self._telemetry.record(self.stage, elapsed_ms, self.outcome, self.room)
+
+
+class _NoopSpan:
+    """Shared stand-in returned while telemetry is disabled; does no timing at all."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def __setattr__(self, name, value) -> None:
+        # Swallow `span.outcome = ...` so call sites need no enabled check.
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Telemetry:
+    """Per-stage latency histograms keyed by (stage, room, outcome).
+
+    `span(stage)` is a context manager timing a block; when disabled it returns
+    a shared no-op object, so instrumented code costs one attribute check.
+    Safe to use from the event loop and from KB lookup worker threads.
+    """
+
+    def __init__(self, enabled: bool = True, bounds=DEFAULT_BUCKETS_MS) -> None:
+        self.enabled = enabled
+        self.bounds = bounds
+        self._histograms: dict[tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, outcome: str = "ok", room: Optional[str] = None):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, stage, outcome, room)
+
+    def record(self, stage: str, elapsed_ms: float, outcome: str = "ok", room: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        key = (stage, room or current_room.get(), outcome)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.bounds)
+            histogram.observe(elapsed_ms)
+
+    def summary(self, room: Optional[str] = None) -> dict:
+        """`{stage: {outcome: {count, mean_ms, p50_ms, p95_ms, max_ms}}}`, optionally for one room."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            result: dict[str, dict] = {}
+            for (stage, key_room, outcome), histogram in items:
+                if room is not None and key_room != room:
+                    continue
+                # Rooms are merged when summarizing the whole process.
+                outcomes = result.setdefault(stage, {})
+                if outcome in outcomes:
+                    _merge(outcomes[outcome], histogram)
+                else:
+                    outcomes[outcome] = _copy(histogram)
+        return {
+            stage: {outcome: h.summary() for outcome, h in outcomes.items()}
+            for stage, outcomes in result.items()
+        }
+
+    def reset(self, room: Optional[str] = None) -> None:
+        """Drop the histograms of one room (all rooms when `room` is None)."""
+        with self._lock:
+            if room is None:
+                self._histograms.clear()
+            else:
+                for key in [key for key in self._histograms if key[1] == room]:
+                    del self._histograms[key]
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    copy = Histogram(histogram.bounds)
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.total = histogram.total
+    copy.max = histogram.max
+    return copy
+
+
+def _merge(into: Histogram, other: Histogram) -> None:
+    into.counts = [a + b for a, b in zip(into.counts, other.counts)]
+    into.count += other.count
+    into.total += other.total
+    into.max = max(into.max, other.max)
+
+
+telemetry = Telemetry(enabled=False)
+
+
+def configure(enabled: bool) -> Telemetry:
+    """Turn the process-wide `telemetry` recorder on or off."""
+    telemetry.enabled = enabled
+    return telemetry
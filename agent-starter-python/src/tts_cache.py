@@ -0,0 +1,239 @@
+"""On-disk cache of synthesized audio for answers the agent speaks verbatim.
+
+Direct KB answers (see `retrieval.direct_answer`) are the same text every time
+they are spoken, so their audio is cached as WAV files under `path`, keyed on
+the voice id and the whitespace-normalized text:
+
+    <path>/<sha1>.wav    16-bit PCM audio
+    <path>/<sha1>.json   {"voice_id", "text", "doc_id"}
+
+The directory is shared by every job process on the host. Files are evicted
+least recently used first (reads bump the mtime) once they exceed `max_bytes`,
+and a KB entry's audio is dropped as soon as its answer text changes.
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import wave
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from typing import Callable, Optional
+
+from livekit import rtc
+
+from telemetry import telemetry
+
+logger = logging.getLogger("agent.tts_cache")
+
+FRAME_MS = 20
+PREWARM_LOCK = ".prewarm.lock"
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class TTSAudioCache:
+    def __init__(self, path: str, voice_id: str, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.path = path
+        self.voice_id = voice_id
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.voice_id}\n{normalize_text(text)}".encode()).hexdigest()
+
+    def _file(self, key: str, ext: str) -> str:
+        return os.path.join(self.path, f"{key}.{ext}")
+
+    def contains(self, text: str) -> bool:
+        return os.path.exists(self._file(self.key(text), "wav"))
+
+    def get(self, text: str) -> Optional[list[rtc.AudioFrame]]:
+        """The cached audio for `text`, split into FRAME_MS frames, or None."""
+        path = self._file(self.key(text), "wav")
+        try:
+            with wave.open(path, "rb") as wav:
+                sample_rate = wav.getframerate()
+                num_channels = wav.getnchannels()
+                data = wav.readframes(wav.getnframes())
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, EOFError, wave.Error) as e:
+            logger.warning("Dropping unreadable cached audio %s: %s", path, e)
+            self._remove(self.key(text))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return split_frames(data, sample_rate, num_channels)
+
+    def put(self, text: str, frames: list[rtc.AudioFrame], doc_id: Optional[str] = None) -> None:
+        if not frames:
+            return
+        key = self.key(text)
+        if doc_id is not None:
+            self.forget_stale(doc_id, text)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        with wave.open(tmp_path, "wb") as wav:
+            wav.setnchannels(frames[0].num_channels)
+            wav.setsampwidth(2)
+            wav.setframerate(frames[0].sample_rate)
+            for frame in frames:
+                wav.writeframes(bytes(frame.data))
+        fd, tmp_meta_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"voice_id": self.voice_id, "text": normalize_text(text), "doc_id": doc_id}, f)
+        # Other processes read both files; they only ever see complete ones.
+        os.replace(tmp_meta_path, self._file(key, "json"))
+        os.replace(tmp_path, self._file(key, "wav"))
+        self._evict()
+
+    def forget_stale(self, doc_id: str, text: str) -> int:
+        """Drop cached audio for `doc_id` whose text is no longer `text`."""
+        current = self.key(text)
+        removed = 0
+        for key, meta in self._entries():
+            if meta.get("doc_id") == doc_id and key != current:
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def _entries(self) -> Iterable[tuple[str, dict]]:
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    yield name[:-len(".json")], json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def _remove(self, key: str) -> None:
+        for ext in ("wav", "json"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._file(key, ext))
+
+    def _evict(self) -> None:
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith(".wav"):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name[:-len(".wav")]))
+        total = sum(size for _, size, _ in files)
+        for _, size, key in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def split_frames(data: bytes, sample_rate: int, num_channels: int) -> list[rtc.AudioFrame]:
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frame_bytes = samples_per_frame * num_channels * 2
+    frames = []
+    for start in range(0, len(data), frame_bytes):
+        chunk = data[start:start + frame_bytes]
+        frames.append(rtc.AudioFrame(
+            chunk, sample_rate, num_channels, len(chunk) // (2 * num_channels)
+        ))
+    return frames
+
+
+async def synthesize_frames(tts, text: str) -> list[rtc.AudioFrame]:
+    async with tts.synthesize(text) as stream:
+        return [audio.frame async for audio in stream]
+
+
+async def _replay(chunks: list[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _chain(first: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+async def cached_tts_node(
+    cache: TTSAudioCache,
+    text: AsyncIterable[str],
+    synthesize: Callable[[AsyncIterable[str]], AsyncIterable[rtc.AudioFrame]],
+    cacheable: dict,
+) -> AsyncIterator[rtc.AudioFrame]:
+    """tts_node body that serves `cacheable` texts (text -> KB doc id) from the cache.
+
+    Anything else streams straight through `synthesize`. A cacheable text that
+    misses is synthesized as usual and stored once it has played in full.
+    """
+    started = time.perf_counter()
+    chunks = text.__aiter__()
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        return
+    if first not in cacheable:
+        async for frame in synthesize(_chain(first, chunks)):
+            yield frame
+        return
+
+    # A direct answer arrives as one chunk; anything after it is unexpected.
+    parts = [first] + [chunk async for chunk in chunks]
+    full_text = "".join(parts)
+    frames = await asyncio.to_thread(cache.get, full_text)
+    if frames is not None:
+        telemetry.record("tts.cache", (time.perf_counter() - started) * 1000, "hit")
+        for frame in frames:
+            yield frame
+        return
+
+    recorded = []
+    async for frame in synthesize(_replay(parts)):
+        if not recorded:
+            telemetry.record("tts.cache", (time.perf_counter() - started) * 1000, "miss")
+        recorded.append(frame)
+        yield frame
+    await asyncio.to_thread(cache.put, full_text, recorded, cacheable.get(first))
+
+
+async def prewarm(cache: TTSAudioCache, tts, entries: list[tuple[str, str]]) -> int:
+    """Synthesize the missing `(doc_id, text)` entries; returns how many were added.
+
+    Only one process per host does this at a time (an flock in the cache dir);
+    the others return 0 immediately.
+    """
+    with open(os.path.join(cache.path, PREWARM_LOCK), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0
+        added = 0
+        for doc_id, text in entries:
+            await asyncio.to_thread(cache.forget_stale, doc_id, text)
+            if cache.contains(text):
+                continue
+            try:
+                frames = await synthesize_frames(tts, text)
+            except Exception as e:
+                logger.warning("Could not pre-synthesize answer for %s: %s", doc_id, e)
+                continue
+            await asyncio.to_thread(cache.put, text, frames, doc_id)
+            added += 1
+        return added
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 from livekit.agents import AgentSession, inference, llm
 
 from agent import Assistant
@@ -111,7 +111,10 @@ async def test_escalates_for_discounts() -> None:
     ):
         await session.start(Assistant())
 
-        with patch("requests.post") as mock_post:
+        with patch(
+            "agent.backend_client.post_json",
+            new=AsyncMock(return_value={"requestId": "test-request"}),
+        ):
             result = await session.run(user_input="Do you offer any discounts?")
 
             # 1. Check that the agent called our specific function tool
@@ -0,0 +1,91 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from backend_client import BackendClient, CircuitBreaker, CircuitOpenError
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.asyncio
+async def test_retries_idempotent_requests_only() -> None:
+    """A 503 is retried for PUT but surfaced immediately for POST."""
+    calls = []
+
+    async def handler(request: web.Request) -> web.Response:
+        calls.append(request.method)
+        if len(calls) == 1 or request.method == "POST":
+            return web.json_response({}, status=503)
+        return web.json_response({"ok": True})
+
+    runner, base_url = await _serve(handler)
+    client = BackendClient(base_url, max_retries=2, backoff_base=0)
+    try:
+        assert await client.request("PUT", "/resolve") == {"ok": True}
+        assert calls == ["PUT", "PUT"]
+
+        with pytest.raises(aiohttp.ClientResponseError):
+            await client.post_json("/create", {})
+        assert calls == ["PUT", "PUT", "POST"]
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast() -> None:
+    """After the failure threshold, calls are rejected without a connection attempt."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = BackendClient("http://127.0.0.1:9", max_retries=0, breaker=breaker)
+    try:
+        for _ in range(2):
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await client.post_json("/api/help-requests", {})
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            await client.post_json("/api/help-requests", {})
+    finally:
+        await client.close()
+
+
+def test_half_open_allows_a_single_trial() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_one_session_per_event_loop() -> None:
+    """Each loop gets its own pool, and aclose() closes the running loop's."""
+    client = BackendClient("http://127.0.0.1:9")
+    sessions = []
+
+    async def use_and_close():
+        session = client._get_session()
+        assert client._get_session() is session
+        sessions.append(session)
+        await client.aclose()
+
+    asyncio.run(use_and_close())
+    asyncio.run(use_and_close())
+
+    assert sessions[0] is not sessions[1]
+    assert all(session.closed for session in sessions)
+    assert client._sessions == {}
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+from frontdesk_shared.clients import ClientRegistry
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_clients_are_created_once_on_first_use() -> None:
+    registry = ClientRegistry()
+    created = []
+
+    def create():
+        created.append(SimpleNamespace(name="db"))
+        return created[-1]
+
+    registry.register("db", create)
+    db = registry.lazy("db")
+    assert created == []
+
+    threads = [threading.Thread(target=lambda: db.name) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert registry.get("db") is created[0]
+
+
+def test_lazy_client_forwards_attributes_and_set_overrides() -> None:
+    registry = ClientRegistry()
+
+    class Fake:
+        def collection(self, name):
+            return f"collection:{name}"
+
+    registry.set("db", Fake())
+    assert registry.lazy("db").collection("help_requests") == "collection:help_requests"
+
+
+def test_warmup_reports_init_and_ready_times() -> None:
+    registry = ClientRegistry()
+    registry.register("db", object)
+    registry.record_import("app")
+
+    report = registry.warmup(("db",))
+
+    assert set(report["init_ms"]) == {"db"} and "app" in report["import_ms"]
+    assert report["ready_ms"] >= report["import_ms"]["app"]
+    assert registry.warmup(("db",))["ready_ms"] == report["ready_ms"]
+
+
+def test_importing_agent_needs_no_credentials(tmp_path) -> None:
+    """No service-account.json in the cwd, and the Firebase / genai SDKs stay unimported."""
+    code = (
+        "import sys, agent; "
+        "print(any(m in sys.modules for m in ('firebase_admin', 'google.generativeai')))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": SRC},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "False"
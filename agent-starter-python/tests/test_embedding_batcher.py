@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+from frontdesk_shared.embedding_batcher import EmbeddingBatcher
+
+
+class _FakeEmbedder:
+    def __init__(self, delay: float = 0.0, fail: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: list) -> list:
+        with self._lock:
+            self.calls.append(list(texts))
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("quota exceeded")
+            return [[float(len(text)), 1.0] for text in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_concurrent_callers_share_one_call() -> None:
+    """Texts submitted within the window go out together; duplicates are embedded once."""
+    embedder = _FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch=32, max_wait_ms=50)
+
+    futures = [batcher.submit(text) for text in ["hi", "hello", "hi", "hours?"]]
+    results = [future.result(timeout=2) for future in futures]
+
+    assert results == [[2.0, 1.0], [5.0, 1.0], [2.0, 1.0], [6.0, 1.0]]
+    assert embedder.calls == [["hi", "hello", "hours?"]]
+    assert batcher.stats()["batches"] == 1
+    batcher.close()
+
+
+def test_batches_are_capped_and_concurrency_limited() -> None:
+    embedder = _FakeEmbedder(delay=0.05)
+    batcher = EmbeddingBatcher(embedder, max_batch=4, max_wait_ms=20, max_concurrency=2)
+
+    results = batcher.embed_many([f"q{i}" for i in range(20)], timeout=5)
+
+    assert len(results) == 20
+    assert all(len(call) <= 4 for call in embedder.calls)
+    assert sum(len(call) for call in embedder.calls) == 20
+    assert embedder.peak_active <= 2
+    batcher.close()
+
+
+def test_failed_batch_fails_every_caller() -> None:
+    embedder = _FakeEmbedder(fail=True)
+    batcher = EmbeddingBatcher(embedder, max_wait_ms=50)
+
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="quota exceeded"):
+            future.result(timeout=2)
+    assert batcher.stats()["failed_batches"] == 1
+
+    embedder.fail = False
+    assert batcher.embed("c", timeout=2) == [1.0, 1.0]
+    batcher.close()
+
+
+def test_wrong_vector_count_is_an_error() -> None:
+    batcher = EmbeddingBatcher(lambda texts: [[1.0]], max_wait_ms=50)
+
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    with pytest.raises(ValueError, match="1 vectors for 2 texts"):
+        futures[1].result(timeout=2)
+    batcher.close()
+
+
+def test_close_drains_queue_and_rejects_new_work() -> None:
+    embedder = _FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_wait_ms=1000)
+
+    future = batcher.submit("pending")
+    batcher.close()
+
+    assert future.result(timeout=0) == [7.0, 1.0]
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit("late")
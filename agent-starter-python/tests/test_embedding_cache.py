@@ -0,0 +1,41 @@
+import time
+
+from embedding_cache import EmbeddingCache
+
+
+def test_normalized_phrasings_share_an_entry() -> None:
+    """Case, surrounding whitespace and trailing punctuation do not change the key."""
+    cache = EmbeddingCache(max_size=4)
+    cache.put("What are your hours?", [1.0, 2.0])
+
+    assert cache.get("  what are   your HOURS ") == [1.0, 2.0]
+    assert cache.get("where are you?") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_evicts_least_recently_used_and_expired() -> None:
+    """Size is bounded by LRU order and entries past the TTL are dropped."""
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("c") is None
+
+
+def test_persists_across_instances(tmp_path) -> None:
+    """A restarted worker starts warm from the persistence file."""
+    path = str(tmp_path / "cache" / "embeddings.json")
+    cache = EmbeddingCache(persist_path=path)
+    cache.put("hours", [0.5, 0.25])
+    cache.save()
+
+    restored = EmbeddingCache(persist_path=path)
+    assert restored.load() == 1
+    assert restored.get("Hours?") == [0.5, 0.25]
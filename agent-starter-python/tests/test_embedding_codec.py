@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from frontdesk_shared.embedding_codec import (
+    ENCODING_FIELD,
+    F16,
+    FLOAT,
+    I8,
+    decode_embedding,
+    doc_embedding,
+    encode_fields,
+)
+
+
+@pytest.mark.parametrize("encoding, max_bytes", [(F16, 768 * 2), (I8, 768 + 4)])
+def test_compact_encodings_preserve_cosine(encoding: str, max_bytes: int) -> None:
+    """Packed blobs are several times smaller than float arrays and rank the same."""
+    rng = np.random.default_rng(0)
+    vector = rng.normal(size=768).astype(np.float32)
+
+    fields = encode_fields({"content_embedding": vector}, encoding)
+    blob = fields["content_embedding"]
+    decoded = doc_embedding(fields, "content_embedding")
+
+    assert fields[ENCODING_FIELD] == encoding
+    assert isinstance(blob, bytes) and len(blob) <= max_bytes
+    cosine = vector @ decoded / (np.linalg.norm(vector) * np.linalg.norm(decoded))
+    assert cosine > 0.999
+
+
+def test_plain_float_arrays_still_decode() -> None:
+    """Docs written before the compact encodings keep working."""
+    fields = encode_fields({"question_embedding": [0.5, -1.0]}, FLOAT)
+
+    assert ENCODING_FIELD not in fields
+    assert doc_embedding(fields, "question_embedding").tolist() == [0.5, -1.0]
+    assert decode_embedding(b"\x00\x3c", F16).tolist() == [1.0]
+    assert decode_embedding(None) is None
@@ -0,0 +1,99 @@
+import asyncio
+import contextlib
+import os
+import random
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_escalations import find_knee, load_backend, parse_delay, run_level
+from fakes import FakeFirestore
+
+
+def _result(concurrency: int, p99: float, timed_out: int = 0) -> dict:
+    return {
+        "concurrency": concurrency,
+        "time_to_answer_ms": {"p99": p99},
+        "timed_out": timed_out,
+        "errors": 0,
+    }
+
+
+def test_round_trip_under_load_answers_every_call() -> None:
+    result = run_level(6, {
+        "duration": 0.5, "workers": 2, "supervisor_delay": "fixed:20", "supervisors": 4,
+        "repeat_rate": 0.5, "embed_ms": 0.0, "seed": 0, "verbose": False,
+    })
+
+    assert result["answered"] >= 6
+    assert result["timed_out"] == 0 and result["errors"] == 0
+    assert result["coalesced"] > 0
+    assert result["time_to_answer_ms"]["p50"] >= 20
+    # Two dispatchers, the supervisor, and the backend's pending / KB dedup indexes.
+    assert result["open_listeners"]["max"] == 5
+    assert result["open_listeners"]["end"] == 0
+
+
+def test_find_knee_and_delay_distributions() -> None:
+    flat = [_result(1, 100), _result(8, 150), _result(32, 190)]
+    assert find_knee(flat, factor=2.0) is None
+    assert find_knee([*flat, _result(64, 450)], factor=2.0) == 64
+    assert find_knee([_result(1, 100), _result(4, 120, timed_out=1)], factor=2.0) == 4
+
+    rng = random.Random(0)
+    assert parse_delay("fixed:250")(rng) == 0.25
+    assert 0.1 <= parse_delay("uniform:100:200")(rng) <= 0.2
+    samples = sorted(parse_delay("lognormal:1000:0.5")(rng) for _ in range(999))
+    assert 0.9 < samples[499] < 1.1
+    with pytest.raises(ValueError):
+        parse_delay("normal:5")
+
+
+def test_shared_request_is_unresolved_only_after_its_last_caller_times_out() -> None:
+    db = FakeFirestore()
+    backend = load_backend(db, embed_ms=0.0)
+    question = "Do you take walk-ins on Sundays?"
+
+    async def scenario() -> None:
+        await backend.start_ingestion_queue()
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as http:
+            async def escalate(room: str) -> dict:
+                response = await http.post("/api/help-requests", json={
+                    "originalQuery": question, "conversationHistory": [],
+                    "livekitRoomId": room, "agentWorkerId": "worker-1",
+                })
+                return response.json()
+
+            async def time_out(request_id: str) -> str:
+                response = await http.post(
+                    f"/api/help-requests/{request_id}/timeout", json={"agentWorkerId": "worker-1"}
+                )
+                return response.json()["status"]
+
+            first = await escalate("room-a")
+            # Nothing was pending, so the embedding was stored after the write.
+            for _ in range(100):
+                if len(backend.pending_index):
+                    break
+                await asyncio.sleep(0.01)
+            request_id = first["requestId"]
+            assert await escalate("room-b") == {"requestId": request_id, "coalesced": True}
+
+            assert await time_out(request_id) == "pending"
+            assert await time_out(request_id) == "unresolved"
+            assert len(backend.pending_index) == 0
+
+            # Even if the index still had it, a timed-out request is never joined.
+            doc = db.collection("help_requests").document(request_id).get()
+            backend.pending_index.upsert(request_id, backend.embedding_batcher.embed(question))
+            third = await escalate("room-c")
+            assert third["requestId"] != request_id and "coalesced" not in third
+            assert doc.get("callerCount") == 0
+        await backend.stop_ingestion_queue()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from escalations import EscalationDispatcher
+
+
+class _FakeQuery:
+    def __init__(self) -> None:
+        self.callbacks = []
+        self.filters = []
+
+    def where(self, field, op, value):
+        self.filters.append((field, op, value))
+        return self
+
+    def on_snapshot(self, callback):
+        self.callbacks.append(callback)
+        return SimpleNamespace(unsubscribe=lambda: None)
+
+    def emit_from_thread(self, doc_id: str, data: dict) -> None:
+        change = SimpleNamespace(
+            type=SimpleNamespace(name="MODIFIED"),
+            document=SimpleNamespace(id=doc_id, to_dict=lambda: data),
+        )
+        thread = threading.Thread(target=self.callbacks[0], args=([], [change], None))
+        thread.start()
+        thread.join()
+
+
+@pytest.mark.asyncio
+async def test_one_listener_serves_many_escalations() -> None:
+    """Concurrent waiters share a single query listener and get their own results."""
+    query = _FakeQuery()
+    dispatcher = EscalationDispatcher(query, "worker-1")
+
+    waits = [
+        asyncio.create_task(dispatcher.wait_for_resolution(f"req-{i}", timeout=5))
+        for i in range(20)
+    ]
+    await asyncio.sleep(0)
+    assert dispatcher.waiter_count == 20
+
+    for i in range(20):
+        query.emit_from_thread(f"req-{i}", {"status": "resolved", "supervisorResponse": str(i)})
+    results = await asyncio.gather(*waits)
+
+    assert [r["supervisorResponse"] for r in results] == [str(i) for i in range(20)]
+    assert len(query.callbacks) == 1
+    assert query.filters == [("watcherIds", "array_contains", "worker-1")]
+    assert dispatcher.waiter_count == 0
+
+
+@pytest.mark.asyncio
+async def test_resolution_before_wait_and_timeout() -> None:
+    """Early resolutions are kept for a late waiter; pending requests time out."""
+    query = _FakeQuery()
+    dispatcher = EscalationDispatcher(query, "worker-1")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await dispatcher.wait_for_resolution("slow", timeout=0.01)
+    assert dispatcher.waiter_count == 0
+
+    query.emit_from_thread("fast", {"status": "unresolved"})
+    assert (await dispatcher.wait_for_resolution("fast", timeout=1))["status"] == "unresolved"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_waiters_share_one_resolution() -> None:
+    """Sessions waiting on the same (coalesced) request all get the answer, late ones too."""
+    query = _FakeQuery()
+    dispatcher = EscalationDispatcher(query, "worker-1")
+
+    waits = [
+        asyncio.create_task(dispatcher.wait_for_resolution("shared", timeout=5))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    query.emit_from_thread("shared", {"status": "resolved", "supervisorResponse": "Closed"})
+    results = await asyncio.gather(*waits)
+    late = await dispatcher.wait_for_resolution("shared", timeout=0.01)
+
+    assert [r["supervisorResponse"] for r in [*results, late]] == ["Closed"] * 4
+    assert dispatcher.waiter_count == 0
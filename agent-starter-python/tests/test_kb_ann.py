@@ -0,0 +1,99 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fakes import FakeFirestore
+
+from kb_ann import (
+    IVFIndex,
+    LayeredIndex,
+    OverlayIndex,
+    build_from_firestore,
+    recall_report,
+)
+from kb_index import KnowledgeBaseIndex
+
+
+def _clustered_vectors(n: int, dim: int = 32, clusters: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.1 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_ivf_matches_exact_search_and_round_trips(tmp_path) -> None:
+    """A saved and memory-mapped IVF index finds the same nearest docs as brute force."""
+    vectors = _clustered_vectors(500)
+    doc_ids = [f"doc-{i}" for i in range(500)]
+    docs = [{"question": f"q{i}", "answer": f"a{i}"} for i in range(500)]
+    built = IVFIndex.build(doc_ids, vectors, docs, nlist=16)
+    built.save(str(tmp_path / "index"), queries=vectors[:50])
+
+    index = IVFIndex.open(str(tmp_path / "index"), nprobe=4)
+    assert isinstance(index.vectors, np.memmap)
+    assert len(index) == 500
+
+    match = index.search(vectors[42], top_k=1)[0]
+    assert (match.doc_id, match.data["answer"]) == ("doc-42", "a42")
+
+    rows = recall_report(index, np.load(tmp_path / "index" / "queries.npy"), [1, 16], 5, 0.55)
+    assert rows[-1]["recall_at_1"] == 1.0
+    assert rows[-1]["threshold_agreement"] == 1.0
+    assert rows[0]["recall_at_1"] >= 0.9
+
+
+def test_layered_index_merges_recent_entries() -> None:
+    """Entries learned after the build are searchable alongside the file."""
+    vectors = _clustered_vectors(50)
+    ann = IVFIndex.build([f"doc-{i}" for i in range(50)], vectors, [{}] * 50, nlist=4)
+    recent = KnowledgeBaseIndex()
+    recent.upsert("new", {"answer": "fresh", "content_embedding": (-vectors[0]).tolist()})
+
+    matches = LayeredIndex([ann, recent]).search(-vectors[0], top_k=2)
+
+    assert matches[0].doc_id == "new"
+    assert len(matches) == 2
+
+
+def test_live_layers_shadow_edited_merged_and_deleted_entries() -> None:
+    """Edits, compaction merges, deletes and soft deletes stop serving the file's copy."""
+    db = FakeFirestore()
+    kb = db.collection("knowledge_base")
+    vectors = _clustered_vectors(20)
+    for i in range(20):
+        kb.document(f"doc-{i}").set({
+            "question": f"q{i}", "answer": f"a{i}", "content_embedding": vectors[i].tolist(),
+        })
+    kb.document("doc-19").update({"deletedAt": datetime.datetime.now(datetime.timezone.utc)})
+    before_build = datetime.datetime.now(datetime.timezone.utc)
+    ann, _ = build_from_firestore(db, nlist=4, iterations=5)
+    built_at = datetime.datetime.fromisoformat(ann.built_at)
+    assert before_build <= built_at
+
+    created = OverlayIndex()
+    created.watch(kb.where("createdAt", ">", built_at))
+    updated = OverlayIndex()
+    updated.watch(kb.where("updatedAt", ">", built_at))
+    index = LayeredIndex([ann, created, updated])
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    kb.document("doc-1").update({"answer": "edited", "updatedAt": now})
+    kb.document("doc-3").update({"mergedDocIds": ["doc-4"], "updatedAt": now})
+    kb.document("doc-4").delete()
+    kb.document("doc-5").update({"updatedAt": now})
+    kb.document("doc-5").delete()
+    kb.document("doc-7").update({"deletedAt": now, "updatedAt": now})
+    kb.document("new").set({
+        "question": "new", "answer": "fresh", "content_embedding": vectors[6].tolist(), "createdAt": now,
+    })
+
+    assert index.search(vectors[1], top_k=1)[0].data["answer"] == "edited"
+    for deleted in ("doc-4", "doc-5", "doc-7", "doc-19"):
+        assert deleted not in [m.doc_id for m in index.search(vectors[int(deleted[4:])], top_k=20)]
+    ids = [m.doc_id for m in index.search(vectors[6], top_k=2)]
+    assert sorted(ids) == ["doc-6", "new"]
+    # 19 built (doc-19 was soft-deleted first) - 3 deleted + 1 new, each once.
+    assert len({m.doc_id for m in index.search(vectors[1], top_k=20)}) == 17
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+
+from kb_index import KnowledgeBaseIndex
+
+
+def _change(kind: str, doc_id: str, data: Optional[dict] = None):
+    document = SimpleNamespace(id=doc_id, to_dict=lambda: data, reference=None)
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=document)
+
+
+def test_search_ranks_by_cosine() -> None:
+    """Top-k results come back ordered by cosine similarity."""
+    index = KnowledgeBaseIndex(initial_capacity=1)
+    index.apply_changes([
+        _change("ADDED", "hours", {"question": "hours?", "content_embedding": [1.0, 0.0]}),
+        _change("ADDED", "price", {"question": "price?", "content_embedding": [0.0, 2.0]}),
+        _change("ADDED", "both", {"question": "both?", "question_embedding": [1.0, 1.0]}),
+    ])
+
+    matches = index.search([3.0, 0.1], top_k=2)
+
+    assert [m.doc_id for m in matches] == ["hours", "both"]
+    assert np.isclose(matches[0].similarity, 0.99944, atol=1e-4)
+    assert "content_embedding" not in matches[0].data
+    assert len(index) == 3
+
+
+def test_changes_are_applied_incrementally() -> None:
+    """Edits overwrite in place, deletes compact the matrix, un-embedded docs are skipped."""
+    index = KnowledgeBaseIndex()
+    index.apply_changes([
+        _change("ADDED", "a", {"answer": "A", "content_embedding": [1.0, 0.0]}),
+        _change("ADDED", "b", {"answer": "B", "content_embedding": [0.0, 1.0]}),
+        _change("ADDED", "c", {"answer": "C"}),
+    ])
+    assert len(index) == 2
+
+    index.apply_changes([
+        _change("MODIFIED", "b", {"answer": "B2", "content_embedding": [1.0, 0.1]}),
+        _change("REMOVED", "a"),
+    ])
+
+    matches = index.search([1.0, 0.0], top_k=5)
+    assert [(m.doc_id, m.data["answer"]) for m in matches] == [("b", "B2")]
+
+
+def test_snapshot_marks_index_ready() -> None:
+    """The first snapshot delivery is the initial load."""
+    index = KnowledgeBaseIndex()
+    assert not index.ready
+
+    index._on_snapshot([], [_change("ADDED", "a", {"content_embedding": [1.0]})], None)
+
+    assert index.wait_until_ready(0)
+    assert index.search([0.0], top_k=1) == []
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from fakes import FakeFirestore
+
+from kb_shared import SharedKBIndex, SharedKBRefresher, publish_snapshot
+
+
+def test_readers_follow_published_versions(tmp_path) -> None:
+    path = str(tmp_path / "kb")
+    reader = SharedKBIndex(path, check_interval=0)
+    assert not reader.ready and reader.search([1.0, 0.0]) == []
+
+    publish_snapshot(path, ["a"], np.array([[1.0, 0.0]]), [{"question": "opening hours", "answer": "A"}])
+    assert reader.ready and reader.version == "v000001"
+    assert [m.doc_id for m in reader.search([1.0, 0.1], top_k=1)] == ["a"]
+    assert isinstance(reader._snapshot.vectors, np.memmap)
+
+    publish_snapshot(path, ["b", "a"], np.array([[0.0, 1.0], [1.0, 0.0]]), [
+        {"question": "parking", "answer": "B"},
+        {"question": "opening hours today", "answer": "A2"},
+    ])
+    publish_snapshot(path, ["b"], np.array([[0.0, 1.0]]), [{"question": "parking", "answer": "B"}])
+    # Only the newest versions are kept on disk.
+    assert sorted(os.listdir(path)) == ["current", "v000002", "v000003"]
+
+    assert reader.version == "v000003" and len(reader) == 1
+    assert [m.doc_id for m in reader.lexical_search("parking", top_k=5)] == ["b"]
+    assert reader.lexical_search("opening hours") == []
+
+
+def test_one_refresher_per_host_publishes(tmp_path) -> None:
+    db = FakeFirestore()
+    kb = db.collection("knowledge_base")
+    kb.document("a").set({"question": "q", "answer": "A", "content_embedding": [1.0, 0.0]})
+    path = str(tmp_path / "kb")
+
+    leader = SharedKBRefresher(kb, path)
+    follower = SharedKBRefresher(kb, path)
+    try:
+        assert leader.try_acquire()
+        assert not follower.try_acquire()
+
+        assert leader.publish_if_changed() == "v000001"
+        assert leader.publish_if_changed() is None  # nothing changed since
+
+        kb.document("b").set({"question": "q2", "answer": "B", "content_embedding": [0.0, 1.0]})
+        assert leader.publish_if_changed() == "v000002"
+        assert len(SharedKBIndex(path)) == 2
+
+        # When the leader goes away, another process can take over.
+        leader.close()
+        assert follower.try_acquire()
+    finally:
+        leader.close()
+        follower.close()
@@ -0,0 +1,68 @@
+from kb_index import KBMatch, KnowledgeBaseIndex
+from lexical_index import LexicalIndex, hybrid_rank, tokenize
+
+
+def test_tokenize_normalizes_and_adds_bigrams() -> None:
+    assert tokenize("Are you OPEN Monday?") == [
+        "are", "you", "open", "monday", "are you", "you open", "open monday",
+    ]
+
+
+def test_bm25_ranks_and_updates_incrementally() -> None:
+    """Exact phrasings score ~1.0; edits and deletes update the postings."""
+    index = LexicalIndex()
+    index.upsert("hours", "What are your opening hours?")
+    index.upsert("monday", "Are you open on Monday?")
+    index.upsert("price", "How much is a haircut?")
+
+    results = index.search("are you open on monday")
+    assert results[0] == ("monday", 1.0)
+    assert all(doc_id != "price" for doc_id, _ in results)
+
+    index.upsert("monday", "Do you take walk-ins?")
+    index.remove("hours")
+    assert index.search("opening hours") == []
+    assert index.search("walk-ins")[0][0] == "monday"
+    assert len(index) == 2
+
+
+def test_hybrid_rank_promotes_second_vector_match_with_strong_lexical_score() -> None:
+    """A lexical match ranked second by cosine still wins the fused ranking."""
+    index = KnowledgeBaseIndex()
+    index.upsert("parking", {"question": "Where can I park?", "content_embedding": [1.0, 0.0]})
+    index.upsert("monday", {"question": "Are you open on Mondays?", "content_embedding": [0.9, 0.44]})
+
+    vector = index.search([1.0, 0.0], top_k=2)
+    lexical = index.lexical_search("are you open on mondays", top_k=2)
+    assert [m.doc_id for m in vector] == ["parking", "monday"]
+
+    weighted = hybrid_rank(vector, lexical, mode="weighted", vector_weight=0.5)
+    assert weighted[0].doc_id == "monday"
+    assert weighted[0].lexical_score > 0.9
+
+    rrf = hybrid_rank(vector, lexical, mode="rrf")
+    assert rrf[0].doc_id == "monday"
+
+
+def test_hybrid_rank_handles_single_signal() -> None:
+    match = KBMatch("a", 0.8, {"answer": "A"})
+    (fused,) = hybrid_rank([match], [], vector_weight=0.5)
+    assert (fused.similarity, fused.lexical_score, fused.score) == (0.8, 0.0, 0.4)
+
+
+def test_common_terms_only_rescore_rarer_matches() -> None:
+    """Terms above max_doc_freq add no candidates but keep their share of the score."""
+    docs = {
+        "hours": "what are your hours",
+        "price": "what are your prices",
+        "park": "what about parking",
+    }
+    capped, uncapped = LexicalIndex(max_doc_freq=2), LexicalIndex()
+    for doc_id, question in docs.items():
+        capped.upsert(doc_id, question)
+        uncapped.upsert(doc_id, question)
+
+    full = uncapped.search("what about parking")
+    assert len(full) == 3
+    assert capped.search("what about parking") == full[:1]
+    assert len(capped.search("what are your")) == 2
@@ -0,0 +1,68 @@
+from livekit.agents import llm
+
+from rag_context import RAG_CONTEXT_ID, RagContextManager
+
+
+def _system_messages(chat_ctx: llm.ChatContext) -> list:
+    return [item for item in chat_ctx.items if getattr(item, "role", None) == "system"]
+
+
+def test_repeated_facts_are_injected_once_as_one_block() -> None:
+    """The same KB doc matched on every turn of a long call keeps one copy in one block."""
+    rag = RagContextManager(token_budget=300)
+    chat_ctx = llm.ChatContext()
+
+    for turn in range(50):
+        chat_ctx.add_message(role="user", content=f"When are you open? ({turn})")
+        rag.add("kb:hours", "Q: When are you open? A: 10 AM to 8 PM, Tuesday to Sunday.")
+        rag.apply(chat_ctx)
+        chat_ctx.add_message(role="assistant", content="10 AM to 8 PM, Tuesday to Sunday.")
+
+    blocks = _system_messages(chat_ctx)
+    assert len(blocks) == 1
+    assert blocks[0].id == RAG_CONTEXT_ID
+    assert blocks[0].text_content.count("10 AM to 8 PM") == 1
+
+
+def test_budget_evicts_least_recent_and_least_relevant() -> None:
+    rag = RagContextManager(token_budget=80, max_facts=10)
+    chat_ctx = llm.ChatContext()
+    fact = "Q: question number {0}? A: a reasonably long answer for fact number {0}."
+
+    rag.add("kb:0", fact.format(0), relevance=0.9)
+    rag.apply(chat_ctx)
+    rag.add("kb:1", fact.format(1), relevance=0.6)
+    rag.apply(chat_ctx)
+    rag.add("kb:2", fact.format(2), relevance=0.9)
+    block_tokens = rag.apply(chat_ctx)
+
+    # Only two facts fit; the older, weaker kb:1 goes first.
+    assert "kb:0" in rag and "kb:2" in rag and "kb:1" not in rag
+    assert rag.stats()["evicted"] == 1
+    # The "- " bullets are the only thing the budget doesn't count.
+    assert block_tokens <= 80 + 2
+
+
+def test_max_facts_and_refresh() -> None:
+    rag = RagContextManager(token_budget=10_000, max_facts=3)
+    chat_ctx = llm.ChatContext()
+
+    for i in range(3):
+        rag.add(f"kb:{i}", f"fact {i}")
+        rag.apply(chat_ctx)
+    rag.add("kb:0", "fact 0 (updated)")  # used again: now the most recent
+    rag.add("request:r1", "Supervisor answer: yes")
+    rag.apply(chat_ctx)
+
+    assert len(rag) == 3 and "kb:1" not in rag
+    text = _system_messages(chat_ctx)[0].text_content
+    assert text.index("fact 2") < text.index("fact 0 (updated)")
+    assert text.endswith("Supervisor answer: yes")
+
+
+def test_no_facts_removes_block() -> None:
+    rag = RagContextManager()
+    chat_ctx = llm.ChatContext()
+
+    assert rag.apply(chat_ctx) == 0
+    assert _system_messages(chat_ctx) == []
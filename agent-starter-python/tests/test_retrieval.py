@@ -0,0 +1,48 @@
+from kb_index import KnowledgeBaseIndex
+from lexical_index import HybridMatch
+from retrieval import RetrievalConfig, direct_answer, retrieve
+
+
+def _match(similarity: float, **data) -> HybridMatch:
+    return HybridMatch("doc", similarity, similarity, 0.0, data)
+
+
+def test_direct_answer_requires_threshold_and_answer() -> None:
+    strong = _match(0.95, question="Do you take walk-ins?", answer="Yes, until 6 PM.")
+
+    assert direct_answer(strong, 0.9) == "Yes, until 6 PM."
+    assert direct_answer(strong, None) is None
+    assert direct_answer(_match(0.85, answer="Yes"), 0.9) is None
+    assert direct_answer(_match(0.99, question="q"), 0.9) is None
+    assert direct_answer(None, 0.9) is None
+
+
+def test_direct_answer_template() -> None:
+    match = _match(0.97, question="Do you take walk-ins?", answer="Yes, until 6 PM.")
+
+    assert (
+        direct_answer(match, 0.9, "Good question! {answer}")
+        == "Good question! Yes, until 6 PM."
+    )
+    # A broken template falls back to the bare answer rather than failing the turn.
+    assert direct_answer(match, 0.9, "{unknown}") == "Yes, until 6 PM."
+
+
+def test_lexical_only_match_needs_several_query_words() -> None:
+    """A one-word utterance scores ~1.0 BM25 but isn't enough without cosine support."""
+    index = KnowledgeBaseIndex()
+    for doc_id, question in [
+        ("park", "is there parking on weekends"),
+        ("hours", "what are your opening hours"),
+        ("price", "how much is a haircut"),
+    ]:
+        index.upsert(doc_id, {
+            "question": question, "answer": f"{doc_id} answer", "content_embedding": [1.0, 0.0],
+        })
+    config = RetrievalConfig()
+    unrelated = [0.0, 1.0]
+
+    assert retrieve(index, "parking?", unrelated, config) is None
+    assert retrieve(index, "hours", unrelated, config) is None
+    match = retrieve(index, "is there parking on weekends please", unrelated, config)
+    assert match is not None and match.doc_id == "park" and match.similarity < 0.5
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_retrieval import KB_LOOKUP_DEADLINE_MS, check_thresholds, run_size
+from fakes import DeterministicEmbedder, FakeFirestore
+
+from kb_index import KnowledgeBaseIndex
+from retrieval import RetrievalConfig, retrieve
+
+
+def test_fake_firestore_drives_index_listener() -> None:
+    """The fake delivers an initial snapshot and then per-write changes to on_snapshot."""
+    db = FakeFirestore()
+    kb = db.collection("knowledge_base")
+    kb.document("a").set({"question": "a?", "answer": "A", "content_embedding": [1.0, 0.0]})
+
+    index = KnowledgeBaseIndex()
+    index.watch(kb)
+    assert index.ready and len(index) == 1
+
+    kb.document("b").set({"question": "b?", "answer": "B", "content_embedding": [0.0, 1.0]})
+    kb.document("a").delete()
+    assert [m.doc_id for m in index.search([0.0, 1.0], top_k=5)] == ["b"]
+
+    index.close()
+    kb.document("c").set({"question": "c?", "content_embedding": [1.0, 1.0]})
+    assert len(index) == 1
+
+
+def test_retrieve_accepts_paraphrase_and_rejects_unknown() -> None:
+    embedder = DeterministicEmbedder(dimensions=256)
+    assert np.allclose(embedder.embed("same text"), embedder.embed("same text"))
+
+    index = KnowledgeBaseIndex()
+    for doc_id, question in [("hours", "what are your opening hours"), ("park", "is there parking")]:
+        index.upsert(doc_id, {
+            "question": question,
+            "answer": f"{doc_id} answer",
+            "content_embedding": embedder.embed(question).tolist(),
+        })
+    config = RetrievalConfig()
+
+    query = "hey what are your opening hours?"
+    match = retrieve(index, query, embedder.embed(query), config)
+    assert match is not None and match.doc_id == "hours"
+
+    query = "do you repair submarines"
+    assert retrieve(index, query, embedder.embed(query), config) is None
+
+
+def test_benchmark_reports_and_checks_thresholds() -> None:
+    result = run_size(50, {
+        "queries": 9, "alloc_queries": 3, "warmup": 2, "dimensions": 64, "encoding": "f16-v1",
+        "backend": "exact", "nprobe": 8, "hybrid_mode": "weighted", "seed": 0,
+    })
+    assert result["indexed"] == 50
+    assert set(result["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert result["accept_rate"]["exact"] == 1.0
+
+    assert check_thresholds([result], {"50": {"latency_ms.p95": 1e9}}) == []
+    failures = check_thresholds([result], {
+        "*": {"latency_ms.p50": 0.0, "min": {"accept_rate.unknown": 1.0}},
+        "50": {"no.such.metric": 1},
+    })
+    assert len(failures) == 3
+
+
+def test_latency_limits_never_exceed_lookup_deadline() -> None:
+    """A lookup the agent would abandon fails the benchmark whatever the file says."""
+    slow = {"size": 250000, "latency_ms": {"p95": KB_LOOKUP_DEADLINE_MS + 1.0}}
+    assert check_thresholds([slow], {"250000": {"latency_ms.p95": 1e9}}) == [
+        f"250000: latency_ms.p95 = {KB_LOOKUP_DEADLINE_MS + 1.0:.3f} > {KB_LOOKUP_DEADLINE_MS}"
+    ]
+
+    with open(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "thresholds.json")) as f:
+        thresholds = json.load(f)
+    for limits in thresholds.values():
+        assert all(
+            limit < KB_LOOKUP_DEADLINE_MS
+            for metric, limit in limits.items()
+            if metric.startswith("latency_ms.")
+        )
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from speculative import SpeculativeLookup, transcripts_match
+
+
+class _Lookups:
+    def __init__(self) -> None:
+        self.started = []
+        self.futures = []
+
+    def start(self, text: str) -> asyncio.Future:
+        self.started.append(text)
+        future = asyncio.get_running_loop().create_future()
+        self.futures.append(future)
+        return future
+
+
+def test_transcripts_match() -> None:
+    assert transcripts_match("are you open on mondays", "are you open on mondays", 0.9)
+    assert transcripts_match(
+        "do you do hair coloring for kids under twelve",
+        "do you do hair colouring for kids under twelve",
+        0.85,
+    )
+    assert not transcripts_match("are you open", "are you open on mondays", 0.9)
+
+
+@pytest.mark.asyncio
+async def test_stable_interim_is_reused_for_matching_final() -> None:
+    """Only the interim that stays stable starts a lookup, and the final reuses it."""
+    lookups = _Lookups()
+    speculation = SpeculativeLookup(lookups.start, stable_ms=20)
+
+    speculation.on_transcript("are you", is_final=False)
+    speculation.on_transcript("are you open", is_final=False)
+    speculation.on_transcript("are you open on Mondays", is_final=False)
+    await asyncio.sleep(0.05)
+    assert lookups.started == ["are you open on Mondays"]
+
+    speculation.on_transcript("Are you open on Mondays?", is_final=True)
+    assert len(lookups.started) == 1
+
+    future, head_start_ms = speculation.take("Are you open on Mondays?")
+    assert future is lookups.futures[0]
+    assert head_start_ms > 0
+    lookups.futures[0].set_result("match")
+    assert await future == "match"
+
+    # A restarted (preemptive) turn for the same transcript shares the lookup.
+    assert speculation.take("Are you open on Mondays?")[0] is future
+    assert speculation.stats() == {"started": 1, "reused": 2, "discarded": 0}
+
+
+@pytest.mark.asyncio
+async def test_mismatched_final_cancels_speculation() -> None:
+    lookups = _Lookups()
+    speculation = SpeculativeLookup(lookups.start, stable_ms=10)
+
+    speculation.on_transcript("are you open", is_final=False)
+    await asyncio.sleep(0.03)
+    future, _ = speculation.take("are you open on Mondays or Tuesdays")
+
+    assert future is None
+    assert lookups.futures[0].cancelled()
+    assert speculation.stats()["discarded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_final_starts_immediately_and_replaces_stale_lookup() -> None:
+    lookups = _Lookups()
+    speculation = SpeculativeLookup(lookups.start, stable_ms=1000)
+
+    speculation.on_transcript("do you sell gift cards", is_final=True)
+    speculation.on_transcript("how much is a haircut", is_final=True)
+
+    assert lookups.started == ["do you sell gift cards", "how much is a haircut"]
+    assert lookups.futures[0].cancelled()
+    assert speculation.take("How much is a haircut?")[0] is lookups.futures[1]
+
+    speculation.close()
+    assert lookups.futures[1].cancelled()
+    assert speculation.take("How much is a haircut?") == (None, 0.0)
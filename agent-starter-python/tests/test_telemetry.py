@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from telemetry import Histogram, Telemetry, current_room
+
+
+def test_histogram_percentiles_use_bucket_bounds() -> None:
+    histogram = Histogram(bounds=(10, 100, 1000))
+    for value in [1, 2, 3, 50, 60, 70, 80, 90, 400, 5000]:
+        histogram.observe(value)
+
+    assert histogram.count == 10
+    assert histogram.percentile(0.3) == 10
+    assert histogram.percentile(0.5) == 100
+    assert histogram.percentile(0.95) == 5000  # overflow bucket reports the max
+    assert histogram.summary()["max_ms"] == 5000
+
+
+def test_spans_are_tagged_by_room_and_outcome() -> None:
+    recorder = Telemetry()
+    token = current_room.set("room-a")
+    try:
+        with recorder.span("kb.lookup", outcome="miss") as span:
+            span.outcome = "hit"
+        with pytest.raises(asyncio.TimeoutError), recorder.span("escalation.create"):
+            raise asyncio.TimeoutError()
+        with pytest.raises(ValueError), recorder.span("kb.embed"):
+            raise ValueError("boom")
+    finally:
+        current_room.reset(token)
+    recorder.record("kb.lookup", 5.0, "miss", room="room-b")
+
+    summary = recorder.summary("room-a")
+    assert summary["kb.lookup"]["hit"]["count"] == 1
+    assert "miss" not in summary["kb.lookup"]
+    assert summary["escalation.create"]["timed_out"]["count"] == 1
+    assert summary["kb.embed"]["error"]["count"] == 1
+    assert set(recorder.summary()["kb.lookup"]) == {"hit", "miss"}
+
+    recorder.reset("room-a")
+    assert recorder.summary("room-a") == {}
+    assert recorder.summary("room-b")["kb.lookup"]["miss"]["count"] == 1
+
+
+def test_worker_thread_spans_inherit_the_room() -> None:
+    recorder = Telemetry()
+
+    def work() -> None:
+        with recorder.span("kb.vector_search"):
+            pass
+
+    token = current_room.set("room-c")
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(contextvars.copy_context().run, work).result()
+    finally:
+        current_room.reset(token)
+
+    assert recorder.summary("room-c")["kb.vector_search"]["ok"]["count"] == 1
+
+
+def test_disabled_telemetry_records_nothing() -> None:
+    recorder = Telemetry(enabled=False)
+    with recorder.span("kb.lookup") as span:
+        span.outcome = "hit"
+    recorder.record("kb.lookup", 1.0)
+
+    assert recorder.span("a") is recorder.span("b")
+    assert recorder.summary() == {}
@@ -0,0 +1,130 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+from livekit import rtc
+
+from tts_cache import TTSAudioCache, cached_tts_node, prewarm
+
+SAMPLE_RATE = 16000
+
+
+def _frames_for(text: str, frames: int = 5) -> list[rtc.AudioFrame]:
+    """Deterministic 20 ms frames whose samples encode the text length."""
+    samples = SAMPLE_RATE // 50
+    value = len(text) % 1000
+    return [
+        rtc.AudioFrame(value.to_bytes(2, "little") * samples, SAMPLE_RATE, 1, samples)
+        for _ in range(frames)
+    ]
+
+
+class _FakeStream:
+    def __init__(self, frames) -> None:
+        self._frames = frames
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for frame in self._frames:
+            yield SimpleNamespace(frame=frame)
+
+
+class FakeTTS:
+    """Local stand-in for inference.TTS: counts synthesized texts."""
+
+    def __init__(self) -> None:
+        self.synthesized = []
+
+    def synthesize(self, text: str) -> _FakeStream:
+        self.synthesized.append(text)
+        return _FakeStream(_frames_for(text))
+
+    async def node(self, text):
+        """Stands in for Agent.default.tts_node."""
+        joined = "".join([chunk async for chunk in text])
+        self.synthesized.append(joined)
+        for frame in _frames_for(joined):
+            yield frame
+
+
+async def _text(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _play(cache, tts, chunks, cacheable):
+    return [f async for f in cached_tts_node(cache, _text(*chunks), tts.node, cacheable)]
+
+
+def test_put_get_roundtrip_and_key(tmp_path) -> None:
+    cache = TTSAudioCache(str(tmp_path), "voice-a")
+    text = "We are open 10 AM to 8 PM."
+    cache.put(text, _frames_for(text), doc_id="hours")
+
+    frames = cache.get("We are open  10 AM to 8 PM. ")
+    assert b"".join(bytes(f.data) for f in frames) == b"".join(
+        bytes(f.data) for f in _frames_for(text)
+    )
+    assert TTSAudioCache(str(tmp_path), "voice-b").get(text) is None
+    assert cache.stats() == {"hits": 1, "misses": 0}
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(tmp_path)) == [".json", ".wav"]
+
+
+def test_lru_eviction_by_size(tmp_path) -> None:
+    one_entry = 5 * (SAMPLE_RATE // 50) * 2
+    cache = TTSAudioCache(str(tmp_path), "voice", max_bytes=int(one_entry * 2.5))
+    cache.put("first", _frames_for("first"))
+    cache.put("second", _frames_for("second"))
+    assert cache.get("first") is not None  # now most recently used
+    cache.put("third", _frames_for("third"))
+
+    assert cache.contains("first") and cache.contains("third")
+    assert not cache.contains("second")
+
+
+def test_changed_answer_invalidates_old_audio(tmp_path) -> None:
+    cache = TTSAudioCache(str(tmp_path), "voice")
+    cache.put("Haircuts are $50.", _frames_for("Haircuts are $50."), doc_id="price")
+    cache.put("Other answer.", _frames_for("Other answer."), doc_id="other")
+
+    assert cache.forget_stale("price", "Haircuts are $55.") == 1
+    assert not cache.contains("Haircuts are $50.")
+    assert cache.contains("Other answer.")
+
+
+@pytest.mark.asyncio
+async def test_direct_answers_play_from_cache(tmp_path) -> None:
+    cache = TTSAudioCache(str(tmp_path), "voice")
+    tts = FakeTTS()
+    answer = "We are closed on Mondays."
+    cacheable = {answer: "hours"}
+
+    first = await _play(cache, tts, [answer], cacheable)
+    second = await _play(cache, tts, [answer], cacheable)
+    llm_text = await _play(cache, tts, ["We are ", "closed on Mondays."], cacheable)
+
+    assert tts.synthesized == [answer, answer]  # miss, then hit; LLM text always live
+    assert len(first) == 5 and len(llm_text) == 5
+    assert b"".join(bytes(f.data) for f in second) == b"".join(bytes(f.data) for f in first)
+
+
+@pytest.mark.asyncio
+async def test_prewarm_synthesizes_missing_answers_once(tmp_path) -> None:
+    cache = TTSAudioCache(str(tmp_path), "voice")
+    tts = FakeTTS()
+    entries = [("hours", "Open 10 to 8."), ("price", "Haircuts are $50.")]
+
+    assert await prewarm(cache, tts, entries) == 2
+    assert await prewarm(cache, tts, entries) == 0
+    assert await prewarm(cache, tts, [("price", "Haircuts are $55.")]) == 1
+
+    assert tts.synthesized == ["Open 10 to 8.", "Haircuts are $50.", "Haircuts are $55."]
+    assert not cache.contains("Haircuts are $50.")
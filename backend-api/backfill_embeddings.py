@@ -0,0 +1,259 @@
+# backfill_embeddings.py
+# Offline job that fills in missing question/content embeddings in knowledge_base.
+#
+#   python backfill_embeddings.py --batch-size 50 --concurrency 4 --rpm 600
+#
+# Progress is checkpointed after every page, so an interrupted run resumes where
+# it stopped; docs whose embeddings failed are recorded in the checkpoint and
+# retried first on the next run. Pass --reset to start again from the beginning
+# of the collection.
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from frontdesk_shared.embedding_codec import (
+    EMBEDDING_FIELDS, ENCODINGS, FLOAT, doc_encoding, encode_fields, has_embedding,
+)
+from embeddings import embed_texts
+
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+
+class RateLimiter:
+    """Spaces out calls so at most `per_minute` start in any minute, across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def missing_embedding_jobs(doc):
+    """Return (field, text) pairs for the embeddings this KB doc is missing."""
+    data = doc.to_dict() or {}
+    question = data.get('question')
+    answer = data.get('answer')
+
+    jobs = []
+    if question and not has_embedding(data, 'question_embedding'):
+        jobs.append(('question_embedding', question))
+    if not has_embedding(data, 'content_embedding'):
+        if question and answer:
+            jobs.append(('content_embedding', f"Question: {question}\nAnswer: {answer}"))
+        elif question or answer:
+            jobs.append(('content_embedding', question or answer))
+    return jobs
+
+
+def embed_with_retry(texts, limiter, attempts=4):
+    for attempt in range(attempts):
+        limiter.acquire()
+        try:
+            return embed_texts(texts)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = (2 ** attempt) + random.random()
+            print(f"Embedding batch of {len(texts)} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def embed_docs(db, docs, args, executor, limiter):
+    """Embed and write the missing embeddings of `docs`.
+
+    Returns (docs updated, embeddings written, ids of docs whose embeddings failed).
+    """
+    jobs = []
+    encodings = {}
+    for doc in docs:
+        for field, text in missing_embedding_jobs(doc):
+            jobs.append((doc.reference, field, text))
+        # A doc has one encoding for both fields; keep it if it already has
+        # an embedding, otherwise use the configured one.
+        data = doc.to_dict() or {}
+        if any(has_embedding(data, f) for f in EMBEDDING_FIELDS):
+            encodings[doc.reference.path] = doc_encoding(data)
+        else:
+            encodings[doc.reference.path] = args.encoding
+
+    batches = [
+        jobs[i:i + args.batch_size] for i in range(0, len(jobs), args.batch_size)
+    ]
+    futures = [
+        executor.submit(embed_with_retry, [text for _, _, text in batch], limiter)
+        for batch in batches
+    ]
+
+    updates = {}
+    failed_ids = set()
+    embedded = 0
+    for batch, future in zip(batches, futures):
+        try:
+            vectors = future.result()
+        except Exception as e:
+            failed_ids.update(doc_ref.id for doc_ref, _, _ in batch)
+            print(f"Giving up on a batch of {len(batch)} embeddings: {e}")
+            continue
+        for (doc_ref, field, _), vector in zip(batch, vectors):
+            updates.setdefault(doc_ref.path, (doc_ref, {}))[1][field] = vector
+        embedded += len(batch)
+
+    if not args.dry_run:
+        pending = list(updates.values())
+        for i in range(0, len(pending), FIRESTORE_MAX_BATCH_WRITES):
+            write_batch = db.batch()
+            for doc_ref, fields in pending[i:i + FIRESTORE_MAX_BATCH_WRITES]:
+                # updatedAt lets agents serving a prebuilt ANN file pick the doc up live.
+                write_batch.update(doc_ref, {
+                    **encode_fields(fields, encodings[doc_ref.path]),
+                    'updatedAt': firestore.SERVER_TIMESTAMP,
+                })
+            write_batch.commit()
+    return len(updates), embedded, failed_ids
+
+
+def backfill(db, args):
+    collection = db.collection('knowledge_base')
+    checkpoint = {} if args.reset else load_checkpoint(args.checkpoint)
+    last_doc_id = checkpoint.get('lastDocId')
+    scanned = checkpoint.get('scanned', 0)
+    updated = checkpoint.get('updated', 0)
+    embedded = checkpoint.get('embedded', 0)
+    # Docs whose embeddings failed are retried first on the next run.
+    failed_ids = set(checkpoint.get('failedDocIds', []))
+    if last_doc_id:
+        print(f"Resuming after {last_doc_id} ({scanned} docs already scanned)")
+
+    limiter = RateLimiter(args.rpm)
+    started = time.monotonic()
+    run_embedded = 0
+
+    def save():
+        save_checkpoint(args.checkpoint, {
+            'lastDocId': last_doc_id,
+            'scanned': scanned,
+            'updated': updated,
+            'embedded': embedded,
+            'failedDocIds': sorted(failed_ids),
+        })
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        if failed_ids:
+            print(f"Retrying {len(failed_ids)} docs that failed in an earlier run")
+            retry_ids = sorted(failed_ids)
+            for i in range(0, len(retry_ids), args.page_size):
+                chunk = retry_ids[i:i + args.page_size]
+                docs = [
+                    snap for snap in db.get_all([collection.document(d) for d in chunk])
+                    if snap.exists
+                ]
+                docs_updated, docs_embedded, still_failed = embed_docs(
+                    db, docs, args, executor, limiter
+                )
+                updated += docs_updated
+                embedded += docs_embedded
+                run_embedded += docs_embedded
+                failed_ids.difference_update(chunk)
+                failed_ids.update(still_failed)
+                save()
+
+        # Each page starts after the previous page's last snapshot; only a
+        # resumed run reads its cursor doc.
+        cursor = collection.document(last_doc_id).get() if last_doc_id else None
+        if cursor is not None and not cursor.exists:
+            print(f"Checkpoint doc {last_doc_id} no longer exists; scanning from the start")
+        while True:
+            query = collection.order_by('__name__').limit(args.page_size)
+            if cursor is not None and cursor.exists:
+                query = query.start_after(cursor)
+            docs = list(query.stream())
+            if not docs:
+                break
+
+            docs_updated, docs_embedded, page_failed = embed_docs(
+                db, docs, args, executor, limiter
+            )
+            updated += docs_updated
+            embedded += docs_embedded
+            run_embedded += docs_embedded
+            failed_ids.update(page_failed)
+
+            scanned += len(docs)
+            cursor = docs[-1]
+            last_doc_id = cursor.id
+            save()
+
+            elapsed = time.monotonic() - started
+            rate = run_embedded / elapsed if elapsed > 0 else 0.0
+            print(
+                f"Scanned {scanned} docs, updated {updated}, embedded {embedded} "
+                f"({rate:.1f} embeddings/s), failed {len(failed_ids)}"
+            )
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Backfill complete in {elapsed:.1f}s: {updated} docs updated, "
+        f"{run_embedded} embeddings this run "
+        f"({run_embedded / elapsed if elapsed > 0 else 0.0:.1f}/s), "
+        f"{len(failed_ids)} docs failed" + (" (retried on the next run)" if failed_ids else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill missing knowledge_base embeddings.")
+    parser.add_argument('--batch-size', type=int, default=50, help="texts per embedding request")
+    parser.add_argument('--concurrency', type=int, default=4, help="embedding requests in flight")
+    parser.add_argument('--rpm', type=float, default=600, help="max embedding requests per minute")
+    parser.add_argument('--page-size', type=int, default=300, help="docs read per Firestore page")
+    parser.add_argument(
+        '--encoding', choices=ENCODINGS,
+        default=os.environ.get("KB_EMBEDDING_ENCODING", FLOAT),
+        help="storage encoding for docs that have no embeddings yet",
+    )
+    parser.add_argument('--checkpoint', default='.backfill_checkpoint.json')
+    parser.add_argument('--reset', action='store_true', help="ignore the checkpoint and start over")
+    parser.add_argument('--dry-run', action='store_true', help="embed but do not write to Firestore")
+    args = parser.parse_args()
+
+    load_dotenv()
+    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
+
+    backfill(firestore.client(), args)
+
+
+if __name__ == "__main__":
+    main()
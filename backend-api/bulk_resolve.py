@@ -0,0 +1,153 @@
+# bulk_resolve.py
+# Resolves many help requests in one call: a single batched read to validate
+# them, batched embedding of every Q&A pair, and Firestore batched writes that
+# commit each request's status update together with its knowledge_base entry.
+import datetime
+
+from fastapi.concurrency import run_in_threadpool
+
+from frontdesk_shared.embedding_codec import ENCODING_FIELD
+
+FIRESTORE_MAX_BATCH_WRITES = 500
+MAX_BULK_ITEMS = 500
+
+
+async def get_all_by_path(db, refs):
+    if not refs:
+        return {}
+    # get_all returns snapshots in no particular order.
+    return await run_in_threadpool(
+        lambda: {snap.reference.path: snap for snap in db.get_all(refs)}
+    )
+
+
+async def resolve_many(db, ingestion_queue, items):
+    """Resolve `(request_id, answer)` pairs; returns one result dict per item, in order.
+
+    Each result has `requestId` and `status`: `resolved` (with `kbStatus`, and
+    `knowledgeBaseId` when the KB entry was written in the same batch),
+    `invalid`, `duplicate`, `not_found`, `already_resolved` or `error`. Pairs whose embedding fails are still
+    resolved and handed to the ingestion queue, which retries them.
+    """
+    help_requests = db.collection('help_requests')
+    knowledge_base = db.collection('knowledge_base')
+    results = [None] * len(items)
+
+    seen = set()
+    candidates = []
+    for i, (request_id, answer) in enumerate(items):
+        if not answer or not answer.strip():
+            results[i] = {'requestId': request_id, 'status': 'invalid', 'error': 'Answer is empty'}
+        elif request_id in seen:
+            results[i] = {'requestId': request_id, 'status': 'duplicate'}
+        else:
+            seen.add(request_id)
+            candidates.append(i)
+
+    refs = {i: help_requests.document(items[i][0]) for i in candidates}
+    snapshots = await get_all_by_path(db, list(refs.values()))
+    to_resolve = []
+    for i in candidates:
+        snap = snapshots.get(refs[i].path)
+        if snap is None or not snap.exists:
+            results[i] = {'requestId': items[i][0], 'status': 'not_found'}
+            continue
+        data = snap.to_dict() or {}
+        if data.get('status') == 'resolved':
+            results[i] = {'requestId': items[i][0], 'status': 'already_resolved'}
+        else:
+            to_resolve.append((i, refs[i], data.get('originalQuery')))
+
+    ingest = [i for i, _, question in to_resolve if question]
+    question_of = {i: question for i, _, question in to_resolve}
+    embedded = await ingestion_queue.embed_pairs([(question_of[i], items[i][1]) for i in ingest])
+    vectors = dict(zip(ingest, embedded))
+
+    # Duplicates are found once, off the event loop, against the index as it
+    # stands; repeats within this call point at the earlier item instead.
+    embedded_items = [i for i in ingest if vectors[i]]
+    found = await run_in_threadpool(
+        ingestion_queue.find_duplicates, [vectors[i][0] for i in embedded_items]
+    )
+    duplicates = {}
+    for i, duplicate in zip(embedded_items, found):
+        if duplicate is not None and duplicate[0] == 'batch':
+            duplicate = ('batch', embedded_items[duplicate[1]])
+        duplicates[i] = duplicate
+
+    # Entries the new answers will be merged into, read in one go. `known` also
+    # tracks entries created by this call, so repeats within it merge too.
+    known = {}
+    merge_ids = {key for kind, key in filter(None, duplicates.values()) if kind == 'kb'}
+    kb_snapshots = await get_all_by_path(db, [knowledge_base.document(d) for d in merge_ids])
+    for snap in kb_snapshots.values():
+        if snap.exists:
+            known[snap.id] = (snap.reference, snap.to_dict() or {})
+    # Item index -> id of the KB entry its answer was written to.
+    kb_ids = {}
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Each item is at most two writes: the request and its KB entry.
+    per_batch = FIRESTORE_MAX_BATCH_WRITES // 2
+    for start in range(0, len(to_resolve), per_batch):
+        chunk = to_resolve[start:start + per_batch]
+        batch = db.batch()
+        known_before = dict(known)
+        created = []
+        requeue = []
+        chunk_results = {}
+        for i, ref, question in chunk:
+            request_id, answer = items[i]
+            update = {'status': 'resolved', 'supervisorResponse': answer, 'resolvedAt': now}
+            result = {'requestId': request_id, 'status': 'resolved'}
+            if question and vectors.get(i):
+                duplicate = duplicates.get(i)
+                if duplicate is None:
+                    existing = None
+                elif duplicate[0] == 'kb':
+                    existing = known.get(duplicate[1])
+                else:
+                    existing = known.get(kb_ids.get(duplicate[1]))
+                kb_ref, kb_status = ingestion_queue.add_kb_write(
+                    batch, request_id, question, answer, vectors[i], existing, now
+                )
+                kb_ids[i] = kb_ref.id
+                if existing is None:
+                    created.append(kb_ref.id)
+                    if ingestion_queue.dedup_index is not None:
+                        ingestion_queue.dedup_index.upsert(kb_ref.id, vectors[i][0])
+                    known[kb_ref.id] = (kb_ref, {
+                        'answer': answer,
+                        'sourceRequestId': request_id,
+                        ENCODING_FIELD: ingestion_queue.encoding,
+                    })
+                elif existing[1].get('answer') != answer:
+                    known[kb_ref.id] = (kb_ref, {
+                        **existing[1], 'answer': answer, 'sourceRequestId': request_id,
+                    })
+                update['kbStatus'] = result['kbStatus'] = kb_status
+                update['knowledgeBaseId'] = result['knowledgeBaseId'] = kb_ref.id
+            elif question:
+                update['kbStatus'] = result['kbStatus'] = 'pending'
+                requeue.append((request_id, question, answer))
+            batch.update(ref, update)
+            chunk_results[i] = result
+
+        try:
+            await run_in_threadpool(batch.commit)
+        except Exception as e:
+            print(f"Bulk resolve batch of {len(chunk)} requests failed: {e}")
+            for kb_id in created:
+                if ingestion_queue.dedup_index is not None:
+                    ingestion_queue.dedup_index.remove(kb_id)
+            known = known_before
+            for i, _, _ in chunk:
+                results[i] = {'requestId': items[i][0], 'status': 'error', 'error': str(e)}
+            continue
+
+        for i, result in chunk_results.items():
+            results[i] = result
+        for job in requeue:
+            ingestion_queue.submit(*job)
+
+    return results
@@ -0,0 +1,183 @@
+# compact_knowledge_base.py
+# Merges near-duplicate knowledge_base entries that were written before
+# ingestion-time dedup existed (or while it was disabled).
+#
+#   python compact_knowledge_base.py --dry-run         # list the clusters it would merge
+#   python compact_knowledge_base.py --threshold 0.95  # merge them
+#
+# Entries whose question embeddings are at least --threshold similar are merged
+# into the oldest one: it takes the newest answer, the summed hitCount and every
+# source request, the other answers move to previousAnswers, the duplicates are
+# deleted (their ids kept in mergedDocIds) and help_requests pointing at them are
+# repointed. Re-running is a no-op.
+import argparse
+import datetime
+import os
+
+import firebase_admin
+import numpy as np
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+from frontdesk_shared.embedding_codec import doc_embedding, doc_encoding, encode_fields
+from kb_dedup import find_clusters
+
+FIRESTORE_MAX_BATCH_WRITES = 500
+OLDEST = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def created_at(data):
+    return data.get('createdAt') or OLDEST
+
+
+def load_entries(collection, page_size):
+    """All live (not soft-deleted) entries with a usable question embedding, oldest first."""
+    entries = []
+    scanned = 0
+    last_doc = None
+    while True:
+        query = collection.order_by('__name__').limit(page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+        scanned += len(docs)
+        for doc in docs:
+            data = doc.to_dict() or {}
+            vector = doc_embedding(data, 'question_embedding')
+            if data.get('deletedAt') or vector is None or not np.any(vector):
+                continue
+            entries.append((doc, data, vector))
+        print(f"Scanned {scanned} docs")
+
+    entries.sort(key=lambda entry: created_at(entry[1]))
+    dims = {entry[2].shape[0] for entry in entries}
+    if len(dims) > 1:
+        # Mixed embedding models can't be compared; keep the most common size.
+        common = max(dims, key=lambda d: sum(1 for e in entries if e[2].shape[0] == d))
+        entries = [e for e in entries if e[2].shape[0] == common]
+    return entries
+
+
+def merge_cluster(members, now):
+    """The update for the canonical (oldest) entry of a cluster."""
+    canonical = members[0][1]
+    newest = max(members, key=lambda m: m[1].get('updatedAt') or created_at(m[1]))[1]
+
+    source_ids = []
+    previous = []
+    # Agents serving a prebuilt ANN file hide these ids once they see the update.
+    merged_doc_ids = [doc.id for doc, _, _ in members[1:]]
+    for _, data, _ in members:
+        for doc_id in data.get('mergedDocIds') or []:
+            if doc_id not in merged_doc_ids:
+                merged_doc_ids.append(doc_id)
+        for request_id in [data.get('sourceRequestId')] + list(data.get('sourceRequestIds') or []):
+            if request_id and request_id not in source_ids:
+                source_ids.append(request_id)
+        previous.extend(data.get('previousAnswers') or [])
+    seen_answers = {newest.get('answer')}
+    for _, data, _ in members:
+        if data.get('answer') not in seen_answers:
+            seen_answers.add(data.get('answer'))
+            previous.append({
+                'answer': data.get('answer'),
+                'sourceRequestId': data.get('sourceRequestId'),
+                'replacedAt': now,
+            })
+
+    update = {
+        'answer': newest.get('answer'),
+        'sourceRequestId': newest.get('sourceRequestId'),
+        'sourceRequestIds': source_ids,
+        'hitCount': sum(data.get('hitCount') or 1 for _, data, _ in members),
+        'previousAnswers': previous,
+        'mergedDocIds': merged_doc_ids,
+        'updatedAt': now,
+    }
+    if newest is not canonical:
+        content = doc_embedding(newest, 'content_embedding')
+        if content is not None:
+            update.update(encode_fields({'content_embedding': content}, doc_encoding(canonical)))
+    return update
+
+
+def compact(db, threshold, page_size, dry_run):
+    collection = db.collection('knowledge_base')
+    help_requests = db.collection('help_requests')
+    entries = load_entries(collection, page_size)
+    clusters = find_clusters(
+        [doc.id for doc, _, _ in entries], [vector for _, _, vector in entries], threshold
+    )
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    batch = db.batch()
+    pending_writes = 0
+    removed = 0
+    for cluster in clusters:
+        members = [entries[i] for i in cluster]
+        canonical_doc = members[0][0]
+        duplicates = [doc for doc, _, _ in members[1:]]
+        removed += len(duplicates)
+        print(
+            f"{canonical_doc.id} ({members[0][1].get('question')!r}) <- "
+            + ", ".join(f"{doc.id} ({data.get('question')!r})" for doc, data, _ in members[1:])
+        )
+        if dry_run:
+            continue
+
+        writes = [('update', canonical_doc.reference, merge_cluster(members, now))]
+        for doc in duplicates:
+            writes.append(('delete', doc.reference, None))
+            for request in help_requests.where('knowledgeBaseId', '==', doc.id).stream():
+                writes.append(('update', request.reference, {'knowledgeBaseId': canonical_doc.id}))
+
+        # Keep a cluster's writes in one batch where it fits.
+        if pending_writes and pending_writes + len(writes) > FIRESTORE_MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+            pending_writes = 0
+        for op, ref, data in writes:
+            if op == 'delete':
+                batch.delete(ref)
+            else:
+                batch.update(ref, data)
+            pending_writes += 1
+            if pending_writes == FIRESTORE_MAX_BATCH_WRITES:
+                batch.commit()
+                batch = db.batch()
+                pending_writes = 0
+
+    if pending_writes:
+        batch.commit()
+    print(
+        f"{'Would merge' if dry_run else 'Merged'} {len(clusters)} clusters of "
+        f"{len(entries)} entries, removing {removed} duplicates"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate knowledge_base entries.")
+    parser.add_argument(
+        '--threshold', type=float,
+        default=float(os.getenv("KB_DEDUP_THRESHOLD") or 0.92),
+        help="question embedding cosine similarity at which entries are merged",
+    )
+    parser.add_argument('--page-size', type=int, default=300)
+    parser.add_argument('--dry-run', action='store_true', help="list clusters without writing")
+    args = parser.parse_args()
+    if not 0 < args.threshold <= 1:
+        parser.error("--threshold must be in (0, 1]")
+
+    load_dotenv()
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
+
+    compact(firestore.client(), args.threshold, args.page_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
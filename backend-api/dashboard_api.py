@@ -0,0 +1,243 @@
+# dashboard_api.py
+# Read API for the supervisor dashboard: paginated, projected list endpoints and
+# a server-sent-events stream of pending-request changes.
+import asyncio
+import datetime
+import functools
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from transcripts import TRANSCRIPTS_COLLECTION, decode_transcript
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+SSE_HEARTBEAT_SECONDS = 15
+
+# List views never carry embeddings or full conversation histories.
+HELP_REQUEST_LIST_FIELDS = [
+    'originalQuery', 'status', 'createdAt', 'resolvedAt', 'supervisorResponse',
+    'livekitRoomId', 'callerCount',
+]
+KNOWLEDGE_BASE_LIST_FIELDS = ['question', 'answer', 'createdAt', 'sourceRequestId', 'hitCount']
+HISTORY_STATUSES = ['resolved', 'unresolved']
+
+
+def to_json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: to_json_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_json_value(v) for v in value]
+    return value
+
+
+def project(doc, fields):
+    data = doc.to_dict() or {}
+    item = {'id': doc.id}
+    for field in fields:
+        if data.get(field) is not None:
+            item[field] = to_json_value(data[field])
+    return item
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header (a list of ETags, or `*`) against `etag`."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix('W/')
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == opaque:
+            return True
+    return False
+
+
+def etag_response(request: Request, body):
+    """JSON response with a content ETag; answers 304 when If-None-Match matches."""
+    payload = json.dumps(body, separators=(',', ':'), sort_keys=True).encode()
+    etag = f'W/"{hashlib.sha1(payload).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type='application/json', headers=headers)
+
+
+def fetch_page(collection, query, fields, limit, cursor):
+    """One page of `query` (newest first) plus the cursor for the next page.
+
+    The cursor is the id of the last doc returned; resuming re-reads that one doc
+    so the page boundary is exact even when createdAt values tie.
+
+    A `where` filter plus this ordering needs a composite index. The help request
+    lists use `help_requests` (status ascending, createdAt descending); Firestore
+    rejects the query until it exists, with a link that creates it.
+    """
+    from firebase_admin import firestore
+
+    query = query.order_by('createdAt', direction=firestore.Query.DESCENDING)
+    if cursor:
+        cursor_doc = collection.document(cursor).get()
+        if not cursor_doc.exists:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.start_after(cursor_doc)
+    docs = list(query.select(fields).limit(limit + 1).stream())
+    items = [project(doc, fields) for doc in docs[:limit]]
+    next_cursor = docs[limit - 1].id if len(docs) > limit else None
+    return {'items': items, 'nextCursor': next_cursor}
+
+
+class PendingRequestsBroadcaster:
+    """Fans one Firestore listener on pending help requests out to SSE clients.
+
+    The listener is opened when the first client subscribes and closed when the
+    last one leaves, so an idle backend holds no watch stream. Each listener gets
+    a new generation, so changes a closed listener had already queued on the loop
+    are dropped rather than mixed into the next one's snapshot.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._subscribers = set()
+        self._watch = None
+        self._loop = None
+        self._loaded = False
+        self._pending = {}
+        self._generation = 0
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        if self._watch is None:
+            # The listener's initial snapshot is sent to every subscriber.
+            self._loop = asyncio.get_running_loop()
+            self._generation += 1
+            query = self.db.collection('help_requests').where('status', '==', 'pending')
+            self._watch = query.on_snapshot(functools.partial(self._on_snapshot, self._generation))
+        elif self._loaded:
+            queue.put_nowait(('snapshot', self._snapshot()))
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+            self._loaded = False
+            self._pending = {}
+
+    def _snapshot(self):
+        items = sorted(
+            self._pending.values(), key=lambda item: item.get('createdAt', ''), reverse=True
+        )
+        return {'items': items}
+
+    def _on_snapshot(self, generation, col_snapshot, changes, read_time):
+        # Runs on the Firestore listener thread.
+        self._loop.call_soon_threadsafe(self._publish, generation, changes)
+
+    def _publish(self, generation, changes):
+        if self._watch is None or generation != self._generation:
+            return
+        events = []
+        for change in changes:
+            item = project(change.document, HELP_REQUEST_LIST_FIELDS)
+            if change.type.name == 'REMOVED':
+                self._pending.pop(item['id'], None)
+                events.append(('removed', {'id': item['id']}))
+            else:
+                self._pending[item['id']] = item
+                events.append((change.type.name.lower(), item))
+
+        if not self._loaded:
+            self._loaded = True
+            events = [('snapshot', self._snapshot())]
+        for queue in self._subscribers:
+            for event in events:
+                queue.put_nowait(event)
+
+
+def create_dashboard_router(db):
+    # Collections are looked up per request so building the router doesn't
+    # create the Firestore client.
+    router = APIRouter()
+    broadcaster = PendingRequestsBroadcaster(db)
+
+    @router.get("/api/help-requests")
+    async def list_help_requests(
+        request: Request,
+        status: str = Query('pending', pattern='^(pending|history)$'),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+    ):
+        help_requests = db.collection('help_requests')
+        if status == 'pending':
+            query = help_requests.where('status', '==', 'pending')
+        else:
+            query = help_requests.where('status', 'in', HISTORY_STATUSES)
+        page = await run_in_threadpool(
+            fetch_page, help_requests, query, HELP_REQUEST_LIST_FIELDS, limit, cursor
+        )
+        return etag_response(request, page)
+
+    @router.get("/api/help-requests/pending/stream")
+    async def stream_pending_requests(request: Request):
+        queue = broadcaster.subscribe()
+
+        async def events():
+            try:
+                while not await request.is_disconnected():
+                    try:
+                        kind, data = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+            finally:
+                broadcaster.unsubscribe(queue)
+
+        return StreamingResponse(
+            events(),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @router.get("/api/help-requests/{request_id}")
+    async def get_help_request(request: Request, request_id: str):
+        request_ref = db.collection('help_requests').document(request_id)
+        transcript_ref = db.collection(TRANSCRIPTS_COLLECTION).document(request_id)
+        # get_all returns snapshots in no particular order.
+        snapshots = await run_in_threadpool(
+            lambda: {snap.reference.path: snap for snap in db.get_all([request_ref, transcript_ref])}
+        )
+        doc, transcript = snapshots[request_ref.path], snapshots[transcript_ref.path]
+        if not doc.exists:
+            return JSONResponse({"error": "Request not found"}, status_code=404)
+        item = project(doc, HELP_REQUEST_LIST_FIELDS)
+        if transcript.exists:
+            transcript_data = transcript.to_dict()
+            item['conversationHistory'] = decode_transcript(transcript_data)
+            item['droppedMessages'] = transcript_data.get('droppedMessages', 0)
+        else:
+            # Requests created before transcripts moved out keep them inline.
+            item['conversationHistory'] = (doc.to_dict() or {}).get('conversationHistory') or []
+        return etag_response(request, item)
+
+    @router.get("/api/knowledge-base")
+    async def list_knowledge_base(
+        request: Request,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+    ):
+        knowledge_base = db.collection('knowledge_base')
+        page = await run_in_threadpool(
+            fetch_page, knowledge_base, knowledge_base, KNOWLEDGE_BASE_LIST_FIELDS, limit, cursor
+        )
+        return etag_response(request, page)
+
+    return router
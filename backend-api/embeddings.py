@@ -0,0 +1,59 @@
+from frontdesk_shared.clients import registry
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+def extract_embedding(result):
+    if result is None:
+        return None
+
+    embedding = None
+    if isinstance(result, dict):
+        embedding = result.get("embedding")
+    elif isinstance(result, list):
+        embedding = result
+    else:
+        return None
+
+    if isinstance(embedding, dict):
+        values = embedding.get("values")
+        if isinstance(values, list):
+            return values
+    elif isinstance(embedding, list):
+        if embedding and isinstance(embedding[0], dict):
+            values = embedding[0].get("values")
+            if isinstance(values, list):
+                return values
+        elif all(isinstance(item, (int, float)) for item in embedding):
+            return embedding
+
+    return None
+
+
+def extract_embeddings(result):
+    """Like extract_embedding, but for a batched embed_content call (one vector per input)."""
+    if not isinstance(result, dict):
+        return None
+
+    embeddings = result.get("embedding")
+    if not isinstance(embeddings, list):
+        return None
+
+    vectors = []
+    for embedding in embeddings:
+        vector = extract_embedding([embedding] if isinstance(embedding, dict) else embedding)
+        if vector is None:
+            return None
+        vectors.append(vector)
+    return vectors
+
+
+def embed_texts(texts):
+    """Embed several texts with a single embed_content request."""
+    if not texts:
+        return []
+    result = registry.genai().embed_content(model=EMBEDDING_MODEL, content=list(texts))
+    vectors = extract_embeddings(result)
+    if vectors is None or len(vectors) != len(texts):
+        raise ValueError("Unexpected embed_content response for a batch of %d texts" % len(texts))
+    return vectors
@@ -0,0 +1,144 @@
+# kb_dedup.py
+# Near-duplicate detection for knowledge_base questions, used at ingestion time
+# (QuestionIndex) and by the offline compaction job (find_clusters).
+import threading
+
+import numpy as np
+
+from frontdesk_shared.embedding_codec import doc_embedding
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+class QuestionIndex:
+    """In-memory cosine index over question embeddings (knowledge_base entries, or
+    pending help requests).
+
+    Kept current by an `on_snapshot` listener. Vectors live in one preallocated
+    float32 matrix that doubles when full, with a doc id -> row map; a removal
+    swaps the last row into the hole, so no write rebuilds the matrix. Safe to
+    use from several threads; `nearest` is a full matrix-vector product, so
+    callers on the event loop run it in the threadpool.
+    """
+
+    def __init__(self, initial_capacity=256):
+        self._initial_capacity = initial_capacity
+        self._matrix = None
+        self._size = 0
+        self._ids = []
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+
+    def __len__(self):
+        return self._size
+
+    def watch(self, query):
+        if self._watch is None:
+            self._watch = query.on_snapshot(self._on_snapshot)
+
+    def wait_until_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        try:
+            for change in changes:
+                data = change.document.to_dict() or {}
+                # Soft-deleted entries (deletedAt) are never merged into.
+                if change.type.name == 'REMOVED' or data.get('deletedAt'):
+                    self.remove(change.document.id)
+                else:
+                    self.upsert(change.document.id, doc_embedding(data, 'question_embedding'))
+        except Exception as e:
+            print(f"Failed to apply question embedding changes to the index: {e}")
+        finally:
+            self._ready.set()
+
+    def upsert(self, doc_id, embedding):
+        vector = _normalize(embedding) if embedding is not None and len(embedding) else None
+        if vector is None:
+            self.remove(doc_id)
+            return
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((self._initial_capacity, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                print(
+                    f"Skipping {doc_id} in the question index: embedding dimension "
+                    f"{vector.shape[0]} != {self._matrix.shape[1]}"
+                )
+                return
+
+            row = self._rows.get(doc_id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    grown = np.empty((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.float32)
+                    grown[:self._size] = self._matrix[:self._size]
+                    self._matrix = grown
+                row = self._size
+                self._size += 1
+                self._rows[doc_id] = row
+                self._ids.append(doc_id)
+            self._matrix[row] = vector
+
+    def remove(self, doc_id):
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids.pop()
+            self._size = last
+
+    def nearest(self, embedding):
+        """Return (doc_id, cosine similarity) of the closest question, or None."""
+        query = _normalize(embedding)
+        if query is None:
+            return None
+        with self._lock:
+            if self._size == 0 or self._matrix.shape[1] != query.shape[0]:
+                return None
+            scores = self._matrix[:self._size] @ query
+            best = int(np.argmax(scores))
+            return self._ids[best], float(scores[best])
+
+
+def find_clusters(doc_ids, vectors, threshold, chunk=2048):
+    """Group docs whose question embeddings are within `threshold` cosine similarity.
+
+    Greedy single pass in the given order: the first unassigned doc seeds a
+    cluster and claims every unassigned doc similar to it. Returns lists of
+    indices with more than one member, seed first.
+    """
+    if not doc_ids:
+        return []
+    matrix = np.stack([_normalize(v) for v in vectors])
+    assigned = np.zeros(len(doc_ids), dtype=bool)
+    clusters = []
+    for start in range(0, len(doc_ids), chunk):
+        scores = matrix[start:start + chunk] @ matrix.T
+        for offset, row in enumerate(scores):
+            seed = start + offset
+            if assigned[seed]:
+                continue
+            members = np.flatnonzero((row >= threshold) & ~assigned)
+            assigned[members] = True
+            assigned[seed] = True
+            if len(members) > 1:
+                clusters.append([seed] + [int(m) for m in members if m != seed])
+    return clusters
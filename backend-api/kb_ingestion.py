@@ -0,0 +1,264 @@
+# kb_ingestion.py
+# Background queue that turns resolved help requests into knowledge_base entries.
+import asyncio
+import datetime
+import random
+
+from fastapi.concurrency import run_in_threadpool
+
+from frontdesk_shared.embedding_codec import FLOAT, doc_encoding, encode_fields
+from embeddings import embed_texts
+from kb_dedup import QuestionIndex
+
+# embed_content accepts at most 100 texts per request.
+EMBED_BATCH_SIZE = 100
+
+
+def combined_text(question, answer):
+    return f"Question: {question}\nAnswer: {answer}"
+
+
+class KnowledgeBaseIngestionQueue:
+    """Embeds resolved Q&A pairs and writes them to knowledge_base off the request path.
+
+    Both texts of a pair (the question and the combined Q&A) are embedded in a
+    single batched request, or, with a `batcher` (embedding_batcher), in batches
+    shared with the other jobs in flight. The KB doc and the help request's
+    `kbStatus` are written in one Firestore batch, so a request is only marked
+    `ingested` once its KB entry exists. If embedding keeps failing, the entry is still written
+    without embeddings (`kbStatus: 'embedding_failed'`) for backfill_embeddings.py
+    to pick up later. Embeddings are stored in `encoding` (see embedding_codec).
+
+    With a `dedup_index` (kb_dedup.QuestionIndex), a question whose embedding is
+    at least `dedup_threshold` similar to an existing entry's is merged into
+    that entry instead: the new answer replaces the old one (kept in
+    `previousAnswers`), `hitCount` goes up and the request joins `sourceRequestIds`.
+    """
+
+    def __init__(
+        self, db, workers=2, max_attempts=5, base_delay=1.0, encoding=FLOAT,
+        dedup_index=None, dedup_threshold=0.92, batcher=None,
+    ):
+        self.db = db
+        self.batcher = batcher
+        self.encoding = encoding
+        self.dedup_index = dedup_index
+        self.dedup_threshold = dedup_threshold
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=10.0):
+        """Give queued jobs up to `timeout` seconds to finish, then cancel the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Stopping KB ingestion with {self._queue.qsize()} jobs still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, request_id, question, answer):
+        self._queue.put_nowait((request_id, question, answer))
+
+    async def recover(self):
+        """Re-queue resolved requests whose ingestion never finished (e.g. after a restart)."""
+        docs = await run_in_threadpool(
+            lambda: list(
+                self.db.collection('help_requests').where('kbStatus', '==', 'pending').stream()
+            )
+        )
+        for doc in docs:
+            data = doc.to_dict()
+            if data.get('originalQuery') and data.get('supervisorResponse'):
+                self.submit(doc.id, data['originalQuery'], data['supervisorResponse'])
+        if docs:
+            print(f"Re-queued {len(docs)} help requests for KB ingestion")
+
+    async def _run(self):
+        while True:
+            request_id, question, answer = await self._queue.get()
+            try:
+                await self._ingest(request_id, question, answer)
+            except Exception as e:
+                print(f"KB ingestion failed for request {request_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _embed(self, request_id, question, answer):
+        texts = [question, combined_text(question, answer)]
+        for attempt in range(self.max_attempts):
+            try:
+                if self.batcher is None:
+                    return await run_in_threadpool(embed_texts, texts)
+                # Shares batched embedding calls with every other job in the process.
+                futures = [self.batcher.submit(text) for text in texts]
+                return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    print(f"Embedding generation failed for request {request_id}: {e}")
+                    return None
+                await asyncio.sleep(self.base_delay * (2 ** attempt) * (1 + random.random()))
+
+    async def embed_pairs(self, pairs):
+        """Embed many (question, answer) pairs at once, without retries.
+
+        Returns a (question, content) vector pair per input, or None where
+        embedding failed.
+        """
+        texts = []
+        for question, answer in pairs:
+            texts += [question, combined_text(question, answer)]
+        if self.batcher is not None:
+            results = await asyncio.gather(
+                *(asyncio.wrap_future(self.batcher.submit(text)) for text in texts),
+                return_exceptions=True,
+            )
+        else:
+            results = []
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                chunk = texts[start:start + EMBED_BATCH_SIZE]
+                try:
+                    results.extend(await run_in_threadpool(embed_texts, chunk))
+                except Exception as e:
+                    results.extend([e] * len(chunk))
+        vectors = []
+        for i in range(len(pairs)):
+            pair = results[2 * i], results[2 * i + 1]
+            vectors.append(None if any(isinstance(v, Exception) for v in pair) else pair)
+        return vectors
+
+    def find_duplicate(self, question_embedding):
+        """(doc id, similarity) of the existing entry this question should merge into, or None.
+
+        Scores every KB question; call it from the threadpool, not the event loop.
+        """
+        if self.dedup_index is None or question_embedding is None:
+            return None
+        nearest = self.dedup_index.nearest(question_embedding)
+        if nearest is None or nearest[1] < self.dedup_threshold:
+            return None
+        return nearest
+
+    def find_duplicates(self, question_embeddings):
+        """find_duplicate for a batch of new questions, in order.
+
+        A question that would become a new entry counts as existing for the ones
+        after it, so repeats within the batch merge too. Returns, per embedding,
+        None, `('kb', doc id)` or `('batch', index of the earlier embedding)`.
+        Call it from the threadpool, not the event loop.
+        """
+        if self.dedup_index is None:
+            return [None] * len(question_embeddings)
+        created = QuestionIndex()
+        duplicates = []
+        for i, embedding in enumerate(question_embeddings):
+            best = None
+            candidates = (
+                ('kb', self.find_duplicate(embedding)),
+                ('batch', created.nearest(embedding)),
+            )
+            for kind, nearest in candidates:
+                if nearest is not None and nearest[1] >= self.dedup_threshold:
+                    if best is None or nearest[1] > best[1]:
+                        best = (kind, nearest[0]), nearest[1]
+            if best is None:
+                created.upsert(i, embedding)
+            duplicates.append(best[0] if best is not None else None)
+        return duplicates
+
+    def add_kb_write(self, batch, request_id, question, answer, vectors, existing, now):
+        """Add the knowledge_base write for one Q&A pair to `batch`; returns (kb_ref, kbStatus).
+
+        `existing` is the (doc ref, data) of the entry to merge into, or None for a
+        new entry.
+        """
+        from firebase_admin import firestore
+
+        question_embedding, content_embedding = vectors if vectors else (None, None)
+        if existing is not None:
+            kb_ref, data = existing
+            merge = {
+                'hitCount': firestore.Increment(1),
+                'sourceRequestIds': firestore.ArrayUnion([request_id]),
+                'updatedAt': now,
+            }
+            if data.get('answer') != answer:
+                # The latest supervisor answer wins; earlier ones are kept for review.
+                merge['answer'] = answer
+                merge['previousAnswers'] = firestore.ArrayUnion([{
+                    'answer': data.get('answer'),
+                    'sourceRequestId': data.get('sourceRequestId'),
+                    'replacedAt': now,
+                }])
+                merge['sourceRequestId'] = request_id
+                merge.update(encode_fields(
+                    {'content_embedding': content_embedding}, doc_encoding(data)
+                ))
+            batch.update(kb_ref, merge)
+            return kb_ref, 'merged'
+
+        # Allocate the KB doc id once so a retried commit rewrites the same doc.
+        kb_ref = self.db.collection('knowledge_base').document()
+        batch.set(kb_ref, {
+            'question': question,
+            'answer': answer,
+            **encode_fields({
+                'question_embedding': question_embedding,
+                'content_embedding': content_embedding,
+            }, self.encoding if vectors else FLOAT),
+            'sourceRequestId': request_id,
+            'sourceRequestIds': [request_id],
+            'hitCount': 1,
+            'createdAt': now
+        })
+        return kb_ref, 'ingested' if vectors else 'embedding_failed'
+
+    async def _ingest(self, request_id, question, answer):
+        vectors = await self._embed(request_id, question, answer)
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        existing = None
+        duplicate = await run_in_threadpool(self.find_duplicate, vectors[0] if vectors else None)
+        if duplicate is not None:
+            kb_ref = self.db.collection('knowledge_base').document(duplicate[0])
+            kb_doc = await run_in_threadpool(kb_ref.get)
+            if kb_doc.exists:
+                existing = (kb_ref, kb_doc.to_dict() or {})
+
+        request_ref = self.db.collection('help_requests').document(request_id)
+        batch = self.db.batch()
+        kb_ref, kb_status = self.add_kb_write(
+            batch, request_id, question, answer, vectors, existing, now
+        )
+        batch.update(request_ref, {
+            'kbStatus': kb_status,
+            'knowledgeBaseId': kb_ref.id,
+        })
+
+        for attempt in range(self.max_attempts):
+            try:
+                await run_in_threadpool(batch.commit)
+                break
+            except Exception:
+                if attempt == self.max_attempts - 1:
+                    raise
+                await asyncio.sleep(self.base_delay * (2 ** attempt) * (1 + random.random()))
+
+        if existing is not None:
+            print(
+                f"Merged request {request_id} into knowledge base entry {kb_ref.id} "
+                f"(similarity {duplicate[1]:.3f})"
+            )
+        else:
+            if self.dedup_index is not None and vectors:
+                # Don't wait for the listener: a repeat right behind this one should merge.
+                self.dedup_index.upsert(kb_ref.id, vectors[0])
+            print(f"Added new fact with embedding to knowledge base for request {request_id}")
@@ -1,53 +1,88 @@
 # main.py (Updated with Embedding Logic)
+import asyncio
 import os
 import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from bulk_resolve import MAX_BULK_ITEMS, resolve_many
+from dashboard_api import create_dashboard_router
+from frontdesk_shared.clients import registry
+from frontdesk_shared.embedding_batcher import EmbeddingBatcher
+from frontdesk_shared.embedding_codec import F16, FLOAT, encode_fields
+from embeddings import embed_texts
+from kb_dedup import QuestionIndex
+from kb_ingestion import KnowledgeBaseIngestionQueue
+from transcripts import TRANSCRIPTS_COLLECTION, encode_transcript
+
 load_dotenv() #.env file se GOOGLE_API_KEY lene ke liye
+registry.record_import("main")
 
 # --- Initializations ---
-genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-EMBEDDING_MODEL = "models/text-embedding-004"
-
-if not firebase_admin._apps:
-    cred = credentials.Certificate("service-account.json")
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Firebase and genai are set up on first use (or by warmup at startup), so
+# importing this module needs neither credentials nor the SDK import cost.
+db = registry.lazy("firestore")
 app = FastAPI()
+# Opt in to compact embedding storage with KB_EMBEDDING_ENCODING=f16-v1 or i8-v1.
+KB_EMBEDDING_ENCODING = os.environ.get("KB_EMBEDDING_ENCODING", FLOAT)
+# Resolved questions at least this similar to an existing KB entry are merged
+# into it instead of creating a new one; 0 disables deduplication.
+KB_DEDUP_THRESHOLD = float(os.environ.get("KB_DEDUP_THRESHOLD", "0.92"))
+dedup_index = QuestionIndex() if KB_DEDUP_THRESHOLD > 0 else None
+# Embedding requests from concurrent ingestion jobs are coalesced into batched
+# calls: up to EMBEDDING_BATCH_SIZE texts gathered for EMBEDDING_BATCH_WAIT_MS.
+embedding_batcher = EmbeddingBatcher(
+    embed_texts,
+    max_batch=int(os.environ.get("EMBEDDING_BATCH_SIZE", "32")),
+    max_wait_ms=float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", "10")),
+    max_concurrency=int(os.environ.get("EMBEDDING_CONCURRENCY", "2")),
+    requests_per_minute=float(os.environ.get("EMBEDDING_RPM", "0")),
+)
+# Escalations at least this similar to a pending request's question join that
+# request (one supervisor task, one answer for every caller); 0 disables this.
+ESCALATION_COALESCE_THRESHOLD = float(os.environ.get("ESCALATION_COALESCE_THRESHOLD", "0.9"))
+# How long a new escalation waits for its embedding when there is a pending
+# request it could join; a slower embedding is stored on the doc afterwards.
+ESCALATION_EMBED_TIMEOUT = float(os.environ.get("ESCALATION_EMBED_TIMEOUT", "0.5"))
+pending_index = QuestionIndex() if ESCALATION_COALESCE_THRESHOLD > 0 else None
+ingestion_queue = KnowledgeBaseIngestionQueue(
+    db,
+    workers=int(os.environ.get("KB_INGESTION_WORKERS", "2")),
+    encoding=KB_EMBEDDING_ENCODING,
+    dedup_index=dedup_index,
+    dedup_threshold=KB_DEDUP_THRESHOLD,
+    batcher=embedding_batcher,
+)
 
 
-def extract_embedding(result):
-    if result is None:
-        return None
+@app.on_event("startup")
+async def start_ingestion_queue():
+    report = await run_in_threadpool(registry.warmup)
+    print(f"Startup: {report}")
+    if dedup_index is not None:
+        dedup_index.watch(db.collection('knowledge_base'))
+    if pending_index is not None:
+        pending_index.watch(db.collection('help_requests').where('status', '==', 'pending'))
+    ingestion_queue.start()
+    try:
+        await ingestion_queue.recover()
+    except Exception as e:
+        print(f"Could not re-queue pending KB ingestion: {e}")
 
-    embedding = None
-    if isinstance(result, dict):
-        embedding = result.get("embedding")
-    elif isinstance(result, list):
-        embedding = result
-    else:
-        return None
 
-    if isinstance(embedding, dict):
-        values = embedding.get("values")
-        if isinstance(values, list):
-            return values
-    elif isinstance(embedding, list):
-        if embedding and isinstance(embedding[0], dict):
-            values = embedding[0].get("values")
-            if isinstance(values, list):
-                return values
-        elif all(isinstance(item, (int, float)) for item in embedding):
-            return embedding
+@app.on_event("shutdown")
+async def stop_ingestion_queue():
+    await ingestion_queue.stop()
+    await run_in_threadpool(embedding_batcher.close)
+    if dedup_index is not None:
+        dedup_index.close()
+    if pending_index is not None:
+        pending_index.close()
 
-    return None
 
 # --- CORS Middleware ---
 app.add_middleware(
@@ -58,6 +93,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Paginated list endpoints and the pending-requests stream used by the dashboard.
+app.include_router(create_dashboard_router(db))
+
 # --- Pydantic Models ---
 class ChatMessage(BaseModel):
     role: str
@@ -68,25 +106,158 @@ class HelpRequestPayload(BaseModel):
     conversationHistory: List[ChatMessage]
     livekitRoomId: str
     livekitParticipantId: Optional[str] = None
+    agentWorkerId: Optional[str] = None
 
 class ResolvePayload(BaseModel):
     answer: str
 
+class TimeoutPayload(BaseModel):
+    agentWorkerId: Optional[str] = None
+
+class BulkResolveItem(BaseModel):
+    requestId: str
+    answer: str
+
+class BulkResolvePayload(BaseModel):
+    items: List[BulkResolveItem] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+# Escalation embeddings still running after their request was created.
+_background_embeddings = set()
+
+
+def start_escalation_embedding(text):
+    """Start embedding `text` for coalescing; an asyncio future, or None if coalescing is off."""
+    if pending_index is None:
+        return None
+    return asyncio.wrap_future(embedding_batcher.submit(text))
+
+
+async def wait_for_escalation_embedding(embedding):
+    """The embedding if it arrives within ESCALATION_EMBED_TIMEOUT, else None (it keeps running)."""
+    try:
+        return await asyncio.wait_for(asyncio.shield(embedding), ESCALATION_EMBED_TIMEOUT)
+    except Exception as e:
+        print(f"Could not embed escalation for coalescing in time: {e!r}")
+        return None
+
+
+async def store_escalation_embedding(request_id, embedding):
+    """Write a late embedding to its request; the pending-request listener indexes it."""
+    try:
+        question_embedding = await embedding
+        await run_in_threadpool(
+            db.collection('help_requests').document(request_id).update,
+            encode_fields({'question_embedding': question_embedding}, F16),
+        )
+    except Exception as e:
+        print(f"Could not store the embedding of help request {request_id}: {e}")
+
+
+def _join_pending_request(transaction, ref, update):
+    snapshot = ref.get(transaction=transaction)
+    # Timed-out requests are closed: a new caller gets a fresh request instead.
+    # A request resolved in the meantime can still be joined; the worker's
+    # listener sees the doc arrive resolved and delivers the answer.
+    if not snapshot.exists or snapshot.get('status') == 'unresolved':
+        return False
+    transaction.update(ref, update)
+    return True
+
+
+async def attach_to_pending_request(payload: HelpRequestPayload, question_embedding):
+    """Join a pending request asking the same question; returns its id, or None."""
+    match = await run_in_threadpool(pending_index.nearest, question_embedding)
+    if match is None or match[1] < ESCALATION_COALESCE_THRESHOLD:
+        return None
+    from firebase_admin import firestore
+
+    request_id = match[0]
+    update = {
+        'callerCount': firestore.Increment(1),
+        'callers': firestore.ArrayUnion([{
+            'query': payload.originalQuery,
+            'livekitRoomId': payload.livekitRoomId,
+            'livekitParticipantId': payload.livekitParticipantId,
+            'joinedAt': datetime.datetime.now(datetime.timezone.utc),
+        }]),
+    }
+    if payload.agentWorkerId:
+        update['watcherIds'] = firestore.ArrayUnion([payload.agentWorkerId])
+    try:
+        joined = await run_in_threadpool(
+            firestore.transactional(_join_pending_request),
+            db.transaction(),
+            db.collection('help_requests').document(request_id),
+            update,
+        )
+    except Exception as e:
+        print(f"Could not attach escalation to help request {request_id}: {e}")
+        return None
+    if not joined:
+        pending_index.remove(request_id)
+        return None
+    print(f"Attached escalation to pending help request {request_id} (similarity {match[1]:.3f})")
+    return request_id
+
+
+def _leave_pending_request(transaction, ref, now):
+    snapshot = ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict() or {}
+    if data.get('status') != 'pending':
+        return data.get('status')
+    waiting = max((data.get('callerCount') or 1) - 1, 0)
+    update = {'callerCount': waiting}
+    if waiting == 0:
+        update.update({'status': 'unresolved', 'resolvedAt': now})
+    transaction.update(ref, update)
+    return update.get('status', 'pending')
+
+
 # --- API Endpoints ---
 @app.post("/api/help-requests")
 async def create_help_request(payload: HelpRequestPayload):
     try:
-        # Create a new help request document in Firestore
+        embedding = start_escalation_embedding(payload.originalQuery)
+        question_embedding = None
+        # Only worth waiting for when there is a pending request to join.
+        if embedding is not None and len(pending_index):
+            question_embedding = await wait_for_escalation_embedding(embedding)
+            if question_embedding is not None:
+                request_id = await attach_to_pending_request(payload, question_embedding)
+                if request_id is not None:
+                    return {"requestId": request_id, "coalesced": True}
+
+        # Create a new help request document in Firestore. The transcript goes to
+        # its own doc so listeners on help_requests never re-download it.
         doc_ref = db.collection('help_requests').document()
-        doc_ref.set({
+        transcript = encode_transcript([m.dict() for m in payload.conversationHistory])
+        batch = db.batch()
+        batch.set(doc_ref, {
             'originalQuery': payload.originalQuery,
-            'conversationHistory': [m.dict() for m in payload.conversationHistory],
+            'transcriptMessageCount': transcript['messageCount'],
             'livekitRoomId': payload.livekitRoomId,
             'livekitParticipantId': payload.livekitParticipantId,
             'status': 'pending',
+            # Agent workers listen for their escalations with one array_contains query.
+            'watcherIds': [payload.agentWorkerId] if payload.agentWorkerId else [],
+            'callerCount': 1,
+            # Compact, so listeners on help_requests pay ~1.5 KB for it.
+            **(encode_fields({'question_embedding': question_embedding}, F16)
+               if question_embedding is not None else {}),
             'createdAt': datetime.datetime.now(datetime.timezone.utc)
         })
+        batch.set(db.collection(TRANSCRIPTS_COLLECTION).document(doc_ref.id), transcript)
+        await run_in_threadpool(batch.commit)
         request_id = doc_ref.id
+        if question_embedding is not None:
+            # Don't wait for the listener: a burst of the same question should coalesce.
+            pending_index.upsert(request_id, question_embedding)
+        elif embedding is not None:
+            task = asyncio.create_task(store_escalation_embedding(request_id, embedding))
+            _background_embeddings.add(task)
+            task.add_done_callback(_background_embeddings.discard)
         print(f"Created help request {request_id}")
         return {"requestId": request_id}
     except Exception as e:
@@ -97,50 +268,68 @@ async def create_help_request(payload: HelpRequestPayload):
 async def resolve_help_request(request_id: str, payload: ResolvePayload):
     try:
         doc_ref = db.collection('help_requests').document(request_id)
-        request_doc = doc_ref.get()
+        request_doc = await run_in_threadpool(doc_ref.get)
         if not request_doc.exists:
             return {"error": "Request not found"}, 404
 
         original_query = request_doc.to_dict().get('originalQuery')
+        ingest = bool(original_query and payload.answer)
 
-        doc_ref.update({
+        update = {
             'status': 'resolved',
             'supervisorResponse': payload.answer,
             'resolvedAt': datetime.datetime.now(datetime.timezone.utc)
-        })
+        }
+        if ingest:
+            update['kbStatus'] = 'pending'
+        await run_in_threadpool(doc_ref.update, update)
 
-        if original_query and payload.answer:
-            try:
-                question_embedding_result = genai.embed_content(
-                    model=EMBEDDING_MODEL,
-                    content=original_query,
-                )
-                question_embedding = extract_embedding(question_embedding_result)
-
-                combined_text = f"Question: {original_query}\nAnswer: {payload.answer}"
-                content_embedding_result = genai.embed_content(
-                    model=EMBEDDING_MODEL,
-                    content=combined_text,
-                )
-                content_embedding = extract_embedding(content_embedding_result)
-            except Exception as embed_error:
-                print(f"Embedding generation failed for request {request_id}: {embed_error}")
-                question_embedding = None
-                content_embedding = None
-
-            # Knowledge Base me embedding ke saath save karo
-            kb_ref = db.collection('knowledge_base').document()
-            kb_ref.set({
-                'question': original_query,
-                'answer': payload.answer,
-                'question_embedding': question_embedding,
-                'content_embedding': content_embedding,
-                'sourceRequestId': request_id,
-                'createdAt': datetime.datetime.now(datetime.timezone.utc)
-            })
-            print(f"Added new fact with embedding to knowledge base for request {request_id}")
+        # Embedding and the knowledge_base write happen in the background.
+        if ingest:
+            ingestion_queue.submit(request_id, original_query, payload.answer)
 
         return {"message": f"Request {request_id} resolved successfully"}
     except Exception as e:
         print(f"An Error Occurred while resolving {request_id}: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+@app.post("/api/help-requests/{request_id}/timeout")
+async def time_out_help_request(request_id: str, payload: TimeoutPayload):
+    """A caller stopped waiting for an answer.
+
+    The request stays pending while other callers still wait on it, and is
+    marked unresolved when the last one gives up.
+    """
+    from firebase_admin import firestore
+
+    try:
+        status = await run_in_threadpool(
+            firestore.transactional(_leave_pending_request),
+            db.transaction(),
+            db.collection('help_requests').document(request_id),
+            datetime.datetime.now(datetime.timezone.utc),
+        )
+        if status is None:
+            return {"error": "Request not found"}, 404
+        if status == 'unresolved':
+            if pending_index is not None:
+                pending_index.remove(request_id)
+            print(f"Help request {request_id} timed out with no caller left; marked unresolved")
+        elif status == 'pending':
+            print(
+                f"A caller on worker {payload.agentWorkerId} stopped waiting for help request "
+                f"{request_id}; other callers still are"
+            )
+        return {"requestId": request_id, "status": status}
+    except Exception as e:
+        print(f"An Error Occurred while timing out {request_id}: {e}")
+        return {"error": str(e)}
+
+@app.post("/api/help-requests/bulk-resolve")
+async def bulk_resolve_help_requests(payload: BulkResolvePayload):
+    results = await resolve_many(
+        db, ingestion_queue, [(item.requestId, item.answer) for item in payload.items]
+    )
+    resolved = sum(1 for result in results if result['status'] == 'resolved')
+    print(f"Bulk resolved {resolved} of {len(results)} help requests")
+    return {"resolved": resolved, "results": results}
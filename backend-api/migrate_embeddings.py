@@ -0,0 +1,107 @@
+# migrate_embeddings.py
+# Rewrites knowledge_base embeddings into another storage encoding.
+#
+#   python migrate_embeddings.py --to f16-v1          # or i8-v1, or float to undo
+#   python migrate_embeddings.py --to i8-v1 --dry-run # only report the size change
+#
+# Docs already in the target encoding are skipped, so the command can be re-run.
+import argparse
+import os
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+from frontdesk_shared.embedding_codec import (
+    EMBEDDING_FIELDS, ENCODING_FIELD, ENCODINGS, FLOAT, doc_embedding, doc_encoding,
+    encode_fields,
+)
+
+FIRESTORE_MAX_BATCH_WRITES = 500
+# Firestore stores each double in an array as 8 bytes; blobs are stored as-is.
+FIRESTORE_DOUBLE_BYTES = 8
+
+
+def stored_size(value):
+    if isinstance(value, list):
+        return len(value) * FIRESTORE_DOUBLE_BYTES
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 0
+
+
+def migrate(db, target, page_size, dry_run):
+    collection = db.collection('knowledge_base')
+    scanned = migrated = bytes_before = bytes_after = 0
+    last_doc = None
+
+    while True:
+        query = collection.order_by('__name__').limit(page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+        scanned += len(docs)
+
+        batch = db.batch()
+        pending_writes = 0
+        for doc in docs:
+            data = doc.to_dict() or {}
+            if doc_encoding(data) == target:
+                continue
+
+            embeddings = {
+                field: doc_embedding(data, field)
+                for field in EMBEDDING_FIELDS
+                if data.get(field) is not None
+            }
+            if not embeddings:
+                continue
+
+            fields = encode_fields(embeddings, target)
+            if target == FLOAT:
+                fields[ENCODING_FIELD] = firestore.DELETE_FIELD
+
+            bytes_before += sum(stored_size(data.get(f)) for f in embeddings)
+            bytes_after += sum(stored_size(fields[f]) for f in embeddings)
+            migrated += 1
+
+            if not dry_run:
+                batch.update(doc.reference, fields)
+                pending_writes += 1
+                if pending_writes == FIRESTORE_MAX_BATCH_WRITES:
+                    batch.commit()
+                    batch = db.batch()
+                    pending_writes = 0
+
+        if pending_writes:
+            batch.commit()
+        print(f"Scanned {scanned} docs, migrated {migrated}")
+
+    ratio = bytes_before / bytes_after if bytes_after else 0.0
+    print(
+        f"{'Would migrate' if dry_run else 'Migrated'} {migrated} of {scanned} docs to {target}: "
+        f"embedding payload {bytes_before / 1024:.1f} KiB -> {bytes_after / 1024:.1f} KiB "
+        f"({ratio:.1f}x smaller)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode knowledge_base embeddings.")
+    parser.add_argument('--to', dest='target', choices=ENCODINGS, required=True)
+    parser.add_argument('--page-size', type=int, default=300)
+    parser.add_argument('--dry-run', action='store_true', help="report sizes without writing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
+
+    migrate(firestore.client(), args.target, args.page_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# migrate_transcripts.py
+# Moves inline conversationHistory arrays out of help_requests docs into
+# help_request_transcripts (see transcripts.py).
+#
+#   python migrate_transcripts.py --dry-run   # only report how much would move
+#   python migrate_transcripts.py
+#
+# Docs without an inline history are skipped, so the command can be re-run.
+import argparse
+import json
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+from dotenv import load_dotenv
+
+from transcripts import TRANSCRIPTS_COLLECTION, encode_transcript
+
+# Each migrated request is two writes (transcript set + request update).
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+
+def migrate(db, page_size, dry_run):
+    collection = db.collection('help_requests')
+    transcripts = db.collection(TRANSCRIPTS_COLLECTION)
+    scanned = migrated = inline_bytes = 0
+    last_doc = None
+
+    while True:
+        query = collection.order_by('__name__').limit(page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last_doc = docs[-1]
+        scanned += len(docs)
+
+        batch = db.batch()
+        pending_writes = 0
+        for doc in docs:
+            history = (doc.to_dict() or {}).get('conversationHistory')
+            if history is None:
+                continue
+            inline_bytes += len(json.dumps(history, ensure_ascii=False).encode('utf-8'))
+            migrated += 1
+            if dry_run:
+                continue
+
+            transcript = encode_transcript(history)
+            batch.set(transcripts.document(doc.id), transcript)
+            batch.update(doc.reference, {
+                'conversationHistory': firestore.DELETE_FIELD,
+                'transcriptMessageCount': transcript['messageCount'],
+            })
+            pending_writes += 2
+            if pending_writes >= FIRESTORE_MAX_BATCH_WRITES:
+                batch.commit()
+                batch = db.batch()
+                pending_writes = 0
+
+        if pending_writes:
+            batch.commit()
+        print(f"Scanned {scanned} help requests, migrated {migrated}")
+
+    print(
+        f"{'Would move' if dry_run else 'Moved'} {migrated} of {scanned} transcripts "
+        f"({inline_bytes / 1024:.1f} KiB of inline history) to {TRANSCRIPTS_COLLECTION}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline help request transcripts out.")
+    parser.add_argument('--page-size', type=int, default=300)
+    parser.add_argument('--dry-run', action='store_true', help="report sizes without writing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("service-account.json")
+        firebase_admin.initialize_app(cred)
+
+    migrate(firestore.client(), args.page_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
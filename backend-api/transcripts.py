@@ -0,0 +1,56 @@
+# transcripts.py
+# Escalation transcripts live in their own collection as a compressed blob, so
+# help_requests docs stay small and status updates/snapshots stay cheap.
+import json
+import zlib
+
+TRANSCRIPTS_COLLECTION = 'help_request_transcripts'
+TRANSCRIPT_ENCODING = 'zlib-json-v1'
+
+# Firestore caps a document at 1 MiB; stay well under it after compression.
+MAX_TRANSCRIPT_BYTES = 256 * 1024
+MAX_MESSAGE_CHARS = 4000
+MAX_MESSAGES = 200
+
+
+def truncate_messages(messages, max_messages=MAX_MESSAGES, max_chars=MAX_MESSAGE_CHARS):
+    """Keep the most recent `max_messages`, clipping each message to `max_chars`.
+
+    The newest messages are the ones that explain the escalated question, so the
+    oldest are dropped first. Returns (messages, number of messages dropped).
+    """
+    kept = messages[-max_messages:] if max_messages else []
+    dropped = len(messages) - len(kept)
+    clipped = []
+    for message in kept:
+        content = message.get('content') or ''
+        if len(content) > max_chars:
+            content = content[:max_chars] + '…'
+        clipped.append({'role': message.get('role'), 'content': content})
+    return clipped, dropped
+
+
+def encode_transcript(messages, max_bytes=MAX_TRANSCRIPT_BYTES):
+    """Compress `messages` into a transcript doc, dropping old messages to fit `max_bytes`."""
+    messages, dropped = truncate_messages(messages)
+    while True:
+        blob = zlib.compress(json.dumps(messages, ensure_ascii=False).encode('utf-8'))
+        if len(blob) <= max_bytes or not messages:
+            break
+        # Drop the oldest quarter (at least one) and try again.
+        cut = max(1, len(messages) // 4)
+        messages = messages[cut:]
+        dropped += cut
+    return {
+        'encoding': TRANSCRIPT_ENCODING,
+        'messages': blob,
+        'messageCount': len(messages),
+        'droppedMessages': dropped,
+    }
+
+
+def decode_transcript(doc_data):
+    """Return the list of {role, content} messages stored in a transcript doc."""
+    if not doc_data or doc_data.get('encoding') != TRANSCRIPT_ENCODING:
+        return []
+    return json.loads(zlib.decompress(bytes(doc_data['messages'])).decode('utf-8'))
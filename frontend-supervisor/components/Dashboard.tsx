@@ -1,42 +1,91 @@
 // src/components/Dashboard.tsx (Updated with Tabs)
 'use client';
 
-import { useState, useEffect } from 'react';
-import { collection, query, where, onSnapshot, orderBy } from 'firebase/firestore';
-import { db } from '@/lib/firebase';
+import { useState, useEffect, useCallback } from 'react';
 import { Card, CardHeader, CardTitle, CardDescription, CardContent, CardFooter } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Textarea } from '@/components/ui/textarea';
 import { Button } from '@/components/ui/button';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 
+const API_BASE_URL = process.env.NEXT_PUBLIC_BACKEND_API_URL ?? 'http://127.0.0.1:8000';
+const PAGE_SIZE = 20;
+
+// List endpoints return projected docs with ISO timestamps; the full
+// conversation history is only fetched per request.
 interface HelpRequest {
     id: string;
     originalQuery: string;
     status: string;
-    createdAt: {
-        seconds: number;
-        nanoseconds: number;
-    };
-    conversationHistory: Array<{ role: string; content: string }>;
+    createdAt: string;
     supervisorResponse?: string;
-    resolvedAt?: {
-        seconds: number;
-        nanoseconds: number;
-    };
+    resolvedAt?: string;
+    callerCount?: number;
+}
+
+interface ChatMessage {
+    role: string;
+    content: string;
 }
 
 interface KnowledgeBaseEntry {
     id: string;
     question: string;
     answer: string;
-    createdAt?: {
-        seconds: number;
-        nanoseconds: number;
-    };
+    createdAt?: string;
     sourceRequestId?: string;
 }
 
+interface Page<T> {
+    items: T[];
+    nextCursor: string | null;
+}
+
+// Cursor-paginated list; 'no-cache' makes the browser revalidate with the ETag.
+function usePaginatedList<T>(path: string) {
+    const [items, setItems] = useState<T[]>([]);
+    const [cursor, setCursor] = useState<string | null>(null);
+    const [loading, setLoading] = useState(true);
+
+    const loadPage = useCallback(async (after: string | null) => {
+        setLoading(true);
+        try {
+            const separator = path.includes('?') ? '&' : '?';
+            const url = `${API_BASE_URL}${path}${separator}limit=${PAGE_SIZE}` +
+                (after ? `&cursor=${encodeURIComponent(after)}` : '');
+            const response = await fetch(url, { cache: 'no-cache' });
+            if (!response.ok) throw new Error(`Failed to load ${path}`);
+            const page: Page<T> = await response.json();
+            setItems(prev => after ? [...prev, ...page.items] : page.items);
+            setCursor(page.nextCursor);
+        } catch (error) {
+            console.error(error);
+        } finally {
+            setLoading(false);
+        }
+    }, [path]);
+
+    useEffect(() => {
+        loadPage(null);
+    }, [loadPage]);
+
+    return {
+        items,
+        loading,
+        hasMore: cursor !== null,
+        loadMore: () => loadPage(cursor),
+    };
+}
+
+function LoadMoreButton({ hasMore, loading, onClick }: { hasMore: boolean; loading: boolean; onClick: () => void }) {
+    if (!hasMore) return null;
+    return (
+        <Button variant="outline" onClick={onClick} disabled={loading} className="justify-self-center">
+            {loading ? 'Loading...' : 'Load more'}
+        </Button>
+    );
+}
+
 // Jawab dene wala form
 function ResolveForm({ requestId }: { requestId: string }) {
     const [answer, setAnswer] = useState('');
@@ -50,7 +99,7 @@ function ResolveForm({ requestId }: { requestId: string }) {
         }
         setIsSubmitting(true);
         try {
-            const response = await fetch(`http://127.0.0.1:8000/api/help-requests/${requestId}/resolve`, {
+            const response = await fetch(`${API_BASE_URL}/api/help-requests/${requestId}/resolve`, {
                 method: 'PUT',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ answer }),
@@ -90,17 +139,14 @@ function formatTime(totalSeconds: number): string {
 }
 
 interface TimerBadgeProps {
-    createdAt: {
-        seconds: number;
-        nanoseconds: number;
-    };
+    createdAt: string;
 }
 
 function TimerBadge({ createdAt }: TimerBadgeProps) {
     const [remainingTime, setRemainingTime] = useState(TIMEOUT_DURATION_SECONDS);
 
     useEffect(() => {
-        const startTime = new Date(createdAt.seconds * 1000);
+        const startTime = new Date(createdAt);
 
         const calculateRemaining = () => {
             const now = new Date();
@@ -137,23 +183,92 @@ function TimerBadge({ createdAt }: TimerBadgeProps) {
     );
 }
 
+function ConversationHistory({ requestId }: { requestId: string }) {
+    const [messages, setMessages] = useState<ChatMessage[] | null>(null);
+    const [droppedMessages, setDroppedMessages] = useState(0);
+
+    useEffect(() => {
+        let cancelled = false;
+        fetch(`${API_BASE_URL}/api/help-requests/${requestId}`, { cache: 'no-cache' })
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(data => {
+                if (cancelled) return;
+                setMessages(data.conversationHistory ?? []);
+                setDroppedMessages(data.droppedMessages ?? 0);
+            })
+            .catch(error => {
+                console.error(`Could not load conversation for ${requestId}:`, error);
+                if (!cancelled) setMessages([]);
+            });
+        return () => { cancelled = true; };
+    }, [requestId]);
+
+    if (messages === null) return <p className="italic text-slate-500">Loading conversation...</p>;
+
+    const visible = messages.filter(msg => (msg.role === 'user' || msg.role === 'assistant') && msg.content); // Filter for useful roles
+    if (visible.length === 0) return <p className="italic text-slate-500">No conversation history available.</p>;
+
+    return (
+        <>
+            {droppedMessages > 0 && (
+                <p className="italic text-slate-500">{droppedMessages} earlier messages were not kept.</p>
+            )}
+            {visible.map((msg, index) => (
+                <div key={index}>
+                    <span className={`font-bold ${msg.role === 'user' ? 'text-blue-600' : 'text-purple-600'}`}>
+                        {msg.role === 'user' ? 'User' : 'Agent'}:
+                    </span>
+                    <p className="pl-2">{msg.content}</p>
+                </div>
+            ))}
+        </>
+    );
+}
+
+// Collapsed by default: the transcript is only fetched once the supervisor opens it.
+function ConversationPanel({ requestId }: { requestId: string }) {
+    const [open, setOpen] = useState(false);
+
+    return (
+        <details className="space-y-3" onToggle={event => setOpen(event.currentTarget.open)}>
+            <summary className="font-semibold cursor-pointer">Conversation History</summary>
+            {open && (
+                <div className="max-h-48 overflow-y-auto p-3 bg-slate-50 rounded-md space-y-2 text-sm">
+                    <ConversationHistory requestId={requestId} />
+                </div>
+            )}
+        </details>
+    );
+}
+
+function sortNewestFirst(requests: HelpRequest[]): HelpRequest[] {
+    return [...requests].sort((a, b) => b.createdAt.localeCompare(a.createdAt));
+}
+
 // Pending requests dikhane wala component
 function PendingRequests() {
     const [requests, setRequests] = useState<HelpRequest[]>([]);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        const q = query(
-            collection(db, 'help_requests'),
-            where('status', '==', 'pending'),
-            orderBy('createdAt', 'desc')
-        );
-        const unsubscribe = onSnapshot(q, (snapshot) => {
-            const reqs = snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() } as HelpRequest));
-            setRequests(reqs);
+        // The backend streams the current pending list, then one event per change.
+        const source = new EventSource(`${API_BASE_URL}/api/help-requests/pending/stream`);
+        source.addEventListener('snapshot', (event) => {
+            const { items } = JSON.parse((event as MessageEvent).data) as { items: HelpRequest[] };
+            setRequests(sortNewestFirst(items));
             setLoading(false);
         });
-        return () => unsubscribe();
+        const upsert = (event: Event) => {
+            const item = JSON.parse((event as MessageEvent).data) as HelpRequest;
+            setRequests(prev => sortNewestFirst([...prev.filter(req => req.id !== item.id), item]));
+        };
+        source.addEventListener('added', upsert);
+        source.addEventListener('modified', upsert);
+        source.addEventListener('removed', (event) => {
+            const { id } = JSON.parse((event as MessageEvent).data) as { id: string };
+            setRequests(prev => prev.filter(req => req.id !== id));
+        });
+        return () => source.close();
     }, []);
 
     if (loading) return <p>Loading pending requests...</p>;
@@ -168,33 +283,20 @@ function PendingRequests() {
                                 <div>
                                     <CardTitle>Query: {req.originalQuery}</CardTitle>
                                     <CardDescription>
-                                        Received: {new Date(req.createdAt.seconds * 1000).toLocaleString()}
+                                        Received: {new Date(req.createdAt).toLocaleString()}
                                     </CardDescription>
                                 </div>
 
-                                <TimerBadge createdAt={req.createdAt} />
-                            </div>
-                        </CardHeader>
-                        <CardContent>
-                            <div className="space-y-3">
-                                <h4 className="font-semibold">Conversation History:</h4>
-                                <div className="max-h-48 overflow-y-auto p-3 bg-slate-50 rounded-md space-y-2 text-sm">
-                                    {req.conversationHistory && req.conversationHistory
-                                        .filter(msg => (msg.role === 'user' || msg.role === 'assistant') && msg.content) // Filter for useful roles
-                                        .map((msg, index) => (
-                                            <div key={index}>
-                                                <span className={`font-bold ${msg.role === 'user' ? 'text-blue-600' : 'text-purple-600'}`}>
-                                                    {msg.role === 'user' ? 'User' : 'Agent'}:
-                                                </span>
-                                                <p className="pl-2">{msg.content}</p>
-                                            </div>
-                                        ))
-                                    }
-                                    {(!req.conversationHistory || req.conversationHistory.filter(msg => (msg.role === 'user' || msg.role === 'assistant') && msg.content).length === 0) && (
-                                        <p className="italic text-slate-500">No conversation history available.</p>
+                                <div className="flex items-center gap-2">
+                                    {(req.callerCount ?? 1) > 1 && (
+                                        <Badge variant="secondary">{req.callerCount} callers waiting</Badge>
                                     )}
+                                    <TimerBadge createdAt={req.createdAt} />
                                 </div>
                             </div>
+                        </CardHeader>
+                        <CardContent>
+                            <ConversationPanel requestId={req.id} />
                         </CardContent>
                         <CardFooter>
                             <ResolveForm requestId={req.id} />
@@ -210,24 +312,9 @@ function PendingRequests() {
 
 // History (resolved) requests dikhane wala component
 function HistoryRequests() {
-    const [requests, setRequests] = useState<HelpRequest[]>([]);
-    const [loading, setLoading] = useState(true);
-
-    useEffect(() => {
-        const q = query(
-            collection(db, 'help_requests'),
-            where('status', 'in', ['resolved', 'unresolved']), // This query is correct!
-            orderBy('createdAt', 'desc')
-        );
-        const unsubscribe = onSnapshot(q, (snapshot) => {
-            const reqs = snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() } as HelpRequest));
-            setRequests(reqs);
-            setLoading(false);
-        });
-        return () => unsubscribe();
-    }, []);
+    const { items: requests, loading, hasMore, loadMore } = usePaginatedList<HelpRequest>('/api/help-requests?status=history');
 
-    if (loading) return <p>Loading history...</p>;
+    if (loading && requests.length === 0) return <p>Loading history...</p>;
 
     return (
         <div className="grid gap-4">
@@ -237,9 +324,7 @@ function HistoryRequests() {
                     const isResolved = req.status === 'resolved';
 
                     // Use 'resolvedAt' if it exists, otherwise fall back to 'createdAt'
-                    const displayDate = req.resolvedAt
-                        ? new Date(req.resolvedAt.seconds * 1000)
-                        : new Date(req.createdAt.seconds * 1000);
+                    const displayDate = new Date(req.resolvedAt ?? req.createdAt);
 
                     const dateDescription = isResolved
                         ? `Resolved on: ${displayDate.toLocaleString()}`
@@ -279,28 +364,15 @@ function HistoryRequests() {
             ) : (
                 <p>No historical requests yet.</p>
             )}
+            <LoadMoreButton hasMore={hasMore} loading={loading} onClick={loadMore} />
         </div>
     );
 }
 
 function LearnedAnswers() {
-    const [entries, setEntries] = useState<KnowledgeBaseEntry[]>([]);
-    const [loading, setLoading] = useState(true);
-
-    useEffect(() => {
-        const q = query(
-            collection(db, 'knowledge_base'),
-            orderBy('createdAt', 'desc')
-        );
-        const unsubscribe = onSnapshot(q, (snapshot) => {
-            const docs = snapshot.docs.map(doc => ({ id: doc.id, ...doc.data() } as KnowledgeBaseEntry));
-            setEntries(docs);
-            setLoading(false);
-        });
-        return () => unsubscribe();
-    }, []);
+    const { items: entries, loading, hasMore, loadMore } = usePaginatedList<KnowledgeBaseEntry>('/api/knowledge-base');
 
-    if (loading) return <p>Loading learned answers...</p>;
+    if (loading && entries.length === 0) return <p>Loading learned answers...</p>;
 
     return (
         <div className="grid gap-4">
@@ -311,7 +383,7 @@ function LearnedAnswers() {
                             <CardTitle>Learned Answer</CardTitle>
                             {entry.createdAt && (
                                 <CardDescription>
-                                    Learned on: {new Date(entry.createdAt.seconds * 1000).toLocaleString()}
+                                    Learned on: {new Date(entry.createdAt).toLocaleString()}
                                 </CardDescription>
                             )}
                         </CardHeader>
@@ -335,6 +407,7 @@ function LearnedAnswers() {
             ) : (
                 <p>The agent has not learned any new answers yet.</p>
             )}
+            <LoadMoreButton hasMore={hasMore} loading={loading} onClick={loadMore} />
         </div>
     );
 }
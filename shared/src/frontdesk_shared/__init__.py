@@ -0,0 +1,6 @@
+"""Modules used by both the agent (agent-starter-python) and the backend (backend-api).
+
+- `clients`: lazily created Firebase / genai clients and the startup report.
+- `embedding_batcher`: micro-batching of embedding requests.
+- `embedding_codec`: compact encodings for embeddings stored in Firestore.
+"""
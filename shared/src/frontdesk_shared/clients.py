@@ -0,0 +1,132 @@
+"""Process-wide registry of lazily created SDK clients.
+
+Importing this module is cheap: the Firebase Admin SDK and google.generativeai
+are imported and initialized the first time their client is asked for, or all
+at once by `warmup()`, which job prewarm / app startup call so no request pays
+for it. Tests and tools install stand-ins with `registry.set()`.
+
+`report()` is the startup-time report: how long each tracked import and client
+initialization took, and how long after the process started it became ready.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+DEFAULT_CLIENTS = ("firestore", "genai")
+
+
+def process_started() -> float:
+    """perf_counter() value at which this process started (import time off Linux)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, counted after the parenthesized command name, in clock ticks since boot.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter()
+    return time.perf_counter() - max(age, 0.0)
+
+
+class ClientRegistry:
+    def __init__(self, credentials_path: str = "service-account.json") -> None:
+        self.credentials_path = credentials_path
+        self.started = process_started()
+        self.ready_ms: Optional[float] = None
+        self.import_ms: dict[str, float] = {}
+        self.init_ms: dict[str, float] = {}
+        self._clients: dict[str, Any] = {}
+        self._factories: dict[str, Callable[[], Any]] = {
+            "firestore": self._create_firestore,
+            "genai": self._create_genai,
+        }
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        with self._lock:
+            self._factories[name] = factory
+
+    def set(self, name: str, client: Any) -> None:
+        """Use `client` for `name` instead of creating one (tests, benchmarks)."""
+        with self._lock:
+            self._clients[name] = client
+
+    def get(self, name: str) -> Any:
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                started = time.perf_counter()
+                client = self._factories[name]()
+                self.init_ms[name] = (time.perf_counter() - started) * 1000
+                self._clients[name] = client
+        return client
+
+    def lazy(self, name: str) -> "LazyClient":
+        return LazyClient(self, name)
+
+    def firestore(self):
+        return self.get("firestore")
+
+    def genai(self):
+        return self.get("genai")
+
+    def timed_import(self, module: str):
+        """Import `module`, recording how long it took if this is the first import."""
+        if module in sys.modules:
+            return sys.modules[module]
+        started = time.perf_counter()
+        imported = importlib.import_module(module)
+        self.import_ms[module] = (time.perf_counter() - started) * 1000
+        return imported
+
+    def record_import(self, module: str) -> None:
+        """Record that `module` has finished importing, as time since the process started."""
+        self.import_ms[module] = (time.perf_counter() - self.started) * 1000
+
+    def warmup(self, names: tuple = DEFAULT_CLIENTS) -> dict:
+        """Create `names` now; returns the startup report."""
+        for name in names:
+            self.get(name)
+        if self.ready_ms is None:
+            self.ready_ms = (time.perf_counter() - self.started) * 1000
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            "import_ms": {k: round(v, 1) for k, v in self.import_ms.items()},
+            "init_ms": {k: round(v, 1) for k, v in self.init_ms.items()},
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+        }
+
+    def _create_firestore(self):
+        firebase_admin = self.timed_import("firebase_admin")
+        firestore = self.timed_import("firebase_admin.firestore")
+        credentials = self.timed_import("firebase_admin.credentials")
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(self.credentials_path))
+        return firestore.client()
+
+    def _create_genai(self):
+        genai = self.timed_import("google.generativeai")
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        return genai
+
+
+class LazyClient:
+    """Stands in for a registry client; the client is created on first attribute access."""
+
+    def __init__(self, registry: ClientRegistry, name: str) -> None:
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(self._registry.get(self._name), attr)
+
+
+registry = ClientRegistry()
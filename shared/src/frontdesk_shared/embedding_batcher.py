@@ -0,0 +1,151 @@
+"""Process-wide micro-batching of embedding requests.
+
+Callers submit one text at a time; a dispatcher thread gathers whatever arrives
+within `max_wait_ms` (or until `max_batch` texts are queued) into a single
+batched embedding call, so concurrent sessions share requests instead of each
+spending one against the per-request rate limit. Identical texts in a batch are
+embedded once. At most `max_concurrency` batches are in flight, and with
+`requests_per_minute` set, batch calls are spaced to stay under that rate. A
+failed batch fails every caller in it with the same exception.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Sequence
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_batch: Callable[[list], Sequence],
+        max_batch: int = 32,
+        max_wait_ms: float = 5,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 0,
+    ) -> None:
+        self.embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._queue: list[tuple[str, Future]] = []
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embedding-batch"
+        )
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.items = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    def submit(self, text: str) -> Future:
+        """Queue `text`; the future resolves to its embedding (a list of floats)."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+            self._queue.append((text, future))
+            self.items += 1
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> list:
+        return self.submit(text).result(timeout)
+
+    def embed_many(self, texts: Sequence[str], timeout: Optional[float] = None) -> list:
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            # Give other callers the window to join the first one's batch.
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._slots.acquire()
+            self._wait_for_rate_limit()
+            try:
+                self._executor.submit(self._call, batch)
+            except RuntimeError as e:
+                self._slots.release()
+                self._fail(batch, e)
+
+    def _wait_for_rate_limit(self) -> None:
+        if not self._interval:
+            return
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _call(self, batch: list) -> None:
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            vectors = self.embed_batch(texts)
+            if vectors is None or len(vectors) != len(texts):
+                raise ValueError(
+                    f"Embedding call returned {0 if vectors is None else len(vectors)} "
+                    f"vectors for {len(texts)} texts"
+                )
+            by_text = {text: list(vector) for text, vector in zip(texts, vectors)}
+        except Exception as e:
+            with self._cond:
+                self.failed_batches += 1
+            self._fail(batch, e)
+        else:
+            with self._cond:
+                self.batches += 1
+            for text, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(by_text[text])
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _fail(batch: list, error: BaseException) -> None:
+        for _, future in batch:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self) -> None:
+        """Finish queued and in-flight batches, then stop the dispatcher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        batches = self.batches + self.failed_batches
+        return {
+            "items": self.items,
+            "batches": batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": round(self.items / batches, 2) if batches else 0.0,
+        }
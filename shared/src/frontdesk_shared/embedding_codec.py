@@ -0,0 +1,82 @@
+"""Compact encodings for embeddings stored in Firestore documents.
+
+A KB doc's `question_embedding` / `content_embedding` are either plain arrays of
+floats (the original format) or bytes blobs, in which case the doc's
+`embedding_encoding` field names the packing:
+
+- ``f16-v1``: little-endian float16 values (2 bytes per dimension).
+- ``i8-v1``: a little-endian float32 scale followed by int8 values, where
+  value = int8 * scale (1 byte per dimension).
+"""
+
+from typing import Optional
+
+import numpy as np
+
+ENCODING_FIELD = "embedding_encoding"
+EMBEDDING_FIELDS = ("question_embedding", "content_embedding")
+
+FLOAT = "float"
+F16 = "f16-v1"
+I8 = "i8-v1"
+ENCODINGS = (FLOAT, F16, I8)
+
+
+def encode_embedding(vector, encoding: str = FLOAT):
+    """Encode a float vector for storage: a list for FLOAT, bytes otherwise."""
+    if vector is None:
+        return None
+    if encoding == FLOAT:
+        return [float(x) for x in vector]
+
+    values = np.asarray(vector, dtype=np.float32)
+    if encoding == F16:
+        return values.astype("<f2").tobytes()
+    if encoding == I8:
+        peak = float(np.max(np.abs(values))) if values.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).astype("<f4").tobytes() + quantized.tobytes()
+    raise ValueError(f"Unknown embedding encoding {encoding!r}")
+
+
+def decode_embedding(value, encoding: Optional[str] = None) -> Optional[np.ndarray]:
+    """Decode a stored embedding (any supported format) to a float32 array."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return np.asarray(value, dtype=np.float32) if value else None
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return None
+
+    raw = bytes(value)
+    if encoding == F16:
+        return np.frombuffer(raw, dtype="<f2").astype(np.float32)
+    if encoding == I8:
+        if len(raw) < 4:
+            return None
+        scale = np.frombuffer(raw[:4], dtype="<f4")[0]
+        return np.frombuffer(raw[4:], dtype=np.int8).astype(np.float32) * scale
+    return None
+
+
+def doc_encoding(doc_data: dict) -> str:
+    return doc_data.get(ENCODING_FIELD) or FLOAT
+
+
+def doc_embedding(doc_data: dict, field: str) -> Optional[np.ndarray]:
+    """Decode `field` of a Firestore doc dict, honouring its encoding field."""
+    return decode_embedding(doc_data.get(field), doc_encoding(doc_data))
+
+
+def has_embedding(doc_data: dict, field: str) -> bool:
+    value = doc_data.get(field)
+    return bool(value) and isinstance(value, (list, bytes, bytearray, memoryview))
+
+
+def encode_fields(embeddings: dict, encoding: str = FLOAT) -> dict:
+    """Build the Firestore fields for `{field: vector}`, tagging non-float encodings."""
+    fields = {field: encode_embedding(vector, encoding) for field, vector in embeddings.items()}
+    if encoding != FLOAT:
+        fields[ENCODING_FIELD] = encoding
+    return fields